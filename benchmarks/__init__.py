@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+'''
+Performance benchmarks for iktomi. Not a part of the test suite, run
+from the repository root.
+
+Routing, reverse and URL building suite with machine-readable results
+(see `benchmarks.cli.Benchmark`, can be added to a project's manage.py)::
+
+    python -m benchmarks bench:web --output=results.json
+
+Focused benchmarks are modules runnable by themselves::
+
+    python -m benchmarks.routing
+'''
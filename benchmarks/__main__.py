@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+'''
+Standalone runner, the same commands can be added to a project's manage.py::
+
+    python -m benchmarks bench:web --routes=10,100 --output=results.json
+    python -m benchmarks bench:compare old.json results.json
+'''
+
+from iktomi.cli import manage
+from .cli import Benchmark
+
+
+if __name__ == '__main__':
+    manage(dict(bench=Benchmark()))
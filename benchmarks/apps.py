@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+'''
+Synthetic iktomi apps for benchmarks.
+'''
+
+from webob import Response
+from iktomi import web
+
+__all__ = ['DOMAIN', 'make_app']
+
+DOMAIN = 'example.com'
+
+
+def endpoint(env, data):
+    return Response('ok')
+
+
+def make_route(index):
+    '''Returns (handler, url part, url kwargs) for the route number `index`,
+    using different converters'''
+    name = 'r{}'.format(index)
+    kind = index % 4
+    if kind == 0:
+        return web.match('/page{}'.format(index), name), \
+               '/page{}'.format(index), {}
+    elif kind == 1:
+        return web.match('/item{}/<int:id>'.format(index), name), \
+               '/item{}/15'.format(index), {'id': 15}
+    elif kind == 2:
+        return web.match('/tag{}/<string:slug>'.format(index), name), \
+               '/tag{}/news'.format(index), {'slug': 'news'}
+    return web.match('/sort{}/<any(asc,desc):order>'.format(index), name), \
+           '/sort{}/desc'.format(index), {'order': 'desc'}
+
+
+def make_app(route_count, section_size=10, subdomain_every=5):
+    '''
+    Returns a handler with `route_count` endpoints and a list of
+    (host, path, url name, url kwargs) tuples for each endpoint.
+
+    Endpoints are grouped in sections by `section_size` under prefixes with
+    namespaces, every `subdomain_every` section is placed on a subdomain.
+    '''
+    main_sections = []
+    subdomain_sections = []
+    endpoints = []
+    for section_start in range(0, route_count, section_size):
+        section = section_start // section_size
+        on_subdomain = section % subdomain_every == subdomain_every - 1
+        ns = 's{}'.format(section)
+        routes = []
+        for index in range(section_start,
+                           min(section_start + section_size, route_count)):
+            handler, path, kwargs = make_route(index)
+            routes.append(handler | endpoint)
+            host = DOMAIN
+            url_name = '{}.r{}'.format(ns, index)
+            if on_subdomain:
+                host = 'api.' + DOMAIN
+                url_name = 'api.' + url_name
+            endpoints.append((host, '/s{}{}'.format(section, path),
+                              url_name, kwargs))
+        handler = web.prefix('/s{}'.format(section), name=ns) | \
+                  web.cases(*routes)
+        if on_subdomain:
+            subdomain_sections.append(handler)
+        else:
+            main_sections.append(handler)
+    return web.subdomain(DOMAIN) | web.cases(
+        web.subdomain('api', name='api') | web.cases(*subdomain_sections),
+        web.subdomain('') | web.cases(*main_sections),
+    ), endpoints
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+'''
+Throughput of handlers waiting on slow I/O (a backend responding in
+`delay` seconds) with concurrent requests: `Application` served by a pool
+of worker threads vs `AsyncApplication` on a single event loop::
+
+    python -m benchmarks.asgi
+'''
+
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from webob import Request, Response
+from iktomi import web
+
+
+def make_app(wait):
+    def item(env, data):
+        return wait(data.id)
+    return web.cases(
+        web.match('/', 'index') | (lambda env, data: Response('index')),
+        web.prefix('/docs') | web.namespace('docs') | web.cases(
+            web.match('/<int:id>', 'item') | item,
+        ),
+    )
+
+
+def sync_throughput(delay, requests, workers):
+    def wait(id):
+        time.sleep(delay)
+        return Response('item {}'.format(id))
+    wsgi_app = web.Application(make_app(wait))
+
+    def call(i):
+        response = Request.blank('/docs/{}'.format(i)).get_response(wsgi_app)
+        assert response.status_int == 200
+    started = time.time()
+    with ThreadPoolExecutor(workers) as executor:
+        list(executor.map(call, range(requests)))
+    return requests / (time.time() - started)
+
+
+def async_throughput(delay, requests):
+    async def wait(id):
+        await asyncio.sleep(delay)
+        return Response('item {}'.format(id))
+    asgi_app = web.AsyncApplication(make_app(wait))
+
+    async def call(i):
+        scope = {'type': 'http', 'method': 'GET',
+                 'path': '/docs/{}'.format(i), 'query_string': b'',
+                 'headers': [(b'host', b'localhost')]}
+        sent = []
+        async def receive():
+            return {'type': 'http.request', 'body': b''}
+        async def send(message):
+            sent.append(message)
+        await asgi_app(scope, receive, send)
+        assert sent[0]['status'] == 200
+
+    async def run():
+        await asyncio.gather(*[call(i) for i in range(requests)])
+    loop = asyncio.new_event_loop()
+    started = time.time()
+    try:
+        loop.run_until_complete(run())
+    finally:
+        loop.close()
+    return requests / (time.time() - started)
+
+
+def main(delay=0.02, requests=500, workers=(1, 8, 32)):
+    print('{} requests, backend delay {:.0f} ms'.format(requests,
+                                                         delay * 1e3))
+    for count in workers:
+        print('sync, {:>3} threads: {:8.1f} req/s'.format(
+                count, sync_throughput(delay, requests, count)))
+    print('async, 1 loop:     {:8.1f} req/s'.format(
+            async_throughput(delay, requests)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+'''
+Build time of a large synthetic app, its freeze time and per-request call
+time of the handler chain before and after `WebHandler.freeze`::
+
+    python -m benchmarks.chain
+'''
+
+import time
+import timeit
+from webob import Request, Response
+from iktomi import web
+from iktomi.utils.storage import VersionedStorage
+
+
+def make_filter(i):
+    @web.request_filter
+    def filter_(env, data, next_handler):
+        return next_handler(env, data)
+    filter_.__name__ = 'filter{}'.format(i)
+    return filter_
+
+
+def make_app(section_count=50, route_count=20, filter_count=5):
+    filters = [make_filter(i) for i in range(filter_count)]
+    sections = []
+    for i in range(section_count):
+        chain = web.prefix('/section-{}'.format(i), name='section{}'.format(i))
+        for filter_ in filters:
+            chain = chain | filter_
+        sections.append(chain | web.cases(*[
+            web.match('/{}'.format(j), 'route{}'.format(j)) | filters[0] |
+            (lambda env, data: Response('ok'))
+            for j in range(route_count)
+        ]))
+    app = web.cases(*sections)
+    # chaining after a big cases copies each nested handler
+    for filter_ in filters:
+        app = filter_ | app | filter_
+    return app
+
+
+def call_time(handler, path, number):
+    wsgi_app = web.Application(handler)
+    request = Request.blank(path)
+    def call():
+        env = VersionedStorage(wsgi_app.env_class, request=request,
+                               root=wsgi_app.root)
+        assert handler(env, VersionedStorage()) is not None
+    return min(timeit.repeat(call, number=number, repeat=5)) / number
+
+
+def best_time(func, repeat=5):
+    best = None
+    for i in range(repeat):
+        started = time.time()
+        result = func()
+        spent = time.time() - started
+        best = spent if best is None else min(best, spent)
+    return best, result
+
+
+def main(number=500):
+    build_time, app = best_time(make_app)
+    freeze_time, frozen = best_time(app.freeze)
+    print('build: {:.1f} ms, freeze: {:.1f} ms'.format(build_time * 1e3,
+                                                       freeze_time * 1e3))
+    for path in ['/section-0/0', '/section-49/19']:
+        plain_time = call_time(app, path, number)
+        frozen_time = call_time(frozen, path, number)
+        print('{}: plain {:.1f} us, frozen {:.1f} us'.format(
+                path, plain_time * 1e6, frozen_time * 1e6))
+
+
+if __name__ == '__main__':
+    main()
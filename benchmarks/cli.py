@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import json
+from iktomi.cli.base import Cli
+from . import web
+
+__all__ = ['Benchmark']
+
+
+class Benchmark(Cli):
+    '''
+    iktomi.web benchmarks
+
+    :param route_counts: sizes of synthetic apps
+    '''
+
+    def __init__(self, route_counts=(10, 100, 1000, 5000)):
+        self.route_counts = route_counts
+
+    def command_web(self, routes=None, only=None, output=None,
+                    min_time='0.2'):
+        '''
+        Run routing, reverse and URL building benchmarks, write results
+        as JSON to a file or to stdout::
+
+            ./manage.py bench:web [--routes=10,100] [--only=wsgi,qs_set]
+                                  [--output=results.json] [--min_time=0.2]
+        '''
+        route_counts = self.route_counts
+        if routes:
+            route_counts = [int(x) for x in routes.split(',')]
+        names = only.split(',') if only else None
+
+        def log(result):
+            sys.stderr.write('{benchmark:>16} {routes:>6} routes: '
+                             '{usec_per_op:10.2f} us\n'.format(**result))
+        results = web.run(route_counts, names=names,
+                          min_time=float(min_time), log=log)
+        dump = json.dumps(results, indent=2, sort_keys=True)
+        if output:
+            with open(output, 'w') as f:
+                f.write(dump)
+        else:
+            sys.stdout.write(dump + '\n')
+
+    def command_compare(self, old, new):
+        '''
+        Compare two JSON files with results::
+
+            ./manage.py bench:compare old.json new.json
+        '''
+        with open(old) as f:
+            old_results = json.load(f)
+        with open(new) as f:
+            new_results = json.load(f)
+        for row in web.compare(old_results, new_results):
+            sys.stdout.write('{:>16} {:>6} routes: {:10.2f} us -> '
+                             '{:10.2f} us {:6.2f}x\n'.format(*row))
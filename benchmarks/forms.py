@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+'''
+Rendering time of a 50-field form with and without template resolve
+cache, rendering widgets separately and inline (`Form.inline_widgets`)::
+
+    python -m benchmarks.forms
+'''
+
+import timeit
+from iktomi.forms import Form, Field, FieldSet, convs, widgets
+from iktomi.templates import Template, BoundTemplate
+from iktomi.templates.jinja2 import TemplateEngine, TEMPLATE_DIR
+from iktomi.web.app import AppEnvironment
+
+
+def make_form_class(field_count=50):
+    choices = [(str(i), 'Option {}'.format(i)) for i in range(10)]
+    fields = []
+    for i in range(field_count):
+        name = 'field{}'.format(i)
+        kind = i % 5
+        if kind == 0:
+            field = Field(name, convs.EnumChoice(choices=choices),
+                          widget=widgets.Select())
+        elif kind == 1:
+            field = Field(name, convs.Bool(), widget=widgets.CheckBox())
+        elif kind == 2:
+            field = Field(name, convs.Char(), widget=widgets.Textarea())
+        else:
+            field = Field(name, convs.Char(), label='Field {}'.format(i))
+        fields.append(field)
+    # a nested fieldset, as in admin forms
+    fields[-5:] = [FieldSet('set', fields=fields[-5:])]
+    return type('BenchmarkForm', (Form,), dict(fields=fields,
+                                               template='forms/table'))
+
+
+def make_form(form_class, cache, inline_widgets):
+    engine = TemplateEngine(TEMPLATE_DIR)
+    template = Template(TEMPLATE_DIR, engines={'html': engine}, cache=cache)
+    env = AppEnvironment.create()
+    env.template = BoundTemplate(env, template)
+    form = form_class(env)
+    form.inline_widgets = inline_widgets
+    return form
+
+
+def main(number=200):
+    form_class = make_form_class()
+    print('{:>16} {:>16} {:>14}'.format('resolve cache', 'inline widgets',
+                                        'render, ms'))
+    for cache in [False, True]:
+        for inline_widgets in [False, True]:
+            form = make_form(form_class, cache, inline_widgets)
+            # warm up compiled templates
+            form.render()
+            best = min(timeit.repeat(form.render, number=number, repeat=5))
+            print('{:>16} {:>16} {:>14.3f}'.format(
+                str(cache), str(inline_widgets), best / number * 1000))
+
+
+if __name__ == '__main__':
+    main()
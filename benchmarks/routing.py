@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+'''
+Dispatch time of a request to the last route depending on route count,
+with and without `compile_routes`, for nested prefixes, flat static routes
+and flat routes sharing the same static prefix::
+
+    python -m benchmarks.routing
+'''
+
+import timeit
+from webob import Request, Response
+from iktomi import web
+from iktomi.utils.storage import VersionedStorage
+
+
+def make_app(route_count, per_section=20):
+    sections = []
+    for i in range(0, route_count, per_section):
+        routes = [web.match('/item-{}/<int:id>'.format(j), 'item{}'.format(j)) |
+                  (lambda env, data: Response('ok'))
+                  for j in range(i, min(i + per_section, route_count))]
+        sections.append(web.prefix('/section-{}'.format(i // per_section),
+                                   name='section{}'.format(i // per_section)) |
+                        web.cases(*routes))
+    flat = [web.match('/page-{}'.format(i), 'page{}'.format(i)) |
+            (lambda env, data: Response('ok'))
+            for i in range(route_count)]
+    # static prefix is the same, only joined regexp helps
+    params = [web.match('/p/<int:id>/{}'.format(i), 'param{}'.format(i)) |
+              (lambda env, data: Response('ok'))
+              for i in range(route_count)]
+    return web.cases(web.cases(*sections), web.cases(*flat),
+                     web.cases(*params))
+
+
+def dispatch_time(wsgi_app, path, number):
+    request = Request.blank(path)
+    def dispatch():
+        env = VersionedStorage(wsgi_app.env_class, request=request,
+                               root=wsgi_app.root)
+        data = VersionedStorage()
+        assert wsgi_app.handle(env, data).status_int == 200
+    return min(timeit.repeat(dispatch, number=number, repeat=3)) / number
+
+
+def main(route_counts=(10, 100, 600, 1000, 5000), number=200):
+    print('{:>8} {:>28} {:>12} {:>12} {:>8}'.format(
+            'routes', 'path', 'plain, us', 'compiled, us', 'speedup'))
+    for count in route_counts:
+        handler = make_app(count)
+        plain = web.Application(handler)
+        compiled = web.Application(handler, compile_routes=True)
+        last = count - 1
+        for path in ['/section-{}/item-{}/1'.format(last // 20, last),
+                     '/page-{}'.format(last),
+                     '/p/1/{}'.format(last)]:
+            plain_time = dispatch_time(plain, path, number)
+            compiled_time = dispatch_time(compiled, path, number)
+            print('{:>8} {:>28} {:>12.1f} {:>12.1f} {:>7.1f}x'.format(
+                    count, path, plain_time * 1e6, compiled_time * 1e6,
+                    plain_time / compiled_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+'''
+Per-request `env`/`data` frame allocations and peak traced memory
+(measured with tracemalloc) with copy-on-write frames and with a frame
+allocated on every push, as it was done before.
+
+Attribute lookup time in a deep storage compared to walking the frames,
+as it was done before::
+
+    python -m benchmarks.storage
+'''
+
+import timeit
+import tracemalloc
+from webob import Request, Response
+from iktomi import web
+from iktomi.utils.storage import VersionedStorage, StorageFrame
+
+
+class EagerStorage(VersionedStorage):
+    '''Allocates a frame on every push'''
+
+    def _push(self, **kwargs):
+        frame = VersionedStorage._push(self, **kwargs)
+        self._materialize()
+        return frame or self._storage
+
+
+class WalkingStorage(VersionedStorage):
+    '''Looks attributes up by walking the frames'''
+
+    __slots__ = ()
+
+    def __getattr__(self, name):
+        frame = self._storage
+        while frame:
+            try:
+                return getattr(frame, name)
+            except AttributeError:
+                frame = frame._parent_storage
+        raise AttributeError(name)
+
+
+class CountingFrame(StorageFrame):
+
+    count = 0
+
+    def __init__(self, *args, **kwargs):
+        CountingFrame.count += 1
+        StorageFrame.__init__(self, *args, **kwargs)
+
+
+def make_app(route_count):
+    return web.cases(
+        web.prefix('/section', name='section') | web.cases(*[
+            web.match('/{}'.format(i), str(i)) |
+            (lambda env, data: Response('ok'))
+            for i in range(route_count)
+        ]),
+    )
+
+
+def measure(wsgi_app, storage_class, path):
+    import iktomi.utils.storage as storage_module
+    request = Request.blank(path)
+    storage_module.StorageFrame = CountingFrame
+    CountingFrame.count = 0
+    tracemalloc.start()
+    try:
+        env = storage_class(wsgi_app.env_class, request=request,
+                            root=wsgi_app.root)
+        data = storage_class()
+        response = wsgi_app.handle(env, data)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        storage_module.StorageFrame = StorageFrame
+    assert response.status_int == 200
+    return CountingFrame.count, peak
+
+
+def lookup_times(storage_class, depth=8, number=100000):
+    env = storage_class(db='db')
+    for i in range(depth):
+        env._push()
+        setattr(env, 'level{}'.format(i), i)
+    return [min(timeit.repeat(stmt, number=number, repeat=3,
+                              globals={'env': env})) / number
+            for stmt in ['env.db', 'env.level0',
+                         'env.level{}'.format(depth - 1),
+                         'hasattr(env, "missing")']]
+
+
+def main(route_counts=(10, 100, 600)):
+    print('{:>8} {:>14} {:>14} {:>14} {:>14}'.format(
+            'routes', 'eager frames', 'cow frames', 'eager peak, B',
+            'cow peak, B'))
+    for count in route_counts:
+        wsgi_app = web.Application(make_app(count))
+        path = '/section/{}'.format(count - 1)
+        # warm up cached properties and regexps
+        measure(wsgi_app, VersionedStorage, path)
+        eager_frames, eager_peak = measure(wsgi_app, EagerStorage, path)
+        cow_frames, cow_peak = measure(wsgi_app, VersionedStorage, path)
+        print('{:>8} {:>14} {:>14} {:>14} {:>14}'.format(
+                count, eager_frames, cow_frames, eager_peak, cow_peak))
+    print('')
+    print('{:>24} {:>10} {:>10} {:>10} {:>10}'.format(
+            'lookup (8 levels), ns', 'root', 'level 0', 'level 7', 'missing'))
+    for storage_class in [WalkingStorage, VersionedStorage]:
+        print('{:>24} {:>10.0f} {:>10.0f} {:>10.0f} {:>10.0f}'.format(
+                storage_class.__name__,
+                *[x * 1e9 for x in lookup_times(storage_class)]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+'''
+Routing, reverse and URL building benchmarks on synthetic apps.
+'''
+
+import sys
+import time
+import timeit
+import platform
+from webob import Request
+from iktomi import web
+from iktomi.web.url import URL
+from iktomi.utils.storage import VersionedStorage
+from .apps import make_app
+
+__all__ = ['run', 'BENCHMARKS']
+
+
+def sample(endpoints, count=3):
+    '''First, middle and last endpoints'''
+    if len(endpoints) <= count:
+        return endpoints
+    step = (len(endpoints) - 1) / float(count - 1)
+    return [endpoints[int(round(i * step))] for i in range(count)]
+
+
+def make_environ(host, path):
+    return Request.blank(path, environ={'HTTP_HOST': host,
+                                        'SERVER_NAME': host}).environ
+
+
+def bound_env(wsgi_app, host='example.com'):
+    request = Request.blank('/', environ={'HTTP_HOST': host,
+                                          'SERVER_NAME': host})
+    return VersionedStorage(wsgi_app.env_class, request=request,
+                            root=wsgi_app.root)
+
+
+def bench_wsgi(wsgi_app, endpoints):
+    '''`Application.__call__` with a fake WSGI environ'''
+    environs = [make_environ(host, path)
+                for host, path, _, _ in sample(endpoints)]
+    def start_response(status, headers, exc_info=None):
+        assert status.startswith('200'), status
+    def run():
+        for environ in environs:
+            b''.join(wsgi_app(dict(environ), start_response))
+    return run, len(environs)
+
+
+def bench_wsgi_compiled(wsgi_app, endpoints):
+    '''`Application.__call__` with compiled routes'''
+    return bench_wsgi(web.Application(wsgi_app.handler, compile_routes=True),
+                      endpoints)
+
+
+def bench_build_url(wsgi_app, endpoints):
+    '''`Reverse.build_url` on env.root'''
+    env = bound_env(wsgi_app)
+    items = [(name, kwargs) for _, _, name, kwargs in sample(endpoints)]
+    def run():
+        for name, kwargs in items:
+            env.root.build_url(name, **kwargs)
+    return run, len(items)
+
+
+def bench_reverse_attrs(wsgi_app, endpoints):
+    '''Attribute-style reverse: env.root.ns.name(**kwargs).as_url'''
+    env = bound_env(wsgi_app)
+    items = [(name.split('.'), kwargs)
+             for _, _, name, kwargs in sample(endpoints)]
+    def run():
+        for parts, kwargs in items:
+            reverse = env.root
+            for part in parts:
+                reverse = getattr(reverse, part)
+            if kwargs:
+                reverse = reverse(**kwargs)
+            reverse.as_url
+    return run, len(items)
+
+
+def bench_list_page(wsgi_app, endpoints):
+    '''200 URLs of the same endpoint, as on a list page, with both
+    string and attribute APIs'''
+    env = bound_env(wsgi_app)
+    _, _, name, kwargs = endpoints[-1]
+    parts = name.split('.')
+    def run():
+        for i in range(100):
+            env.root.build_url(name, **kwargs)
+            reverse = env.root
+            for part in parts:
+                reverse = getattr(reverse, part)
+            if kwargs:
+                reverse = reverse(**kwargs)
+            reverse.as_url
+    return run, 200
+
+
+def bench_qs_set(wsgi_app, endpoints):
+    '''`URL.qs_set` on a built URL'''
+    env = bound_env(wsgi_app)
+    _, _, name, kwargs = endpoints[-1]
+    url = env.root.build_url(name, **kwargs).qs_set(sort='date', q='text')
+    def run():
+        url.qs_set(page=2)
+    return run, 1
+
+
+def bench_from_url(wsgi_app, endpoints):
+    '''`URL.from_url` of a list page URL with many filters, as
+    `Paginator.url` does'''
+    filters = '&'.join('f{}={}'.format(i % 10, i) for i in range(50))
+    url = ('http://example.com/items?q=%D0%BF%D0%BE%D0%B8%D1%81%D0%BA&'
+           + filters + '&page=3')
+    def run():
+        URL.from_url(url)
+    return run, 1
+
+
+BENCHMARKS = [
+    ('wsgi', bench_wsgi),
+    ('wsgi_compiled', bench_wsgi_compiled),
+    ('build_url', bench_build_url),
+    ('reverse_attrs', bench_reverse_attrs),
+    ('list_page', bench_list_page),
+    ('qs_set', bench_qs_set),
+    ('from_url', bench_from_url),
+]
+
+
+def measure(func, ops_per_call, min_time=0.2, repeat=3):
+    # calibrate number of calls to run at least min_time
+    number = 1
+    while True:
+        elapsed = timeit.timeit(func, number=number)
+        if elapsed >= min_time or number >= 1 << 20:
+            break
+        number *= 2
+    best = min([elapsed] + timeit.repeat(func, number=number,
+                                         repeat=repeat - 1))
+    return best / (number * ops_per_call)
+
+
+def run(route_counts=(10, 100, 1000, 5000), names=None, min_time=0.2,
+        log=None):
+    '''
+    Runs benchmarks and returns results as JSON-serializable dict.
+    `names` is a list of benchmark names to run, all by default, app build
+    time is reported as `build_app`.'''
+    results = []
+    for route_count in route_counts:
+        started = time.time()
+        handler, endpoints = make_app(route_count)
+        wsgi_app = web.Application(handler)
+        build_time = time.time() - started
+        if not names or 'build_app' in names:
+            result = {'benchmark': 'build_app', 'routes': route_count,
+                      'usec_per_op': build_time * 1e6,
+                      'ops_per_sec': 1 / build_time}
+            results.append(result)
+            if log is not None:
+                log(result)
+        for name, bench in BENCHMARKS:
+            if names and name not in names:
+                continue
+            func, ops_per_call = bench(wsgi_app, endpoints)
+            op_time = measure(func, ops_per_call, min_time=min_time)
+            result = {'benchmark': name, 'routes': route_count,
+                      'usec_per_op': op_time * 1e6,
+                      'ops_per_sec': 1 / op_time}
+            results.append(result)
+            if log is not None:
+                log(result)
+    return {
+        'python': sys.version.split()[0],
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': results,
+    }
+
+
+def compare(old, new):
+    '''Returns a list of (benchmark, routes, old usec, new usec, speedup)'''
+    old_results = dict(((r['benchmark'], r['routes']), r['usec_per_op'])
+                       for r in old['results'])
+    rows = []
+    for r in new['results']:
+        key = (r['benchmark'], r['routes'])
+        if key in old_results:
+            rows.append(key + (old_results[key], r['usec_per_op'],
+                               old_results[key] / r['usec_per_op']))
+    return rows
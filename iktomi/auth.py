@@ -62,15 +62,22 @@ class CookieAuth(web.WebHandler):
         self.crash_without_storage = crash_without_storage
         self.expire_time = expire_time
 
+    def authenticate(self, env):
+        '''Returns the user identified by the request cookie (the result of
+        `identify_user`) or `None`, refreshes the session expire time'''
+        if self._cookie_name not in env.request.cookies:
+            return None
+        key = env.request.cookies[self._cookie_name]
+        storage_key = self._cookie_name + ':' + key
+        user_identity = self.storage.get(storage_key)
+        if user_identity is None:
+            return None
+        user = self.identify_user(env, user_identity)
+        self.storage.set(storage_key, user_identity, self.expire_time)
+        return user
+
     def cookie_auth(self, env, data):
-        user = None
-        if self._cookie_name in env.request.cookies:
-            key = env.request.cookies[self._cookie_name]
-            storage_key = self._cookie_name + ':' + key
-            user_identity = self.storage.get(storage_key)
-            if user_identity is not None:
-                user = self.identify_user(env, user_identity)
-                self.storage.set(storage_key, user_identity, self.expire_time)
+        user = self.authenticate(env)
         logger.debug('Authenticated: %r', user)
         env.user = user
         try:
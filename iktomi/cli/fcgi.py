@@ -52,10 +52,12 @@ class Flup(Cli):
     :param umask:
     :param dict fastcgi_params: arguments accepted by flup `WSGIServer`,
         plus `preforked`
+    :param metrics_dir: `multiprocess_dir` of app's
+        `iktomi.web.MetricsCollector`, cleared on start
     '''
 
     def __init__(self, app, bind='', logfile=None, pidfile=None,
-                 cwd='.', umask=2, fastcgi_params=None):
+                 cwd='.', umask=2, fastcgi_params=None, metrics_dir=None):
         self.app = app
         self.cwd = os.path.abspath(cwd)
         if ':' in bind:
@@ -70,6 +72,7 @@ class Flup(Cli):
         self.logfile = logfile or os.path.join(self.cwd, 'fcgi.log')
         self.pidfile = pidfile or os.path.join(self.cwd, 'fcgi.pid')
         self.fastcgi_params = fastcgi_params or {}
+        self.metrics_dir = metrics_dir
 
     def command_start(self, daemonize=False):
         '''
@@ -79,6 +82,11 @@ class Flup(Cli):
         '''
         if daemonize:
             safe_makedirs(self.logfile, self.pidfile)
+        if self.metrics_dir:
+            from iktomi.web.prometheus import clear_multiprocess_dir
+            if not os.path.isdir(self.metrics_dir):
+                os.makedirs(self.metrics_dir)
+            clear_multiprocess_dir(self.metrics_dir)
         flup_fastcgi(self.app, bind=self.bind, pidfile=self.pidfile,
                      logfile=self.logfile, daemonize=daemonize,
                      cwd=self.cwd, umask=self.umask, **self.fastcgi_params)
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import gzip
+import shutil
+import logging
+from multiprocessing import Pool
+
+from .base import Cli
+
+try:
+    import brotli
+except ImportError: # pragma: no cover
+    brotli = None
+
+__all__ = ['StaticFiles']
+
+logger = logging.getLogger(__name__)
+
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.mjs', '.map', '.json', '.html',
+                           '.htm', '.xml', '.svg', '.txt', '.ico', '.ttf',
+                           '.otf', '.eot', '.wasm')
+
+
+def _gzip(source, target):
+    with open(source, 'rb') as src:
+        # mtime=0 makes the output reproducible
+        with gzip.GzipFile(target, 'wb', compresslevel=9, mtime=0) as dst:
+            shutil.copyfileobj(src, dst)
+
+
+def _brotli(source, target):
+    with open(source, 'rb') as src:
+        data = brotli.compress(src.read())
+    with open(target, 'wb') as dst:
+        dst.write(data)
+
+
+COMPRESSORS = {'.gz': _gzip, '.br': _brotli}
+
+
+def compress_file(args):
+    '''
+    Writes compressed siblings of the file, returns a list of
+    (extension, size) of written ones. A sibling is considered up to date if
+    it has the same mtime as the file, and is removed if it is not smaller
+    than the file.'''
+    file_path, extensions, force = args
+    st = os.stat(file_path)
+    written = []
+    for extension in extensions:
+        target = file_path + extension
+        if not force and os.path.isfile(target) and \
+                os.stat(target).st_mtime == st.st_mtime:
+            continue
+        COMPRESSORS[extension](file_path, target + '.tmp')
+        size = os.path.getsize(target + '.tmp')
+        if size >= st.st_size:
+            os.remove(target + '.tmp')
+            if os.path.isfile(target):
+                os.remove(target)
+            continue
+        os.utime(target + '.tmp', (st.st_atime, st.st_mtime))
+        os.rename(target + '.tmp', target)
+        written.append((extension, size))
+    return file_path, st.st_size, written
+
+
+class StaticFiles(Cli):
+    '''
+    Static files tools
+
+    :param root: static files directory
+    :param extensions: extensions of files to compress
+    :param min_size: files smaller than this are not compressed
+    :param processes: number of compressing processes, CPU count by default
+    '''
+
+    def __init__(self, root, extensions=COMPRESSIBLE_EXTENSIONS, min_size=256,
+                 processes=None):
+        self.root = root
+        self.extensions = tuple(extensions)
+        self.min_size = min_size
+        self.processes = processes
+
+    def find_files(self):
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            for filename in filenames:
+                file_path = os.path.join(dirpath, filename)
+                if filename.lower().endswith(self.extensions) and \
+                        os.path.getsize(file_path) >= self.min_size:
+                    yield file_path
+
+    def command_precompress(self, force=False):
+        '''
+        Writes .gz (and .br if brotli is installed) siblings of compressible
+        static files for `web.static_files(..., precompressed=True)`.
+        Unchanged files are skipped unless --force is passed::
+
+            ./manage.py static:precompress [--force]
+        '''
+        compressed_extensions = ['.gz']
+        if brotli is not None:
+            compressed_extensions.insert(0, '.br')
+        else:
+            logger.warning('brotli is not installed, only .gz files are '
+                           'written')
+        tasks = [(file_path, compressed_extensions, bool(force))
+                 for file_path in self.find_files()]
+        pool = Pool(self.processes)
+        try:
+            results = list(pool.imap_unordered(compress_file, tasks))
+        finally:
+            pool.close()
+            pool.join()
+        count = 0
+        for file_path, size, written in sorted(results):
+            for extension, compressed_size in written:
+                count += 1
+                sys.stdout.write('{}{}: {} -> {}\n'.format(
+                    os.path.relpath(file_path, self.root), extension,
+                    size, compressed_size))
+        sys.stdout.write('{} files of {} written\n'.format(count, len(tasks)))
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+
+import sys
+
+from .base import Cli
+
+__all__ = ['Templates']
+
+
+class Templates(Cli):
+    '''
+    Jinja2 templates tools
+
+    :param engine: `iktomi.templates.jinja2.TemplateEngine` instance
+    :param target: directory or zip file for compiled templates, the same
+        as `compiled` argument of the engine
+    :param extensions: extensions of template files to compile
+    '''
+
+    def __init__(self, engine, target, extensions=('html',)):
+        self.engine = engine
+        self.target = target
+        self.extensions = extensions
+
+    def command_compile(self):
+        '''
+        Compiles all templates ahead of time, so workers do not compile
+        them on the first request::
+
+            ./manage.py templates:compile
+        '''
+        names = self.engine.compile_templates(self.target,
+                                              extensions=self.extensions)
+        sys.stdout.write('{} templates compiled to {}\n'.format(
+                            len(names), self.target))
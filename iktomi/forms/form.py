@@ -24,6 +24,11 @@ class Form(six.with_metaclass(FormValidationMetaClass, object)):
     template = 'forms/default'
     permissions = DEFAULT_PERMISSIONS
     id = ''
+    #: Render builtin widgets by macros from `widgets/macros` template in
+    #: the same pass as the form template, instead of a separate
+    #: `Widget.render` call for each field (see `Widget.inline_macro`).
+    #: Widget templates overridden by the project are not used then.
+    inline_widgets = False
 
     def __init__(self, env=None, initial=None, name=None, permissions=None):
         initial = initial or {}
@@ -63,7 +68,8 @@ class Form(six.with_metaclass(FormValidationMetaClass, object)):
 
     def render(self):
         '''Proxy method to form's environment render method'''
-        return self.env.template.render(self.template, form=self)
+        return self.env.template.render(self.template, form=self,
+                                        inline_widgets=self.inline_widgets)
 
     @property
     def is_valid(self):
@@ -1,9 +1,25 @@
 # -*- coding: utf-8 -*-
 
+import six
 from ..utils import weakproxy
 from . import convs
 
 
+# {widget class: macro name, None, or False if `render` is redefined}
+_inline_macros = {}
+
+
+def _class_inline_macro(cls):
+    if six.get_unbound_function(cls.render) is not \
+            six.get_unbound_function(Widget.render):
+        return False
+    # the macro must be declared along with the template
+    for base in cls.__mro__:
+        if 'template' in base.__dict__ or 'macro' in base.__dict__:
+            return base.__dict__.get('macro')
+    return None
+
+
 class Widget(object):
 
     # obsolete parameters from previous versions
@@ -11,6 +27,9 @@ class Widget(object):
 
     #: Template to render widget
     template = None
+    #: Name of the macro in `widgets/macros` template rendering the same
+    #: markup as `template`, used by forms with `inline_widgets`
+    macro = None
     #: Value of HTML element's *class* attribute
     classname = ''
     #: describes how the widget is rendered.
@@ -63,6 +82,24 @@ class Widget(object):
     def get_raw_value(self):
         return self.field.raw_value
 
+    @property
+    def inline_macro(self):
+        '''
+        Name of the macro rendering the widget in the same pass as the form
+        template, or `None` if the widget must be rendered by `render`
+        (i.e. it redefines `render` or `template` without `macro`).
+        '''
+        cls = self.__class__
+        macro = _inline_macros.get(cls)
+        if macro is None and cls not in _inline_macros:
+            macro = _inline_macros[cls] = _class_inline_macro(cls)
+        if macro is False:
+            return None
+        # passed to the constructor
+        if 'template' in self.__dict__ or 'macro' in self.__dict__:
+            return self.__dict__.get('macro')
+        return macro
+
     def render(self):
         '''
         Renders widget to template
@@ -84,23 +121,27 @@ class Widget(object):
 class TextInput(Widget):
 
     template = 'widgets/textinput'
+    macro = 'textinput'
     classname = 'textinput'
 
 
 class Textarea(Widget):
 
     template = 'widgets/textarea'
+    macro = 'textarea'
 
 
 class HiddenInput(Widget):
 
     render_type = 'hidden'
     template = 'widgets/hiddeninput'
+    macro = 'hiddeninput'
 
 
 class PasswordInput(Widget):
 
     template = 'widgets/passwordinput'
+    macro = 'passwordinput'
     classname = 'textinput'
 
 
@@ -111,6 +152,7 @@ class Select(Widget):
     :obj:`required` variable.
     '''
     template = 'widgets/select'
+    macro = 'select'
     classname = None
     #: HTML select element's select attribute value.
     size = None
@@ -154,17 +196,20 @@ class CheckBoxSelect(Select):
 
     classname = 'select-checkbox'
     template = 'widgets/select-checkbox'
+    macro = 'select_checkbox'
 
 
 class CheckBox(Widget):
 
     render_type = 'checkbox'
     template = 'widgets/checkbox'
+    macro = 'checkbox'
 
 
 class CharDisplay(Widget):
 
     template = 'widgets/span'
+    macro = 'span'
     classname = 'chardisplay'
     #: If is True, value is escaped while rendering.
     #: Passed to template as :obj:`should_escape` variable.
@@ -204,6 +249,7 @@ class FieldListWidget(AggregateWidget):
 class FieldSetWidget(AggregateWidget):
 
     template = 'widgets/fieldset'
+    macro = 'fieldset'
 
 
 class FieldBlockWidget(FieldSetWidget):
@@ -214,4 +260,5 @@ class FieldBlockWidget(FieldSetWidget):
 class FileInput(Widget):
 
     template = 'widgets/file'
+    macro = 'file'
 
@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 
+import threading
+
 
 class Storage(object):
     def set(self, key, value, time=0):# pragma: no cover
@@ -8,11 +10,16 @@ class Storage(object):
         raise NotImplementedError()
     def delete(self, key):# pragma: no cover
         raise NotImplementedError()
+    def add(self, key, value, time=0):# pragma: no cover
+        '''Sets the value only if the key is not set yet, returns `True` if
+        it was set. Must be atomic, is used for locks.'''
+        raise NotImplementedError()
 
 
 class LocalMemStorage(Storage):
     def __init__(self):
         self.storage = {}
+        self._add_lock = threading.Lock()
 
     def set(self, key, value, time=0):
         self.storage[key] = value
@@ -26,6 +33,12 @@ class LocalMemStorage(Storage):
             del self.storage[key]
         return True
 
+    def add(self, key, value, time=0):
+        with self._add_lock:
+            if key in self.storage:
+                return False
+            return self.set(key, value, time)
+
 
 class MemcachedStorage(Storage):
     def __init__(self, conf):
@@ -44,3 +57,6 @@ class MemcachedStorage(Storage):
 
     def delete(self, key):
         return self.storage.delete(key)
+
+    def add(self, key, value, time=0):
+        return bool(self.storage.add(key, value, time))
@@ -2,10 +2,13 @@
 
 import os
 import logging
+import threading
 logger = logging.getLogger(__name__)
 from glob import glob
 from ..web import Response, request_filter
+from ..web.instrumentation import monotonic
 from ..utils import cached_property
+from .instrumentation import RenderInfo
 
 __all__ = ('Template',)
 
@@ -16,7 +19,16 @@ class TemplateError(Exception):
 
 
 class Template(object):
-    '''Proxy class managing a set of template engines'''
+    '''
+    Proxy class managing a set of template engines
+
+    `cache` enables caching of resolved template names: `True` caches them
+    forever (for production), `'mtime'` re-resolves a name if mtime of
+    directories where it is looked up has changed (for development).
+
+    `instruments` is a list of `iktomi.templates.instrumentation.
+    TemplateInstrument` objects called for each rendered template.
+    '''
 
     def __init__(self, *dirs, **kwargs):
         self.globs = kwargs.get('globs', {})
@@ -27,6 +39,11 @@ class Template(object):
         self.engines = {}
         for template_type, engine in kwargs.get('engines', {}).items():
             self.engines[template_type] = engine
+        # {template_name: ((file_name, engine), directory mtimes)}
+        self._resolved = {}
+        self.instruments = list(kwargs.get('instruments', ()))
+        # stack of nested render infos of the current thread
+        self._rendering = threading.local()
 
     def render(self, template_name, **kw):
         '''
@@ -38,10 +55,88 @@ class Template(object):
         logger.debug('Rendering template "%s"', template_name)
         vars = self.globs.copy()
         vars.update(kw)
+        if self.instruments:
+            return self._render_instrumented(template_name, vars)
         resolved_name, engine = self.resolve(template_name)
         return engine.render(resolved_name, **vars)
 
+    def _render_instrumented(self, template_name, vars):
+        stack = getattr(self._rendering, 'stack', None)
+        if stack is None:
+            stack = self._rendering.stack = []
+        info = RenderInfo(template_name, len(stack))
+        stack.append(info)
+        # the time of the last finished stage
+        checkpoint = monotonic()
+        try:
+            resolved_name, engine = self.resolve(template_name)
+            now = monotonic()
+            info.resolve_time, checkpoint = now - checkpoint, now
+            if not hasattr(engine, 'get_template'):
+                return engine.render(resolved_name, **vars)
+            # separates loading and compiling from rendering
+            template = engine.get_template(resolved_name)
+            now = monotonic()
+            info.load_time, checkpoint = now - checkpoint, now
+            return template.render(**vars)
+        finally:
+            # the time of failed stage is counted as render time
+            info.render_time = monotonic() - checkpoint
+            stack.pop()
+            if stack:
+                stack[-1].nested_time += info.total_time
+            for instrument in self.instruments:
+                instrument.template_rendered(info)
+
+    def stream(self, template_name, buffer_size=None, **kw):
+        '''
+        Same as `render`, but returns an iterator over rendered text chunks.
+        Engines having no `stream` method render the whole template as a
+        single chunk.
+
+        Streamed templates are not reported to `instruments`, since they are
+        rendered while the response body is sent. Templates rendered from
+        them by `render` (i.e. form widgets) are reported as top level ones.
+        '''
+        logger.debug('Streaming template "%s"', template_name)
+        vars = self.globs.copy()
+        vars.update(kw)
+        resolved_name, engine = self.resolve(template_name)
+        if hasattr(engine, 'stream'):
+            return engine.stream(resolved_name, buffer_size=buffer_size,
+                                 **vars)
+        return iter([engine.render(resolved_name, **vars)])
+
     def resolve(self, template_name):
+        '''
+        Returns a file name relative to one of template dirs and an engine
+        for the template name.
+        '''
+        if not self.cache:
+            return self._resolve(template_name)
+        entry = self._resolved.get(template_name)
+        if entry is not None:
+            result, mtimes = entry
+            if self.cache != 'mtime' or \
+                    mtimes == self._mtimes(template_name):
+                return result
+        mtimes = self._mtimes(template_name) if self.cache == 'mtime' \
+                 else None
+        result = self._resolve(template_name)
+        self._resolved[template_name] = (result, mtimes)
+        return result
+
+    def _mtimes(self, template_name):
+        mtimes = []
+        for d in self.dirs:
+            try:
+                mtimes.append(os.stat(os.path.dirname(
+                    os.path.join(d, template_name))).st_mtime)
+            except OSError:
+                mtimes.append(None)
+        return mtimes
+
+    def _resolve(self, template_name):
         pattern = template_name
         if not os.path.splitext(template_name)[1]:
             pattern += '.*'
@@ -56,6 +151,33 @@ class Template(object):
                 'Template or engine for template "{}" not found in '\
                 'directories {!r}'.format(pattern, self.dirs))
 
+    def preload(self):
+        '''
+        Resolves all templates in template dirs at once, so requests do not
+        touch the file system to find them. Used with `cache` enabled::
+
+            template = Template(*dirs, engines=engines, cache=True)
+            template.preload()
+        '''
+        resolved = {}
+        for d in self.dirs:
+            for dirpath, dirnames, filenames in os.walk(d):
+                for filename in filenames:
+                    name, ext = os.path.splitext(filename)
+                    engine = self.engines.get(ext[1:])
+                    if engine is None:
+                        continue
+                    file_name = os.path.join(dirpath, filename)[len(d)+1:]
+                    # the first directory wins, as in `resolve`
+                    resolved.setdefault(file_name, (file_name, engine))
+                    if not os.path.splitext(name)[1]:
+                        resolved.setdefault(os.path.splitext(file_name)[0],
+                                            (file_name, engine))
+        for template_name, result in resolved.items():
+            mtimes = self._mtimes(template_name) if self.cache == 'mtime' \
+                     else None
+            self._resolved[template_name] = (result, mtimes)
+
 
 class BoundTemplate(object):
     '''
@@ -110,3 +232,31 @@ class BoundTemplate(object):
         resp = self.render(template_name, __data)
         return Response(resp,
                         content_type=content_type)
+
+    def stream(self, template_name, __data=None, buffer_size=None, **kw):
+        '''Given a template name and template data.
+        Returns an iterator over rendered text chunks'''
+        return self.template.stream(template_name, buffer_size=buffer_size,
+                                    **self._vars(__data, **kw))
+
+    def stream_to_response(self, template_name, __data,
+                           content_type="text/html", buffer_size=5):
+        '''Given a template name and template data.
+        Returns `webob.Response` object rendering the template while the
+        body is sent. `buffer_size` is a number of template parts joined
+        in one chunk (see `jinja2.TemplateStream.enable_buffering`).
+
+        Template errors occured after the response is started can not be
+        turned into error page, so do all the work that can fail before.
+        The template is not reported to `Template.instruments` (see
+        `Template.stream`).'''
+        chunks = self.stream(template_name, __data, buffer_size=buffer_size)
+        resp = Response(content_type=content_type)
+        resp.app_iter = _encode_iter(chunks, resp.charset)
+        return resp
+
+
+def _encode_iter(chunks, charset):
+    for chunk in chunks:
+        if chunk:
+            yield chunk.encode(charset)
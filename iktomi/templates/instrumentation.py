@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+'''
+Template rendering instrumentation for `iktomi.templates.Template`.
+'''
+
+__all__ = ['TemplateInstrument', 'RenderInfo', 'TemplateTimings']
+
+import threading
+from iktomi.utils.histogram import Histogram
+
+
+class RenderInfo(object):
+    '''
+    Timings of a single `Template.render` call, in seconds.
+
+    `depth` is 0 for templates rendered directly and grows for templates
+    rendered while rendering other ones (i.e. form widgets). `render_time`
+    includes nested renders, `own_time` does not. `load_time` is the time
+    of engine's `get_template` (loading and compiling the template), it is 0
+    for engines having no such method.
+    '''
+
+    __slots__ = ('name', 'depth', 'resolve_time', 'load_time',
+                 'render_time', 'nested_time')
+
+    def __init__(self, name, depth):
+        self.name = name
+        self.depth = depth
+        self.resolve_time = self.load_time = self.render_time = 0
+        self.nested_time = 0
+
+    @property
+    def total_time(self):
+        return self.resolve_time + self.load_time + self.render_time
+
+    @property
+    def own_time(self):
+        return self.total_time - self.nested_time
+
+    def __repr__(self):
+        return '{}({!r}, depth={!r})'.format(self.__class__.__name__,
+                                             self.name, self.depth)
+
+
+class TemplateInstrument(object):
+    '''
+    Base class for `Template` instruments::
+
+        template = Template(*dirs, engines=engines,
+                            instruments=[MyInstrument()])
+
+    Called for each template rendered by `Template.render` (streamed ones
+    are not reported), so it should be cheap.
+    '''
+
+    def template_rendered(self, info):
+        '''Called after the template is rendered or failed'''
+
+
+class TemplateTimings(TemplateInstrument):
+    '''
+    In-process aggregator of rendering time per template name::
+
+        timings = TemplateTimings()
+        template = Template(*dirs, engines=engines, instruments=[timings])
+        ...
+        timings.dump()
+
+    Keeps histograms (in microseconds) of resolve, load, render and own time
+    and counts of nesting depths for each template name.
+    '''
+
+    def __init__(self, precision_bits=7):
+        self.precision_bits = precision_bits
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.templates = {}
+
+    def _template_stats(self, name):
+        stats = self.templates.get(name)
+        if stats is None:
+            stats = self.templates[name] = {
+                'resolve': Histogram(self.precision_bits),
+                'load': Histogram(self.precision_bits),
+                'render': Histogram(self.precision_bits),
+                'own': Histogram(self.precision_bits),
+                'depths': {},
+            }
+        return stats
+
+    def template_rendered(self, info):
+        with self._lock:
+            stats = self._template_stats(info.name)
+            stats['resolve'].record(info.resolve_time * 1e6)
+            stats['load'].record(info.load_time * 1e6)
+            stats['render'].record(info.render_time * 1e6)
+            stats['own'].record(info.own_time * 1e6)
+            depths = stats['depths']
+            depths[info.depth] = depths.get(info.depth, 0) + 1
+
+    def dump(self, percents=(50, 90, 99)):
+        '''
+        Returns a dict {template name: {'resolve': summary, 'load': summary,
+        'render': summary, 'own': summary, 'depths': {depth: count}}}, where
+        summary is `Histogram.summary` in microseconds.'''
+        with self._lock:
+            return dict(
+                (name, dict(
+                    [(key, stats[key].summary(percents))
+                     for key in ('resolve', 'load', 'render', 'own')] +
+                    [('depths', dict(stats['depths']))]))
+                for name, stats in self.templates.items())
+
+    def format(self):
+        '''Returns the dump as a human-readable table sorted by total own
+        time'''
+        lines = ['{:<40} {:>8} {:>10} {:>10} {:>10} {:>10}'.format(
+                    'template', 'count', 'own p50', 'own total', 'render p50',
+                    'load max')]
+        dump = self.dump(percents=(50,))
+        def own_total(name):
+            own = dump[name]['own']
+            return own['mean'] * own['count']
+        for name in sorted(dump, key=own_total, reverse=True):
+            stats = dump[name]
+            lines.append('{:<40} {:>8} {:>10} {:>10} {:>10} {:>10}'.format(
+                    name, stats['own']['count'], stats['own']['p50'],
+                    int(own_total(name)), stats['render']['p50'],
+                    stats['load']['max']))
+        return '\n'.join(lines)
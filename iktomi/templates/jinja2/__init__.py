@@ -1,12 +1,21 @@
 # -*- coding: utf-8 -*-
 
+import os
+import six
+import time
+import uuid
+import hashlib
+import threading
 from os.path import dirname, abspath, join
 import logging
 logger = logging.getLogger(__name__)
 
 import jinja2
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
 
-__all__ = ('TemplateEngine', 'TEMPLATE_DIR')
+__all__ = ('TemplateEngine', 'FragmentCacheExtension', 'TEMPLATE_DIR')
 
 CURDIR = dirname(abspath(__file__))
 TEMPLATE_DIR = join(CURDIR, 'templates')
@@ -15,24 +24,203 @@ TEMPLATE_DIR = join(CURDIR, 'templates')
 class TemplateEngine(object):
     '''
     Jinja2 engine adapter.
+
+    Production setup compiling templates once for all workers::
+
+        engine = TemplateEngine(paths, cache='/var/cache/app/jinja2',
+                                auto_reload=False)
     '''
-    def __init__(self, paths, cache=False, extensions=None):
+    def __init__(self, paths, cache=False, extensions=None, auto_reload=True,
+                 compiled=None):
         '''
         :param paths: list of paths
+        :param cache: bytecode cache: directory path shared by workers,
+            `jinja2.BytecodeCache` instance or `True` for a directory in
+            system temp dir
         :param extensions: list of extensions
+        :param auto_reload: check if template files are changed
+        :param compiled: directory or zip file with templates compiled by
+            `compile_templates`, templates missing there are loaded from
+            `paths`
         '''
+        self.paths = paths
         self.extensions = extensions or []
+        self.cache = cache
+        self.auto_reload = auto_reload
+        self.compiled = compiled
         self.env = self._make_env(paths)
 
 
     def _make_env(self, paths):
         # XXX make an interface method
+        loader = jinja2.FileSystemLoader(paths)
+        if self.compiled is not None:
+            # compiled templates are never reloaded
+            loader = jinja2.ChoiceLoader([jinja2.ModuleLoader(self.compiled),
+                                          loader])
         return jinja2.Environment(
-            loader=jinja2.FileSystemLoader(paths),
+            loader=loader,
             autoescape=True,
-            extensions=self.extensions
+            extensions=self.extensions,
+            auto_reload=self.auto_reload,
+            bytecode_cache=self._bytecode_cache(),
         )
 
+    def _bytecode_cache(self):
+        if self.cache is True:
+            return jinja2.FileSystemBytecodeCache()
+        if isinstance(self.cache, six.string_types):
+            if not os.path.isdir(self.cache):
+                os.makedirs(self.cache)
+            return jinja2.FileSystemBytecodeCache(self.cache)
+        return self.cache or None
+
+    def compile_templates(self, target, extensions=None):
+        '''
+        Compiles all templates to `target` directory, or to zip file if it
+        ends with `.zip`, to be used as `compiled` argument. Raises
+        `jinja2.TemplateSyntaxError` if a template can not be compiled.
+        Returns a list of compiled template names.
+        '''
+        # templates are always compiled from sources
+        env = self.env.overlay(loader=jinja2.FileSystemLoader(self.paths))
+        names = env.list_templates(extensions=extensions)
+        zip = 'deflated' if target.endswith('.zip') else None
+        env.compile_templates(target, zip=zip, ignore_errors=False,
+                              filter_func=set(names).__contains__)
+        return names
+
     def render(self, template_name, **kw):
         'Interface method called from `Template.render`'
         return self.env.get_template(template_name).render(**kw)
+
+    def get_template(self, template_name):
+        '''Optional interface method, returns loaded template object with
+        `render(**kw)` method'''
+        return self.env.get_template(template_name)
+
+    def stream(self, template_name, buffer_size=None, **kw):
+        'Interface method called from `Template.stream`'
+        stream = self.env.get_template(template_name).stream(**kw)
+        if buffer_size:
+            stream.enable_buffering(buffer_size)
+        return stream
+
+
+class FragmentCacheExtension(Extension):
+    '''
+    Jinja2 extension caching rendered template fragments in
+    `iktomi.storage.Storage`::
+
+        engine = TemplateEngine(paths, extensions=[FragmentCacheExtension])
+        engine.env.install_fragment_cache(memcached_storage, ttl=300)
+
+    In templates::
+
+        {% cache "menu", lang, ttl=600 %}...{% endcache %}
+        {% cache "sidebar", location=True %}...{% endcache %}
+
+    The fragment name and other arguments make the key, `location=True`
+    adds `env.current_location` (`env` template variable is required).
+    Without installed storage fragments are rendered as usual.
+
+    `env.invalidate_fragment(name)` invalidates all fragments with the name,
+    changing `version` passed to `install_fragment_cache` invalidates all
+    fragments (i.e. on deploy). Counts of hits and misses by fragment name
+    are in `env.fragment_cache_stats`.
+    '''
+
+    tags = set(['cache'])
+
+    def __init__(self, environment):
+        super(FragmentCacheExtension, self).__init__(environment)
+        environment.extend(
+            fragment_cache_storage=None,
+            fragment_cache_ttl=300,
+            fragment_cache_version='',
+            fragment_cache_prefix='fragment:',
+            fragment_cache_stats={},
+            install_fragment_cache=self._install,
+            invalidate_fragment=self._invalidate,
+        )
+        self._stats_lock = threading.Lock()
+
+    def _install(self, storage, ttl=300, version='', prefix='fragment:'):
+        environment = self.environment
+        environment.fragment_cache_storage = storage
+        environment.fragment_cache_ttl = ttl
+        environment.fragment_cache_version = version
+        environment.fragment_cache_prefix = prefix
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        kwargs = []
+        while parser.stream.skip_if('comma'):
+            if parser.stream.current.type == 'name' and \
+                    parser.stream.look().type == 'assign':
+                key = parser.stream.current.value
+                parser.stream.skip(2)
+                kwargs.append(nodes.Keyword(key, parser.parse_expression()))
+            else:
+                args.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        call = self.call_method('_cache',
+                                [nodes.ContextReference(), nodes.List(args)],
+                                kwargs)
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _name_version_key(self, name):
+        return self.environment.fragment_cache_prefix + 'version:' + name
+
+    def _name_version(self, storage, name):
+        key = self._name_version_key(name)
+        version = storage.get(key)
+        if version is None:
+            # the version is unknown (i.e. evicted), so the fragments
+            # stored before must not be used
+            storage.add(key, uuid.uuid4().hex)
+            version = storage.get(key, '')
+        return version
+
+    def _invalidate(self, name):
+        storage = self.environment.fragment_cache_storage
+        if storage is not None:
+            storage.set(self._name_version_key(name), uuid.uuid4().hex)
+
+    def fragment_key(self, storage, name, parts):
+        environment = self.environment
+        key = u'\0'.join([six.text_type(environment.fragment_cache_version),
+                          six.text_type(self._name_version(storage, name)),
+                          name] +
+                         [six.text_type(part) for part in parts])
+        # memcached keys are limited in length and charset
+        return environment.fragment_cache_prefix + \
+               hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def _count(self, name, counter):
+        with self._stats_lock:
+            stats = self.environment.fragment_cache_stats.setdefault(
+                            name, {'hits': 0, 'misses': 0})
+            stats[counter] += 1
+
+    def _cache(self, context, args, ttl=None, location=False, caller=None):
+        storage = self.environment.fragment_cache_storage
+        if storage is None:
+            return caller()
+        name, parts = six.text_type(args[0]), list(args[1:])
+        if location:
+            parts.append(context['env'].current_location)
+        key = self.fragment_key(storage, name, parts)
+        entry = storage.get(key)
+        # not all storages expire values (i.e. LocalMemStorage)
+        if entry is not None and time.time() < entry['expires']:
+            self._count(name, 'hits')
+            return Markup(entry['value'])
+        self._count(name, 'misses')
+        value = caller()
+        if ttl is None:
+            ttl = self.environment.fragment_cache_ttl
+        storage.set(key, {'value': six.text_type(value),
+                          'expires': time.time() + ttl}, ttl)
+        return value
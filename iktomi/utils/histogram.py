@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+'''
+Compact latency histogram with log-linear buckets (HDR histogram style).
+'''
+
+__all__ = ['Histogram']
+
+
+class Histogram(object):
+    '''
+    Records non-negative integer values (i.e. microseconds) with bounded
+    relative error. Values below `2 ** precision_bits` are stored exactly,
+    larger values are grouped in buckets, each power of two range divided in
+    `2 ** (precision_bits - 1)` linear sub-buckets, so relative error is less
+    than `1 / 2 ** (precision_bits - 1)` (1.6% by default).
+
+    Only non-empty buckets are stored, so the memory does not depend on
+    value range.
+    '''
+
+    def __init__(self, precision_bits=7):
+        self.precision_bits = precision_bits
+        self._sub_bucket_count = 1 << precision_bits
+        self._half_count = self._sub_bucket_count >> 1
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def _index(self, value):
+        if value < self._sub_bucket_count:
+            return value
+        shift = value.bit_length() - self.precision_bits
+        return self._sub_bucket_count + (shift - 1) * self._half_count + \
+               (value >> shift) - self._half_count
+
+    def _value(self, index):
+        '''Returns the highest value equivalent to the bucket'''
+        if index < self._sub_bucket_count:
+            return index
+        shift, sub_bucket = divmod(index - self._sub_bucket_count,
+                                   self._half_count)
+        shift += 1
+        return ((sub_bucket + self._half_count + 1) << shift) - 1
+
+    def record(self, value, count=1):
+        value = int(value)
+        if value < 0:
+            raise ValueError('Negative value {}'.format(value))
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.count += count
+        self.total += value * count
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        assert other.precision_bits == self.precision_bits
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None and (self.min is None or
+                                      other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or
+                                      other.max > self.max):
+            self.max = other.max
+
+    @property
+    def mean(self):
+        if not self.count:
+            return None
+        return float(self.total) / self.count
+
+    def percentile(self, percent):
+        '''Returns a value at given percentile (0-100), `None` if empty'''
+        if not self.count:
+            return None
+        threshold = max(1, self.count * percent / 100.0)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= threshold:
+                return min(self._value(index), self.max)
+        return self.max # pragma: no cover, float rounding safety
+
+    def summary(self, percents=(50, 90, 99, 99.9)):
+        '''Returns a dict with count, min, max, mean and percentiles'''
+        result = {'count': self.count, 'min': self.min, 'max': self.max,
+                  'mean': self.mean}
+        for percent in percents:
+            result['p{:g}'.format(percent)] = self.percentile(percent)
+        return result
+
+    def __repr__(self):
+        return '{}(count={}, min={}, max={})'.format(
+                    self.__class__.__name__, self.count, self.min, self.max)
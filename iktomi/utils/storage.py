@@ -7,6 +7,8 @@ class StorageFrame(object):
 
     '''A single frame in the storage'''
 
+    __slots__ = ('_parent_storage', '__dict__', '__weakref__')
+
     def __init__(self, _parent_storage=None, **kwargs):
         self._parent_storage = _parent_storage
         self.__dict__.update(kwargs)
@@ -14,12 +16,14 @@ class StorageFrame(object):
     def as_dict(self):
         d = dict(self._parent_storage.as_dict() if self._parent_storage else {},
                  **self.__dict__)
-        # XXX delete _parent_storage?
-        del d['_parent_storage']
         if '_root_storage' in d:
             del d['_root_storage']
         return d
 
+
+_missing = object()
+
+
 class VersionedStorage(object):
     '''Storage implements state managing interface, allowing to safely set
     attributes for `env` and `data` objects.
@@ -32,43 +36,113 @@ class VersionedStorage(object):
 
     Regular methods will hold the state of storage frame they are added to.
     If you want to have an access to actual value, use storage property and
-    method decorators.'''
+    method decorators.
+
+    Frames are copy-on-write: `_push` without arguments only marks a new
+    level, the frame is allocated on the first attribute set. So routing
+    branches which only read the storage do not allocate anything.
+
+    Values set on pushed levels are also kept in a flat index with an undo log
+    per level, so attribute lookup does not walk the frames.'''
+
+    __slots__ = ('_storage', '_root', '_levels', '_index', '__weakref__')
 
     def __init__(self, cls=StorageFrame, *args, **kwargs):
+        # one item per pushed level: None if a frame is not allocated for
+        # the level yet, otherwise {name: previous value in index}
+        object.__setattr__(self, '_levels', [])
+        # name: value set on pushed levels
+        object.__setattr__(self, '_index', {})
+        object.__setattr__(self, '_storage', None)
+        object.__setattr__(self, '_root', None)
         kwargs['_root_storage'] = self
-        self._storage = cls(*args, **kwargs)
+        root = cls(*args, **kwargs)
+        object.__setattr__(self, '_storage', root)
+        object.__setattr__(self, '_root', root)
 
     def _push(self, **kwargs):
-        self._storage = StorageFrame(_parent_storage=self._storage, **kwargs)
-        return self._storage
+        '''Starts a new level of the storage. Returns the frame of the level
+        if it is allocated (i.e. initial values are given), `None` otherwise'''
+        if not kwargs:
+            self._levels.append(None)
+            return None
+        frame = StorageFrame(_parent_storage=self._storage, **kwargs)
+        object.__setattr__(self, '_storage', frame)
+        index = self._index
+        undo = {}
+        for name, value in kwargs.items():
+            undo[name] = index.get(name, _missing)
+            index[name] = value
+        self._levels.append(undo)
+        return frame
 
     def _pop(self):
-        self._storage = self._storage._parent_storage
+        undo = self._levels.pop()
+        if undo is not None:
+            index = self._index
+            for name, value in undo.items():
+                if value is _missing:
+                    del index[name]
+                else:
+                    index[name] = value
+            object.__setattr__(self, '_storage', self._storage._parent_storage)
+
+    def _materialize(self):
+        '''Allocates a frame for the current level if it is not done yet.
+        Returns undo log of the level or `None` for the root level.'''
+        levels = self._levels
+        if not levels:
+            return None
+        undo = levels[-1]
+        if undo is None:
+            object.__setattr__(self, '_storage',
+                               StorageFrame(_parent_storage=self._storage))
+            undo = levels[-1] = {}
+        return undo
 
     def __getattr__(self, name):
-        frame = self._storage
-        while frame:
-            try:
-                return getattr(frame, name)
-            except AttributeError:
-                frame = frame._parent_storage
-        #raise AttributeError(name)
-        raise AttributeError("{} has no attribute {}".format(
-                             self.__class__.__name__, name))
+        if name in _own_attributes:
+            # not initialized yet, i.e. while unpickling or copying
+            raise AttributeError(name)
+        index = self._index
+        if name in index:
+            return index[name]
+        value = getattr(self._root, name, _missing)
+        if value is _missing:
+            raise AttributeError("{} has no attribute {}".format(
+                                 self.__class__.__name__, name))
+        return value
 
     def __setattr__(self, name, value):
-        if name == '_storage':
-            self.__dict__[name] = value
-        else:
-            setattr(self._storage, name, value)
+        if name in _own_attributes:
+            object.__setattr__(self, name, value)
+            return
+        undo = self._materialize()
+        setattr(self._storage, name, value)
+        if undo is not None:
+            if name not in undo:
+                undo[name] = self._index.get(name, _missing)
+            self._index[name] = value
 
     def __delattr__(self, name):
+        levels = self._levels
+        if levels and levels[-1] is None:
+            # nothing is set on the current level
+            raise AttributeError(name)
         delattr(self._storage, name)
+        if levels and name in levels[-1]:
+            previous = levels[-1].pop(name)
+            if previous is _missing:
+                del self._index[name]
+            else:
+                self._index[name] = previous
 
     def as_dict(self):
         '''Returns attributes of storage as dict'''
         return self._storage.as_dict()
 
+_own_attributes = frozenset(VersionedStorage.__slots__)
+
 
 class storage_property_base(object):
 
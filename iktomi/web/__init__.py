@@ -1,3 +1,4 @@
+import sys
 from webob import Request, Response
 from .core import *
 from .app import *
@@ -5,3 +6,8 @@ from .filters import *
 from .reverse import *
 from .url import *
 from .testing import *
+from .instrumentation import *
+from .prometheus import *
+from .cache import *
+if sys.version_info >= (3, 5):
+    from .asgi import *
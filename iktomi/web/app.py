@@ -10,6 +10,7 @@ from webob.exc import HTTPException, HTTPInternalServerError, \
 from webob import Request
 from .route_state import RouteState
 from .reverse import Reverse
+from .instrumentation import DispatchInfo, monotonic
 
 logger = logging.getLogger(__name__)
 
@@ -53,6 +54,9 @@ class AppEnvironment(StorageFrame):
         else:
             self.root = root
 
+    # set by `Application` if there are instruments
+    _dispatch_info = None
+
     def gettext(self, message):
         return message
 
@@ -79,15 +83,31 @@ class Application(object):
     WSGI application made from `iktomi.web.WebHandler' instance::
 
         wsgi_app = Application(app, env_class=FrontEnvironment)
+
+    If `compile_routes=True` is passed, `web.cases` handlers in the tree are
+    replaced by compiled ones, calling only branches with static url prefix
+    matching the request path.
+
+    If `freeze=True` is passed, the handler is replaced by its frozen copy
+    (see `WebHandler.freeze`).
+
+    `instruments` is a list of `iktomi.web.Instrument` objects, called before
+    and after each request with its timings (see `iktomi.web.RouteTimings`).
     '''
 
     env_class = AppEnvironment
 
-    def __init__(self, handler, env_class=None):
+    def __init__(self, handler, env_class=None, compile_routes=False,
+                 freeze=False, instruments=None):
+        if compile_routes:
+            handler = handler._compile()
+        if freeze:
+            handler = handler.freeze()
         self.handler = handler
         if env_class is not None:
             self.env_class = env_class
         self.root = Reverse.from_handler(handler)
+        self.instruments = list(instruments or ())
 
     def handle_error(self, env):
         '''
@@ -117,6 +137,31 @@ class Application(object):
             response = HTTPInternalServerError()
         return response
 
+    def handle_instrumented(self, env, data):
+        '''
+        Calls `handle` with `env._dispatch_info` set and notifies
+        instruments. The handler time ends when the response is returned,
+        so it does not include iterating a streamed body (i.e. responses of
+        `stream_to_response` or `FileApp`).'''
+        info = env._dispatch_info = env._route_state.dispatch_info = \
+                DispatchInfo()
+        for instrument in self.instruments:
+            instrument.pre_dispatch(env, info)
+        info.started = monotonic()
+        response = None
+        try:
+            response = self.handle(env, data)
+        finally:
+            info.finished = monotonic()
+            if response is None:
+                info.status = 500
+            else:
+                # WSGI apps (i.e. webob FileApp) have no status until called
+                info.status = getattr(response, 'status_int', None)
+            for instrument in self.instruments:
+                instrument.post_dispatch(env, info)
+        return response
+
     def __call__(self, environ, start_response):
         '''
         WSGI interface method.
@@ -130,7 +175,10 @@ class Application(object):
         request = Request(environ, charset='utf-8')
         env = VersionedStorage(self.env_class, request=request, root=self.root)
         data = VersionedStorage()
-        response = self.handle(env, data)
+        if self.instruments:
+            response = self.handle_instrumented(env, data)
+        else:
+            response = self.handle(env, data)
         try:
             result = response(environ, start_response)
         except Exception:
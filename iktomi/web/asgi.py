@@ -0,0 +1,443 @@
+# -*- coding: utf-8 -*-
+'''
+ASGI application running the same handler trees as `Application`, but
+allowing handlers to be coroutines::
+
+    async def item(env, data):
+        doc = await load_doc(data.id)
+        return env.template.render_to_response('item', dict(doc=doc))
+
+    app = web.cases(
+        web.match('/', 'index') | index,
+        web.match('/<int:id>', 'item') | item,
+    )
+    asgi_app = AsyncApplication(app)
+
+Handlers provided by iktomi (`cases`, `match`, `prefix`, `namespace`,
+`subdomain`, `method`, `compress`, `cache_response`, `conditional_get`,
+`request_filter` and `iktomi.auth.CookieAuth`) await the next handler, sync
+handlers are called as usual. Functions wrapped by `request_filter` can be
+coroutine functions, awaiting `next_handler(env, data)`. Sync ones are run
+in a separate thread, their `next_handler` runs the rest of the chain in the
+event loop and returns its result, so they work as under WSGI at the cost
+of a thread per call.
+
+The response body is sent chunk by chunk as it is iterated.
+
+Custom `WebHandler` subclasses calling `self.next_handler` should define
+`async def __call__` and use `await async_call(self.next_handler, env,
+data)`, or register an async implementation::
+
+    @async_call.register(MyHandler)
+    async def _(handler, env, data):
+        ...
+
+Requires Python 3.5+.
+'''
+
+__all__ = ['AsyncApplication', 'async_call']
+
+import io
+import sys
+import time
+import asyncio
+import inspect
+import logging
+import functools
+import threading
+from webob import Request
+from webob.exc import HTTPException, HTTPInternalServerError, \
+                      HTTPNotFound, HTTPMethodNotAllowed
+from iktomi.utils.storage import VersionedStorage
+from .core import cases, _compiled_cases, _FunctionWrapper3
+from .filters import match, prefix, namespace, subdomain, method, \
+                     compress, update_data
+from .cache import cache_response, conditional_get, ResponseVersion
+from .app import Application, is_host_valid
+from .instrumentation import DispatchInfo, monotonic
+
+logger = logging.getLogger(__name__)
+
+
+# implementations for classes which can not be imported here,
+# registered on first call
+_lazy_implementations = {}
+_seen_classes = set()
+
+
+@functools.singledispatch
+async def async_call(handler, env, data):
+    '''Calls the handler, awaiting the result if needed'''
+    cls = handler.__class__
+    if cls not in _seen_classes:
+        _seen_classes.add(cls)
+        for base in cls.__mro__:
+            name = base.__module__ + '.' + base.__name__
+            if name in _lazy_implementations:
+                async_call.register(cls, _lazy_implementations[name])
+                return await async_call(handler, env, data)
+    result = handler(env, data)
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+
+@async_call.register(cases)
+async def _cases(handler, env, data):
+    for branch in handler.handlers:
+        env._push()
+        data._push()
+        try:
+            result = await async_call(branch, env, data)
+        finally:
+            env._pop()
+            data._pop()
+        if result is not None:
+            return result
+
+
+@async_call.register(_compiled_cases)
+async def _compiled_cases_call(handler, env, data):
+    for branch in handler._candidates(env._route_state.path):
+        env._push()
+        data._push()
+        try:
+            result = await async_call(branch, env, data)
+        finally:
+            env._pop()
+            data._pop()
+        if result is not None:
+            return result
+
+
+@async_call.register(match)
+async def _match(handler, env, data):
+    route_state = env._route_state
+    matched, kwargs = handler.builder.match(route_state.path, env=env)
+    if matched is not None:
+        env.current_url_name = handler.url_name
+        if route_state.dispatch_info is not None:
+            route_state.dispatch_info.route_matched(env.current_location)
+        update_data(data, kwargs)
+        return await async_call(handler.next_handler, env, data)
+    return None
+
+
+@async_call.register(prefix)
+async def _prefix(handler, env, data):
+    matched, kwargs = handler.builder.match(env._route_state.path, env=env)
+    if matched is not None:
+        update_data(data, kwargs)
+        env._route_state = env._route_state.add_prefix(matched)
+        result = await async_call(handler.next_handler, env, data)
+        if result is not None:
+            return result
+    return None
+
+
+@async_call.register(namespace)
+async def _namespace(handler, env, data):
+    if hasattr(env, 'namespace'):
+        env.namespace += '.' + handler.namespace
+    else:
+        env.namespace = handler.namespace
+    return await async_call(handler.next_handler, env, data)
+
+
+@async_call.register(subdomain)
+async def _subdomain(handler, env, data):
+    if handler.match_subdomain(env):
+        return await async_call(handler.next_handler, env, data)
+    return None
+
+
+@async_call.register(method)
+async def _method(handler, env, data):
+    if env.request.method in handler._names:
+        return await async_call(handler.next_handler, env, data)
+    if handler.strict:
+        raise HTTPMethodNotAllowed()
+    return None
+
+
+@async_call.register(compress)
+async def _compress(handler, env, data):
+    response = await async_call(handler.next_handler, env, data)
+    if response is None:
+        return None
+    return handler.compress_response(env, response)
+
+
+@async_call.register(cache_response)
+async def _cache_response(handler, env, data):
+    key = handler.cache_key(env)
+    if key is None:
+        return await async_call(handler.next_handler, env, data)
+    entry = handler.get_entry(key)
+    if entry is not None and time.time() < entry['fresh_until']:
+        return handler.entry_response(entry)
+    locked = handler.lock(key)
+    if not locked:
+        if entry is None:
+            deadline = time.time() + handler.lock_timeout
+            while entry is None and not locked and \
+                    time.time() < deadline:
+                await asyncio.sleep(handler.poll_interval)
+                entry = handler.get_entry(key)
+                if entry is None:
+                    locked = handler.lock(key)
+        if entry is not None:
+            return handler.entry_response(entry)
+    try:
+        response = await async_call(handler.next_handler, env, data)
+        if locked and env.request.method == 'GET':
+            handler.store(key, response)
+    finally:
+        if locked:
+            handler.unlock(key)
+    return response
+
+
+@async_call.register(conditional_get)
+async def _conditional_get(handler, env, data):
+    env.response_version = ResponseVersion(env.request, salt=handler.salt)
+    response = await async_call(handler.next_handler, env, data)
+    if response is None:
+        return None
+    return handler.process_response(env, response)
+
+
+def _call_in_thread(loop, func, *args):
+    '''Calls `func` in a new thread, returns a future of its result'''
+    future = loop.create_future()
+    def set_result(result, exc):
+        if future.cancelled():
+            return
+        if exc is None:
+            future.set_result(result)
+        else:
+            future.set_exception(exc)
+    def run():
+        try:
+            result = func(*args)
+        except BaseException as e:
+            loop.call_soon_threadsafe(set_result, None, e)
+        else:
+            loop.call_soon_threadsafe(set_result, result, None)
+    # a thread per call: sync filters wait for the chain below them, which
+    # may call other sync filters, so a bounded pool could deadlock
+    thread = threading.Thread(target=run)
+    thread.daemon = True
+    thread.start()
+    return future
+
+
+@async_call.register(_FunctionWrapper3)
+async def _function_wrapper(handler, env, data):
+    if inspect.iscoroutinefunction(handler.handler):
+        next_handler = functools.partial(async_call, handler.next_handler)
+        return await handler.handler(env, data, next_handler)
+    loop = asyncio.get_event_loop()
+    def next_handler(env, data):
+        # called from the filter thread, the chain is dispatched by the loop
+        return asyncio.run_coroutine_threadsafe(
+                async_call(handler.next_handler, env, data), loop).result()
+    result = await _call_in_thread(loop, handler.handler, env, data,
+                                   next_handler)
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+
+async def _cookie_auth(handler, env, data):
+    user = handler.authenticate(env)
+    if inspect.isawaitable(user):
+        user = await user
+    logger.debug('Authenticated: %r', user)
+    env.user = user
+    try:
+        result = await async_call(handler.next_handler, env, data)
+    finally:
+        del env.user
+    return result
+_lazy_implementations['iktomi.auth.CookieAuth'] = _cookie_auth
+
+
+def _wsgi_environ(scope, body):
+    '''Returns WSGI environ for ASGI HTTP connection scope'''
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8')\
+                                                 .decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_PROTOCOL': 'HTTP/' + scope.get('http_version', '1.1'),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': False,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+        'asgi.scope': scope,
+    }
+    server = scope.get('server') or ('localhost', 80)
+    environ['SERVER_NAME'] = server[0]
+    environ['SERVER_PORT'] = str(server[1])
+    client = scope.get('client')
+    if client:
+        environ['REMOTE_ADDR'] = client[0]
+    for name, value in scope.get('headers', ()):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = 'HTTP_' + name
+        value = value.decode('latin-1')
+        if name in environ:
+            value = environ[name] + ',' + value
+        environ[name] = value
+    # the body is already read, it may be sent chunked
+    environ['CONTENT_LENGTH'] = str(len(body))
+    environ.setdefault('HTTP_HOST', server[0] if server[1] in (80, 443)
+                       else '{}:{}'.format(*server))
+    return environ
+
+
+class AsyncApplication(Application):
+    '''
+    ASGI application made from `iktomi.web.WebHandler` instance::
+
+        asgi_app = AsyncApplication(app, env_class=FrontEnvironment)
+
+    Accepts the same arguments as `Application`. Request body is read before
+    the handler is called, response is sent after the handler has returned.
+    '''
+
+    async def handle(self, env, data):
+        '''
+        Awaits the application, handles errors like `Application.handle`.
+        '''
+        try:
+            response = await async_call(self.handler, env, data)
+            if response is None:
+                logger.debug('Application returned None '
+                             'instead of Response object')
+                response = HTTPNotFound()
+        except HTTPException as e:
+            response = e
+        except Exception as e:
+            self.handle_error(env)
+            response = HTTPInternalServerError()
+        return response
+
+    async def handle_instrumented(self, env, data):
+        # the handler time does not include sending a streamed body
+        info = env._dispatch_info = env._route_state.dispatch_info = \
+                DispatchInfo()
+        for instrument in self.instruments:
+            instrument.pre_dispatch(env, info)
+        info.started = monotonic()
+        response = None
+        try:
+            response = await self.handle(env, data)
+        finally:
+            info.finished = monotonic()
+            if response is None:
+                info.status = 500
+            else:
+                # WSGI apps (i.e. webob FileApp) have no status until called
+                info.status = getattr(response, 'status_int', None)
+            for instrument in self.instruments:
+                instrument.post_dispatch(env, info)
+        return response
+
+    async def __call__(self, scope, receive, send):
+        '''
+        ASGI interface method.
+        '''
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] != 'http':
+            raise ValueError('Unsupported scope type {!r}'
+                             .format(scope['type']))
+        body = []
+        more_body = True
+        while more_body:
+            message = await receive()
+            body.append(message.get('body', b''))
+            more_body = message.get('more_body', False)
+        environ = _wsgi_environ(scope, b''.join(body))
+
+        if not is_host_valid(environ['HTTP_HOST']):
+            logger.warning('Unusual header "Host: {}", return HTTPNotFound'\
+                           .format(environ['HTTP_HOST']))
+            response = HTTPNotFound()
+            env = None
+        else:
+            request = Request(environ, charset='utf-8')
+            env = VersionedStorage(self.env_class, request=request,
+                                   root=self.root)
+            data = VersionedStorage()
+            if self.instruments:
+                response = await self.handle_instrumented(env, data)
+            else:
+                response = await self.handle(env, data)
+        await self._send_response(response, environ, env, send)
+
+    async def _send_response(self, response, environ, env, send):
+        started = []
+        def start_response(status, headers, exc_info=None):
+            started[:] = [status, headers]
+        try:
+            app_iter = response(environ, start_response)
+        except Exception:
+            self.handle_error(env)
+            app_iter = HTTPInternalServerError()(environ, start_response)
+        headers_sent = False
+        try:
+            try:
+                # start_response may be called on the first iteration
+                for chunk in app_iter:
+                    if not headers_sent:
+                        await self._send_start(started, send)
+                        headers_sent = True
+                    if chunk:
+                        await send({'type': 'http.response.body',
+                                    'body': chunk, 'more_body': True})
+            except Exception:
+                self.handle_error(env)
+                if headers_sent:
+                    # too late to change the status
+                    await send({'type': 'http.response.body', 'body': b''})
+                    return
+                error_iter = HTTPInternalServerError()(environ,
+                                                       start_response)
+                await self._send_start(started, send)
+                await send({'type': 'http.response.body',
+                            'body': b''.join(error_iter)})
+                return
+            if not headers_sent:
+                await self._send_start(started, send)
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            close = getattr(app_iter, 'close', None)
+            if close is not None:
+                close()
+
+    async def _send_start(self, started, send):
+        status, headers = started
+        await send({
+            'type': 'http.response.start',
+            'status': int(status.split(' ', 1)[0]),
+            'headers': [(name.lower().encode('latin-1'),
+                         value.encode('latin-1'))
+                        for name, value in headers],
+        })
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+
+__all__ = ['cache_response', 'conditional_get', 'ResponseVersion']
+
+import six
+import time
+import hashlib
+import logging
+from webob import Response
+from webob.exc import HTTPException, HTTPNotModified
+from .core import WebHandler
+
+logger = logging.getLogger(__name__)
+
+
+def _has_user(env):
+    return getattr(env, 'user', None) is not None
+
+
+class cache_response(WebHandler):
+    '''
+    Caches full responses of next handlers in `iktomi.storage.Storage` and
+    returns them without calling next handlers::
+
+        web.cache_response(memcached_storage, ttl=60,
+                           vary=['Accept-Language']) | news_app
+
+    The key is made of host, path, query string and values of `vary` request
+    headers, or is returned by `key(env)` function (`None` to skip caching).
+    Only GET and HEAD requests are cached, HEAD requests share entries with
+    GET ones. Only responses with status in `statuses` are stored, except
+    ones setting cookies, having `private` or `no-store` cache control, or
+    varying on headers not listed in `vary` (i.e. `web.compress` responses
+    are stored only with `vary=['Accept-Encoding']`).
+
+    Expired responses are served during `stale_ttl` seconds while a single
+    request (holding a lock in the storage) renders a new one. On a miss
+    concurrent requests wait up to `lock_timeout` seconds for the request
+    holding the lock instead of rendering the same page, or until the lock
+    is released without storing the response.
+
+    Caching is bypassed if `bypass(env)` returns True, by default if
+    `env.user` is set (see `iktomi.auth.CookieAuth`).
+    '''
+
+    def __init__(self, storage, ttl, key=None, vary=(), stale_ttl=0,
+                 lock_timeout=10, bypass=_has_user, statuses=(200,),
+                 key_prefix='response:'):
+        self.storage = storage
+        self.ttl = ttl
+        self.vary = tuple(vary)
+        self._vary_names = frozenset(name.lower() for name in self.vary)
+        self.stale_ttl = stale_ttl
+        self.lock_timeout = lock_timeout
+        self.bypass = bypass
+        self.statuses = tuple(statuses)
+        self.key_prefix = key_prefix
+        if key is not None:
+            self.make_key = key
+
+    # interval of checks of a page rendered by other request
+    poll_interval = 0.05
+
+    def make_key(self, env):
+        request = env.request
+        parts = [request.host, request.path_qs]
+        for header in self.vary:
+            parts.append(request.headers.get(header, ''))
+        return '\n'.join(parts)
+
+    def cache_key(self, env):
+        '''Returns storage key for the request or `None` if the request must
+        not be cached'''
+        if env.request.method not in ('GET', 'HEAD') or \
+                (self.bypass is not None and self.bypass(env)):
+            return None
+        key = self.make_key(env)
+        if key is None:
+            return None
+        # memcached keys are limited in length and charset
+        return self.key_prefix + hashlib.sha1(key.encode('utf-8'))\
+                                        .hexdigest()
+
+    def cache_response(self, env, data):
+        key = self.cache_key(env)
+        if key is None:
+            return self.next_handler(env, data)
+        entry = self.get_entry(key)
+        if entry is not None and time.time() < entry['fresh_until']:
+            return self.entry_response(entry)
+        locked = self.lock(key)
+        if not locked:
+            if entry is None:
+                # someone is rendering the page
+                deadline = time.time() + self.lock_timeout
+                while entry is None and not locked and \
+                        time.time() < deadline:
+                    time.sleep(self.poll_interval)
+                    entry = self.get_entry(key)
+                    if entry is None:
+                        # the response was not stored (i.e. not cacheable)
+                        # if the lock is released
+                        locked = self.lock(key)
+            if entry is not None:
+                return self.entry_response(entry)
+        try:
+            response = self.next_handler(env, data)
+            if locked and env.request.method == 'GET':
+                self.store(key, response)
+        finally:
+            if locked:
+                self.unlock(key)
+        return response
+    __call__ = cache_response
+
+    def get_entry(self, key):
+        '''Returns cached entry, possibly stale, or `None`'''
+        entry = self.storage.get(key)
+        if entry is not None and time.time() >= entry['stale_until']:
+            return None
+        return entry
+
+    def entry_response(self, entry):
+        return Response(status=entry['status'],
+                        headerlist=list(entry['headers']),
+                        body=entry['body'])
+
+    def is_cacheable(self, response):
+        if not isinstance(response, Response) or \
+                isinstance(response, HTTPException) or \
+                response.status_code not in self.statuses or \
+                'Set-Cookie' in response.headers:
+            return False
+        # the key must include every request header the response depends on
+        for name in response.vary or ():
+            if name.lower() not in self._vary_names:
+                return False
+        cache_control = response.cache_control
+        return not (cache_control.private or cache_control.no_store)
+
+    def store(self, key, response):
+        if not self.is_cacheable(response):
+            return
+        now = time.time()
+        entry = {
+            'status': response.status,
+            # reads the body from app_iter
+            'body': response.body,
+            'headers': [(name, value) for name, value in response.headerlist
+                        if name.lower() != 'content-length'],
+            'fresh_until': now + self.ttl,
+            'stale_until': now + self.ttl + self.stale_ttl,
+        }
+        if not self.storage.set(key, entry, self.ttl + self.stale_ttl):
+            logger.warning('storage "%r" is unreachable', self.storage)
+
+    def lock(self, key):
+        return self.storage.add(key + ':lock', 1, self.lock_timeout)
+
+    def unlock(self, key):
+        self.storage.delete(key + ':lock')
+
+    def __repr__(self):
+        return '{}({!r}, ttl={!r})'.format(self.__class__.__name__,
+                                           self.storage, self.ttl)
+
+
+# headers sent with 304 response (RFC 7232, section 4.1)
+NOT_MODIFIED_HEADERS = ('Cache-Control', 'Content-Location', 'Date',
+                        'Expires', 'Vary', 'Last-Modified')
+
+
+class ResponseVersion(object):
+    '''
+    Available in handlers as `env.response_version` inside
+    `web.conditional_get`. Allows to skip rendering if the client has
+    the current version of the response::
+
+        def document(env, data):
+            doc = env.db.query(Document).get(data.id)
+            env.response_version.check(doc.id, doc.updated_at)
+            return env.template.render_to_response('doc', dict(doc=doc))
+    '''
+
+    def __init__(self, request, salt=''):
+        self.request = request
+        self.salt = salt
+        self.etag = None
+
+    def check(self, *parts):
+        '''
+        Declares the version of the response made of `parts`, raises
+        `HTTPNotModified` if the client has this version already.'''
+        key = u'\0'.join([six.text_type(self.salt)] +
+                         [six.text_type(part) for part in parts])
+        self.etag = hashlib.sha1(key.encode('utf-8')).hexdigest()[:20]
+        if self.request.method in ('GET', 'HEAD') and \
+                self.etag in self.request.if_none_match:
+            raise HTTPNotModified(headers=[('ETag', _weak(self.etag))])
+
+
+def _weak(etag):
+    return 'W/"{}"'.format(etag)
+
+
+class conditional_get(WebHandler):
+    '''
+    Sets weak ETag on responses of next handlers and returns 304 response
+    without a body if the client has the same version::
+
+        web.conditional_get() | app
+
+    The ETag is a hash of the body or of the version declared with
+    `env.response_version.check(...)` (see `ResponseVersion`).
+    `salt` is mixed in declared versions, i.e. to change them on deploy.
+
+    Streamed responses (with `app_iter` not being a list) are not hashed to
+    avoid buffering. Responses already having ETag are checked by the
+    response itself if it is conditional.
+    '''
+
+    def __init__(self, salt=''):
+        self.salt = salt
+
+    def conditional_get(self, env, data):
+        env.response_version = ResponseVersion(env.request, salt=self.salt)
+        response = self.next_handler(env, data)
+        if response is None:
+            return None
+        return self.process_response(env, response)
+    __call__ = conditional_get
+
+    def process_response(self, env, response):
+        request = env.request
+        if request.method not in ('GET', 'HEAD') or \
+                not isinstance(response, Response) or \
+                isinstance(response, HTTPException) or \
+                response.status_code != 200 or \
+                'ETag' in response.headers:
+            return response
+        etag = env.response_version.etag
+        if etag is None:
+            app_iter = response.app_iter
+            if not isinstance(app_iter, (list, tuple)):
+                return response
+            body_hash = hashlib.sha1()
+            for chunk in app_iter:
+                body_hash.update(chunk)
+            etag = body_hash.hexdigest()[:20]
+        response.headers['ETag'] = _weak(etag)
+        if etag in request.if_none_match:
+            headers = [('ETag', _weak(etag))]
+            headers.extend((name, response.headers[name])
+                           for name in NOT_MODIFIED_HEADERS
+                           if name in response.headers)
+            return HTTPNotModified(headers=headers)
+        return response
+
+    def __repr__(self):
+        return '{}()'.format(self.__class__.__name__)
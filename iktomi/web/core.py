@@ -2,10 +2,11 @@
 
 __all__ = ['WebHandler', 'cases', 'request_filter']
 
+import os
+import re
 import logging
 import functools
 
-from copy import copy
 from webob import Response
 
 logger = logging.getLogger(__name__)
@@ -23,6 +24,9 @@ def respond(response):
         return response
     return response_wrapper
 
+def _null_handler(env, data):
+    return None
+
 def prepare_handler(handler):
     if isinstance(handler, Response):
         return respond(handler)
@@ -32,18 +36,34 @@ def prepare_handler(handler):
     return handler
 
 
+class _next_handler_property(object):
+    '''A handler, chained next to self'''
+    # Unlike property, it is non-data descriptor, so frozen handlers can
+    # store the next handler directly in instance dict
+
+    def __get__(self, inst, cls):
+        if inst is None:
+            return self
+        return getattr(inst, '_next_handler', _null_handler)
+
+
 class WebHandler(object):
     '''Base class for all request handlers.'''
 
+    # set by `freeze`
+    _frozen = False
+
     def __or__(self, next_handler):
         '''
         Supports chaining handler after itself::
 
             WebHandlerSubclass() | another_handler
         '''
+        self._check_not_frozen()
         # XXX in some cases copy count can be big
         #     for example, chaining something after a huge cases(..) handler
-        #     causes a copy of each single nested handler.
+        #     causes a copy of each single nested handler (shallow copies of
+        #     instance dict, see `copy`).
         #     Sure, is bad idea to chain anything after big cases(..) anyway.
         h = self.copy()
 
@@ -61,6 +81,40 @@ class WebHandler(object):
         # we are last in chain
         return {}
 
+    def _static_prefix(self):
+        '''
+        Literal (urlencoded) prefix of the remaining path required by the
+        handler to do anything but return `None`.
+
+        An empty string means the handler can not be skipped.
+        Used by compiled `cases` to choose candidate branches.'''
+        return ''
+
+    def _next_static_prefix(self):
+        next_handler = self.next_handler
+        if isinstance(next_handler, WebHandler):
+            return next_handler._static_prefix()
+        return ''
+
+    def _path_pattern(self):
+        '''
+        Regexp pattern (without groups) the remaining path must match for the
+        handler to do anything but return `None`, or `None` if the handler
+        can not be checked by a pattern.
+        Used by compiled `cases` to join sibling branches into a single regexp.
+        '''
+        return None
+
+    def _compile(self):
+        '''
+        Returns a copy of the handler with nested handlers replaced by their
+        compiled versions (see `Application` `compile_routes` argument).'''
+        self._check_not_frozen()
+        h = self.copy()
+        if isinstance(getattr(self, '_next_handler', None), WebHandler):
+            h._next_handler = self._next_handler._compile()
+        return h
+
     def __repr__(self):
         return '{}()'.format(self.__class__.__name__)
 
@@ -81,19 +135,43 @@ class WebHandler(object):
         raise NotImplementedError(
                 '__call__ is not implemented in {!r}'.format(self))
 
-    @property
-    def next_handler(self):
-        '''A handler, chained next to self'''
-        if hasattr(self, '_next_handler'):
-            return self._next_handler
-        return lambda e, d: None
+    next_handler = _next_handler_property()
+
+    def freeze(self):
+        '''
+        Returns an immutable copy of the handler chain with next handlers
+        linked directly to handlers, without property lookups at request
+        time. Frozen handlers can not be chained anymore::
+
+            wsgi_app = Application(app.freeze())
+
+        Should be the last step of app building.'''
+        if self._frozen:
+            return self
+        h = self.copy()
+        next_handler = getattr(self, '_next_handler', None)
+        if isinstance(next_handler, WebHandler):
+            next_handler = h._next_handler = next_handler.freeze()
+        if next_handler is None:
+            next_handler = _null_handler
+        h.__dict__['next_handler'] = next_handler
+        h._frozen = True
+        return h
+
+    def _check_not_frozen(self):
+        if self._frozen:
+            raise TypeError('{!r} is frozen and can not be changed'
+                            .format(self))
 
     def copy(self):
         '''
         Returns copy for the handler to make handlers reusable.
         Handlers are being copied automatically on chaining,
         so you do not need to do it manually.'''
-        return copy(self)
+        # chaining copies each nested handler, much faster than copy.copy
+        h = self.__class__.__new__(self.__class__)
+        h.__dict__.update(self.__dict__)
+        return h
 
 
 class cases(WebHandler):
@@ -112,6 +190,7 @@ class cases(WebHandler):
         self.handlers = [prepare_handler(x) for x in handlers]
 
     def __or__(self, next_handler):
+        self._check_not_frozen()
         #cases needs to set next handler for each handler it keeps
         h = self.copy()
         h.handlers = [(handler | next_handler
@@ -151,11 +230,156 @@ class cases(WebHandler):
                     locations[k] = v
         return locations
 
+    def _static_prefix(self):
+        prefixes = [handler._static_prefix()
+                    if isinstance(handler, WebHandler) else ''
+                    for handler in self.handlers]
+        return os.path.commonprefix(prefixes)
+
+    def freeze(self):
+        if self._frozen:
+            return self
+        h = WebHandler.freeze(self)
+        h.handlers = tuple(handler.freeze()
+                           if isinstance(handler, WebHandler) else handler
+                           for handler in self.handlers)
+        return h
+
+    def _compile(self):
+        self._check_not_frozen()
+        handlers = [handler._compile()
+                    if isinstance(handler, WebHandler) else handler
+                    for handler in self.handlers]
+        if self.__class__ is cases:
+            return _compiled_cases(*handlers)
+        h = self.copy()
+        h.handlers = handlers
+        return h
+
     def __repr__(self):
         return '{}({})'.format(self.__class__.__name__,
                                ', '.join(repr(h) for h in self.handlers))
 
 
+class _RouteIndex(object):
+    '''
+    Trie of static path segments built from literal prefixes of `cases`
+    branches. Returns indexes of branches whose prefix the path starts with,
+    in original order.'''
+
+    def __init__(self, prefixes):
+        # node is a tuple (children by segment,
+        #                  {tail length: {tail: [branch indexes]}})
+        self._root = ({}, {})
+        for index, prefix in enumerate(prefixes):
+            segments = prefix.split('/')
+            node = self._root
+            for segment in segments[:-1]:
+                node = node[0].setdefault(segment, ({}, {}))
+            tail = segments[-1]
+            node[1].setdefault(len(tail), {})\
+                   .setdefault(tail, []).append(index)
+
+    def candidates(self, path):
+        result = []
+        children, tails = self._root
+        offset = 0
+        for segment in path.split('/'):
+            for length, indexes in tails.items():
+                result.extend(indexes.get(path[offset:offset+length], ()))
+            node = children.get(segment)
+            if node is None:
+                break
+            children, tails = node
+            offset += len(segment) + 1
+        result.sort()
+        return result
+
+
+class _compiled_cases(cases):
+    '''
+    `cases` calling only branches which can match current path, according to
+    their static url prefixes. Adjacent branches having path patterns (i.e.
+    `web.match` and `web.prefix`) are joined into a single regexp, finding
+    the first matching branch in one scan. First match semantics is kept.'''
+
+    # Python 2 re module does not allow more than 100 groups
+    max_joined = 100
+
+    def __init__(self, *handlers):
+        cases.__init__(self, *handlers)
+        self._build_index()
+
+    def _build_index(self):
+        self._index = _RouteIndex([handler._static_prefix()
+                                   if isinstance(handler, WebHandler) else ''
+                                   for handler in self.handlers])
+        # for each branch: a tuple (joined regexp or None, index of the first
+        # branch after the joined group)
+        self._joined = joined = []
+        patterns = [handler._path_pattern()
+                    if isinstance(handler, WebHandler) else None
+                    for handler in self.handlers]
+        start = 0
+        while start < len(patterns):
+            end = start + 1
+            if patterns[start] is not None:
+                while end < len(patterns) and \
+                        end - start < self.max_joined and \
+                        patterns[end] is not None:
+                    end += 1
+            regex = None
+            if end - start > 1:
+                regex = re.compile('|'.join(
+                            '(?P<b{}>{})'.format(i, patterns[i])
+                            for i in range(start, end)))
+            joined.extend([(regex, end)] * (end - start))
+            start = end
+
+    def __or__(self, next_handler):
+        h = cases.__or__(self, next_handler)
+        h._build_index()
+        return h
+
+    def _candidates(self, path):
+        '''Yields branches possibly matching the path, in order'''
+        handlers = self.handlers
+        joined = self._joined
+        # branches before skip_to are known not to match,
+        # joined regexps of groups before scanned_to are already checked
+        skip_to = scanned_to = 0
+        for i in self._index.candidates(path):
+            if i < skip_to:
+                continue
+            regex, group_end = joined[i]
+            if regex is not None and i >= scanned_to:
+                scanned_to = group_end
+                m = regex.match(path)
+                if m is None:
+                    skip_to = group_end
+                    continue
+                # the leftmost matching branch, the rest of candidates in
+                # the group are tried one by one if it returns None
+                # (i.e. on ConvertError)
+                skip_to = int(m.lastgroup[1:])
+                if i < skip_to:
+                    continue
+            yield handlers[i]
+
+    def compiled_cases(self, env, data):
+        for handler in self._candidates(env._route_state.path):
+            env._push()
+            data._push()
+            try:
+                result = handler(env, data)
+            finally:
+                env._pop()
+                data._pop()
+            if result is not None:
+                return result
+    __call__ = compiled_cases
+
+
 class _FunctionWrapper3(WebHandler):
     '''
     Wrapper for handler represented by function 
@@ -1,20 +1,25 @@
 # -*- coding: utf-8 -*-
 
 __all__ = ['match', 'method', 'static_files', 'prefix', 
-           'subdomain', 'namespace', 'by_method']
+           'subdomain', 'namespace', 'by_method', 'compress']
 
 import six
+import stat
+import zlib
 import logging
+import mimetypes
 import os
 from os import path
+from email.utils import formatdate
 from six.moves.urllib.parse import unquote
-from webob.exc import HTTPMethodNotAllowed, HTTPNotFound
+from webob.exc import HTTPException, HTTPMethodNotAllowed, HTTPNotFound
 from webob.static import FileApp
 from .core import WebHandler, cases
 from . import Response
 from .url_templates import UrlTemplate
 from .reverse import Location
 from iktomi.utils.deprecation import deprecated
+from .instrumentation import monotonic
 
 
 logger = logging.getLogger(__name__)
@@ -54,9 +59,12 @@ class match(WebHandler):
             self.fragment_builder = None
 
     def match(self, env, data):
-        matched, kwargs = self.builder.match(env._route_state.path, env=env)
+        route_state = env._route_state
+        matched, kwargs = self.builder.match(route_state.path, env=env)
         if matched is not None:
             env.current_url_name = self.url_name
+            if route_state.dispatch_info is not None:
+                route_state.dispatch_info.route_matched(env.current_location)
             update_data(data, kwargs)
             return self.next_handler(env, data)
         return None
@@ -67,6 +75,12 @@ class match(WebHandler):
                             fragment_builder=self.fragment_builder)
         return {self.url_name: (location, {})}
 
+    def _static_prefix(self):
+        return self.builder.static_prefix
+
+    def _path_pattern(self):
+        return self.builder.anonymous_pattern
+
     def __repr__(self):
         return '{}({!r}, {!r})'.format(self.__class__.__name__,
                                        self.url, self.url_name)
@@ -116,6 +130,14 @@ class prefix(WebHandler):
             location.builders.insert(0, self.builder)
         return locations
 
+    def _static_prefix(self):
+        if self.builder.is_static:
+            return self.builder.static_prefix + self._next_static_prefix()
+        return self.builder.static_prefix
+
+    def _path_pattern(self):
+        return self.builder.anonymous_pattern
+
     def __repr__(self):
         return '{}({!r})'.format(self.__class__.__name__, self.url)
 
@@ -183,6 +205,9 @@ class namespace(WebHandler):
 
         return locations
 
+    def _static_prefix(self):
+        return self._next_static_prefix()
+
 
 class method(WebHandler):
 
@@ -209,6 +234,12 @@ class method(WebHandler):
         return None
     __call__ = method
 
+    def _static_prefix(self):
+        # strict method check raises an error before the path is matched
+        if self.strict:
+            return ''
+        return self._next_static_prefix()
+
     def __repr__(self):
         return 'method({})'.format(', '.join(repr(n) for n in self._names))
 
@@ -276,6 +307,13 @@ class subdomain(WebHandler):
                             "arguments {}".format(",".join(kwargs)))
 
     def subdomain(self, env, data):
+        if self.match_subdomain(env):
+            return self.next_handler(env, data)
+        return None
+
+    def match_subdomain(self, env):
+        '''Updates route state and returns True if the request domain
+        matches'''
         subdomain = env._route_state.subdomain
         #XXX: here we can get 'idna' encoded sequence, that is the bug
         for subd in self.subdomains:
@@ -293,8 +331,8 @@ class subdomain(WebHandler):
             if matches:
                 env._route_state = \
                         env._route_state.add_subdomain(self.primary, subd)
-                return self.next_handler(env, data)
-        return None
+                return True
+        return False
     __call__ = subdomain
 
     def _locations(self):
@@ -303,20 +341,139 @@ class subdomain(WebHandler):
             location.subdomains.append(self)
         return locations
 
+    def _static_prefix(self):
+        return self._next_static_prefix()
+
     def __repr__(self):
         return '{}({!r})'.format(self.__class__.__name__, self.subdomains)
 
 
+# Content-Encoding and file extension of precompressed files, in order of
+# preference
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+
+
+def _stat_key(st):
+    return (st.st_mtime, st.st_size, st.st_ino)
+
+
+def _accepted_encodings(header):
+    '''Parses Accept-Encoding header into a dict {encoding: quality}'''
+    result = {}
+    for item in header.split(','):
+        params = item.split(';')
+        quality = 1.0
+        for param in params[1:]:
+            name, _, value = param.partition('=')
+            if name.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        result[params[0].strip().lower()] = quality
+    return result
+
+
+class _StaticFile(object):
+    '''Cached `os.stat` result and response headers of a static file'''
+
+    __slots__ = ('filename', 'key', 'content_type', 'headers', 'variants',
+                 'checked')
+
+    def __init__(self, filename, st, max_age=None, content_type=None,
+                 content_encoding=None, vary=False):
+        self.filename = filename
+        self.key = _stat_key(st)
+        if content_type is None:
+            content_type, content_encoding = mimetypes.guess_type(filename)
+        self.content_type = content_type or 'application/octet-stream'
+        # strong validator, the same as nginx uses, it must differ for
+        # encoded variants of the file
+        etag = '{:x}-{:x}'.format(int(st.st_mtime), st.st_size)
+        if content_encoding:
+            etag += '-' + content_encoding
+        self.headers = [
+            ('Content-Type', self.content_type),
+            ('Content-Length', str(st.st_size)),
+            ('Last-Modified', formatdate(st.st_mtime, usegmt=True)),
+            ('ETag', '"{}"'.format(etag)),
+            ('Accept-Ranges', 'bytes'),
+        ]
+        if content_encoding:
+            self.headers.append(('Content-Encoding', content_encoding))
+        if vary:
+            self.headers.append(('Vary', 'Accept-Encoding'))
+        if max_age is not None:
+            self.headers.append(('Cache-Control',
+                                 'public, max-age={}'.format(max_age)))
+        # precompressed files {content encoding: _StaticFile}
+        self.variants = {}
+        self.checked = None
+
+
+class _FileIter(object):
+    '''Reads the file in blocks, opening it only when iterated'''
+
+    block_size = 1 << 16
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._iter = None
+
+    def app_iter_range(self, seek=None, limit=None):
+        with open(self.filename, 'rb') as f:
+            if seek:
+                f.seek(seek)
+            remaining = None if limit is None else limit - (seek or 0)
+            while remaining is None or remaining > 0:
+                size = self.block_size if remaining is None \
+                       else min(self.block_size, remaining)
+                chunk = f.read(size)
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    def __iter__(self):
+        self._iter = self.app_iter_range()
+        return self._iter
+
+    def close(self):
+        if self._iter is not None:
+            self._iter.close()
+
+
 class static_files(WebHandler):
     '''
-    Static file handler for dev server (not recommended in production)::
+    Static file handler::
 
        static_files('/path/to/static', url='/static/')
+
+    By default it is a dev server handler, stating the file on each request.
+    With `production=True` stat results are cached and checked again not
+    more often than once in `stat_interval` seconds. Responses have strong
+    ETag and Last-Modified headers, conditional and byte range requests are
+    supported, files are sent with `wsgi.file_wrapper` if the server
+    provides it. `max_age` sets `Cache-Control` header.
+
+    With `precompressed=True` in production mode `.br` and `.gz` siblings
+    of a file are served to clients accepting the encoding (see
+    `iktomi.cli.static.StaticFiles` to create them). A list of
+    (content encoding, extension) pairs can be passed instead of `True`.
     '''
 
-    def __init__(self, location, url='/static/'):
+    def __init__(self, location, url='/static/', production=False,
+                 max_age=None, stat_interval=1, precompressed=False):
         self.location = location
         self.url = url
+        self.production = production
+        if precompressed is True:
+            precompressed = PRECOMPRESSED
+        self.precompressed = tuple(precompressed or ())
+        self.max_age = max_age
+        self.stat_interval = stat_interval
+        self._stat_cache = {}
 
     def url_for_static(self, part):
         while part.startswith('/'):
@@ -352,16 +509,192 @@ class static_files(WebHandler):
             if path_info.endswith('/'):
                 raise HTTPNotFound
             file_path = self.translate_path(path_info[len(self.url):])
-            if file_path and path.exists(file_path) and path.isfile(file_path):
+            if self.production:
+                static_file = file_path and self.stat_file(file_path)
+                if static_file is not None:
+                    if static_file.variants:
+                        static_file = self.choose_variant(env.request,
+                                                          static_file)
+                    return self.file_response(env, static_file)
+            elif file_path and path.exists(file_path) and \
+                    path.isfile(file_path):
                 return FileApp(file_path)
-            else:
-                logger.info('Client requested non existent static data "%s"',
-                            file_path)
-                return Response(status=404)
+            logger.info('Client requested non existent static data "%s"',
+                        file_path)
+            return Response(status=404)
         return None
     __call__ = static_files
 
+    def stat_file(self, file_path):
+        '''
+        Returns cached `_StaticFile` for a regular file or `None`.
+        Only existing files are cached.'''
+        now = monotonic()
+        static_file = self._stat_cache.get(file_path)
+        if static_file is not None and \
+                now - static_file.checked < self.stat_interval:
+            return static_file
+        st = self._stat(file_path)
+        if st is None:
+            self._stat_cache.pop(file_path, None)
+            return None
+        variants = []
+        if self.precompressed and not mimetypes.guess_type(file_path)[1]:
+            for encoding, extension in self.precompressed:
+                variant_st = self._stat(file_path + extension)
+                if variant_st is not None:
+                    variants.append((encoding, extension, variant_st))
+        key = (_stat_key(st),) + tuple(_stat_key(variant_st)
+                                       for _, _, variant_st in variants)
+        if static_file is None or static_file.key != key:
+            static_file = _StaticFile(file_path, st, self.max_age,
+                                      vary=bool(variants))
+            static_file.key = key
+            for encoding, extension, variant_st in variants:
+                static_file.variants[encoding] = _StaticFile(
+                        file_path + extension, variant_st, self.max_age,
+                        content_type=static_file.content_type,
+                        content_encoding=encoding, vary=True)
+        static_file.checked = now
+        self._stat_cache[file_path] = static_file
+        return static_file
+
+    def _stat(self, file_path):
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return None
+        if not stat.S_ISREG(st.st_mode):
+            return None
+        return st
+
+    def choose_variant(self, request, static_file):
+        '''Returns precompressed variant of the file most preferred by the
+        client, or the file itself'''
+        header = request.headers.get('Accept-Encoding')
+        if not header:
+            return static_file
+        accepted = _accepted_encodings(header)
+        # the file itself is preferred only if the client asks for it
+        best, best_quality = static_file, accepted.get('identity', 0)
+        for encoding, extension in self.precompressed:
+            variant = static_file.variants.get(encoding)
+            if variant is not None:
+                quality = accepted.get(encoding, accepted.get('*', 0))
+                if quality > best_quality:
+                    best, best_quality = variant, quality
+        return best
+
+    def file_response(self, env, static_file):
+        request = env.request
+        if request.method not in ('GET', 'HEAD'):
+            return HTTPMethodNotAllowed()
+        file_wrapper = request.environ.get('wsgi.file_wrapper')
+        if file_wrapper is not None and request.method == 'GET' and \
+                not (request.range or request.if_none_match or
+                     request.if_modified_since):
+            # unconditional full response, the server can use sendfile
+            app_iter = file_wrapper(open(static_file.filename, 'rb'),
+                                    _FileIter.block_size)
+        else:
+            app_iter = _FileIter(static_file.filename)
+        return Response(headerlist=list(static_file.headers),
+                        app_iter=app_iter, conditional_response=True)
+
     def __repr__(self):
         return '{}({!r}, {!r})'.format(self.__class__.__name__, 
                                        self.location, self.url)
 
+
+def _compress_iter(app_iter, level, wbits):
+    '''Compresses chunks of `app_iter`, flushing after each one'''
+    compressor = zlib.compressobj(level, zlib.DEFLATED, wbits)
+    try:
+        for chunk in app_iter:
+            if chunk:
+                yield compressor.compress(chunk) + \
+                      compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+    finally:
+        close = getattr(app_iter, 'close', None)
+        if close is not None:
+            close()
+
+
+class compress(WebHandler):
+    '''
+    Compresses responses of next handlers with gzip or deflate if the client
+    accepts it::
+
+        web.compress() | app
+
+    The body is compressed chunk by chunk as it is sent, so streamed
+    responses are not buffered. Responses already having Content-Encoding,
+    partial ones, responses with content type not in `content_types`
+    (prefixes) or with known length less than `min_size` are left as is.
+    '''
+
+    content_types = ('text/', 'application/json', 'application/javascript',
+                     'application/xml', 'application/rss+xml',
+                     'application/atom+xml', 'image/svg+xml')
+
+    # Content-Encoding: zlib wbits, in order of preference
+    encodings = (('gzip', 16 + zlib.MAX_WBITS), ('deflate', zlib.MAX_WBITS))
+
+    def __init__(self, min_size=1024, content_types=None, level=6):
+        self.min_size = min_size
+        if content_types is not None:
+            self.content_types = tuple(content_types)
+        self.level = level
+
+    def compress(self, env, data):
+        response = self.next_handler(env, data)
+        if response is None:
+            return None
+        return self.compress_response(env, response)
+    __call__ = compress
+
+    def compress_response(self, env, response):
+        '''Returns the response with compressed body, if possible'''
+        # other WSGI apps and webob errors generating body on call are
+        # passed as is
+        if not isinstance(response, Response) or \
+                isinstance(response, HTTPException) or \
+                response.status_code in (204, 206, 304) or \
+                response.status_code < 200 or \
+                response.content_encoding or \
+                not (response.content_type or '').startswith(
+                        self.content_types):
+            return response
+        # the body depends on the header from now on
+        vary = tuple(response.vary or ())
+        if 'Accept-Encoding' not in vary:
+            response.vary = vary + ('Accept-Encoding',)
+        if response.content_length is not None and \
+                response.content_length < self.min_size:
+            return response
+        header = env.request.headers.get('Accept-Encoding')
+        if not header:
+            return response
+        accepted = _accepted_encodings(header)
+        best, best_quality = None, 0
+        for encoding, wbits in self.encodings:
+            quality = accepted.get(encoding, accepted.get('*', 0))
+            if quality > best_quality:
+                best, best_quality = (encoding, wbits), quality
+        if best is None:
+            return response
+        encoding, wbits = best
+        response.app_iter = _compress_iter(response.app_iter, self.level,
+                                           wbits)
+        response.content_length = None
+        response.content_encoding = encoding
+        etag = response.headers.get('ETag')
+        if etag and not etag.startswith('W/'):
+            # the same as nginx does, the body is not byte-to-byte equal
+            response.headers['ETag'] = 'W/' + etag
+        return response
+
+    def __repr__(self):
+        return '{}(min_size={!r})'.format(self.__class__.__name__,
+                                         self.min_size)
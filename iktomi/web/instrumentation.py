@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+'''
+Request dispatch instrumentation for `iktomi.web.Application`.
+'''
+
+__all__ = ['Instrument', 'DispatchInfo', 'RouteTimings']
+
+import time
+import threading
+from iktomi.utils.histogram import Histogram
+
+monotonic = getattr(time, 'monotonic', time.time)
+
+
+class DispatchInfo(object):
+    '''
+    Timings of a single request dispatch. All times are `monotonic()` values
+    in seconds.
+
+    `routed` is set when `web.match` has matched (the last one if there were
+    many), `location` is `env.current_location` at that moment. `status` is
+    `None` if a WSGI app other than webob `Response` was returned.
+    '''
+
+    __slots__ = ('location', 'status', 'started', 'routed', 'finished')
+
+    def __init__(self):
+        self.location = ''
+        self.status = None
+        self.started = self.routed = self.finished = None
+
+    def route_matched(self, location):
+        self.location = location
+        self.routed = monotonic()
+
+    @property
+    def total_time(self):
+        return self.finished - self.started
+
+    @property
+    def routing_time(self):
+        '''Time before the endpoint is matched, all the time if not matched'''
+        if self.routed is None:
+            return self.total_time
+        return self.routed - self.started
+
+    @property
+    def handler_time(self):
+        if self.routed is None:
+            return 0
+        return self.finished - self.routed
+
+    def __repr__(self):
+        return '{}({!r}, status={!r})'.format(self.__class__.__name__,
+                                              self.location, self.status)
+
+
+class Instrument(object):
+    '''
+    Base class for `Application` instruments::
+
+        wsgi_app = Application(app, instruments=[MyInstrument()])
+
+    Callbacks are called for each request, so they should be cheap.
+    '''
+
+    def pre_dispatch(self, env, info):
+        '''Called before the handler, `info.started` is not set yet'''
+
+    def post_dispatch(self, env, info):
+        '''Called after the handler has returned a response or failed,
+        `info` is fully filled'''
+
+
+class RouteTimings(Instrument):
+    '''
+    In-process aggregator of request latencies per location::
+
+        timings = RouteTimings()
+        wsgi_app = Application(app, instruments=[timings])
+        ...
+        timings.dump()
+
+    Keeps histograms (in microseconds) of total, routing and handler time,
+    and counts of response statuses for each `env.current_location`.
+    Requests not matched by any `web.match` are counted under empty location.
+    '''
+
+    def __init__(self, precision_bits=7):
+        self.precision_bits = precision_bits
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.locations = {}
+
+    def _location_stats(self, location):
+        stats = self.locations.get(location)
+        if stats is None:
+            stats = self.locations[location] = {
+                'total': Histogram(self.precision_bits),
+                'routing': Histogram(self.precision_bits),
+                'handler': Histogram(self.precision_bits),
+                'statuses': {},
+            }
+        return stats
+
+    def post_dispatch(self, env, info):
+        with self._lock:
+            stats = self._location_stats(info.location)
+            stats['total'].record(info.total_time * 1e6)
+            stats['routing'].record(info.routing_time * 1e6)
+            stats['handler'].record(info.handler_time * 1e6)
+            statuses = stats['statuses']
+            statuses[info.status] = statuses.get(info.status, 0) + 1
+
+    def dump(self, percents=(50, 90, 99, 99.9)):
+        '''
+        Returns a dict {location: {'total': summary, 'routing': summary,
+        'handler': summary, 'statuses': {status: count}}}, where summary is
+        `Histogram.summary` in microseconds.'''
+        with self._lock:
+            return dict(
+                (location, {
+                    'total': stats['total'].summary(percents),
+                    'routing': stats['routing'].summary(percents),
+                    'handler': stats['handler'].summary(percents),
+                    'statuses': dict(stats['statuses']),
+                })
+                for location, stats in self.locations.items())
+
+    def format(self):
+        '''Returns the dump as a human-readable table'''
+        lines = ['{:<40} {:>8} {:>10} {:>10} {:>10} {:>10}'.format(
+                    'location', 'count', 'p50, us', 'p99, us', 'max, us',
+                    'routing p50')]
+        dump = self.dump(percents=(50, 99))
+        for location in sorted(dump):
+            total = dump[location]['total']
+            lines.append('{:<40} {:>8} {:>10} {:>10} {:>10} {:>10}'.format(
+                    location or '-', total['count'], total['p50'],
+                    total['p99'], total['max'],
+                    dump[location]['routing']['p50']))
+        return '\n'.join(lines)
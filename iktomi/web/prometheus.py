@@ -0,0 +1,406 @@
+# -*- coding: utf-8 -*-
+'''
+Application metrics in Prometheus text exposition format::
+
+    collector = web.MetricsCollector()
+    app = web.cases(
+        web.match('/metrics') | web.metrics(collector),
+        ...
+    )
+    wsgi_app = Application(app, instruments=[collector])
+
+Preforked servers should pass `multiprocess_dir`, each worker keeps its
+values in a mmap'd file in this directory, and a scrape of any worker
+reports the sum over all of them. The directory must be cleared before
+the server is started (see `clear_multiprocess_dir`, `Flup` does it if
+`metrics_dir` is passed).
+'''
+
+__all__ = ['MetricsCollector', 'metrics', 'clear_multiprocess_dir']
+
+import os
+import io
+import json
+import mmap
+import glob
+import time
+import struct
+import bisect
+import threading
+from webob import Response
+from iktomi.utils.system import is_running
+from .core import WebHandler
+from .instrumentation import Instrument, monotonic
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_BUCKETS = (.005, .01, .025, .05, .075, .1, .25, .5, .75,
+                   1.0, 2.5, 5.0, 7.5, 10.0)
+
+# name: (type, help, aggregation in multiprocess mode)
+# 'live' metrics are reported only for running processes
+_METRICS = [
+    ('iktomi_requests_total', 'counter',
+        'Requests handled by the application.', 'sum'),
+    ('iktomi_requests_in_progress', 'gauge',
+        'Requests being handled now.', 'live'),
+    ('iktomi_request_duration_seconds', 'histogram',
+        'Request handling time by location.', 'sum'),
+    ('process_cpu_seconds_total', 'counter',
+        'Total user and system CPU time spent in seconds.', 'live'),
+    ('process_resident_memory_bytes', 'gauge',
+        'Resident memory size in bytes.', 'live'),
+    ('process_open_fds', 'gauge',
+        'Number of open file descriptors.', 'live'),
+    ('process_start_time_seconds', 'gauge',
+        'Start time of the process since unix epoch in seconds.', 'live'),
+]
+
+_FILE_PREFIX = 'iktomi_metrics_'
+
+
+def clear_multiprocess_dir(path):
+    '''Removes values files left by previous runs'''
+    for filename in glob.glob(os.path.join(path, _FILE_PREFIX + '*.db')):
+        os.remove(filename)
+
+
+class _Values(object):
+    '''In-process storage of metric values'''
+
+    def __init__(self):
+        self.values = {}
+
+    def inc(self, key, amount):
+        self.values[key] = self.values.get(key, 0.0) + amount
+
+    def set(self, key, value):
+        self.values[key] = float(value)
+
+    def items(self):
+        return self.values.items()
+
+
+class _MmapValues(object):
+    '''
+    Storage of metric values in a file mapped to memory, so other processes
+    can read it at any time.
+
+    The file starts with 8 bytes header holding used size, then entries
+    follow: 4 bytes key length, utf-8 key padded to 8 bytes boundary and
+    8 bytes double value. Entries are only appended and updated in place.
+    '''
+
+    initial_size = 1 << 16
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._positions = {}
+        # the file left by a dead process with the same pid is kept, values
+        # are summed over all files
+        if not os.path.exists(filename):
+            with open(filename, 'wb') as f:
+                f.write(b'\0' * self.initial_size)
+        self._file = open(filename, 'r+b')
+        self._capacity = os.fstat(self._file.fileno()).st_size
+        if self._capacity < self.initial_size:
+            self._capacity = self.initial_size
+            self._file.truncate(self._capacity)
+        self._m = mmap.mmap(self._file.fileno(), self._capacity)
+        self._used = struct.unpack_from('i', self._m, 0)[0]
+        if self._used < 8:
+            self._used = 8
+            struct.pack_into('i', self._m, 0, self._used)
+        for key, position in _iter_entries(self._m[:self._used]):
+            self._positions[key] = position
+
+    def _grow(self, size):
+        while self._capacity < size:
+            self._capacity *= 2
+        self._m.close()
+        self._file.truncate(self._capacity)
+        self._m = mmap.mmap(self._file.fileno(), self._capacity)
+
+    def _append(self, key):
+        encoded = key.encode('utf-8')
+        padded_length = len(encoded) + (8 - (len(encoded) + 4) % 8) % 8
+        entry = struct.pack('i{}sd'.format(padded_length),
+                            len(encoded), encoded, 0.0)
+        if self._used + len(entry) > self._capacity:
+            self._grow(self._used + len(entry))
+        self._m[self._used:self._used + len(entry)] = entry
+        position = self._used + len(entry) - 8
+        self._used += len(entry)
+        # header is updated after the entry is complete
+        struct.pack_into('i', self._m, 0, self._used)
+        self._positions[key] = position
+        return position
+
+    def _position(self, key):
+        position = self._positions.get(key)
+        if position is None:
+            position = self._append(key)
+        return position
+
+    def inc(self, key, amount):
+        position = self._position(key)
+        value = struct.unpack_from('d', self._m, position)[0]
+        struct.pack_into('d', self._m, position, value + amount)
+
+    def set(self, key, value):
+        position = self._position(key)
+        struct.pack_into('d', self._m, position, value)
+
+    def items(self):
+        return read_values_file(self._m[:self._used])
+
+    def close(self):
+        self._m.close()
+        self._file.close()
+
+
+def _iter_entries(data):
+    '''Yields (key, value position) of `_MmapValues` file entries'''
+    used = struct.unpack_from('i', data, 0)[0]
+    position = 8
+    while position < used:
+        length = struct.unpack_from('i', data, position)[0]
+        position += 4
+        key = data[position:position + length].decode('utf-8')
+        position += length + (8 - (length + 4) % 8) % 8
+        yield key, position
+        position += 8
+
+
+def read_values_file(data):
+    '''Parses the content of `_MmapValues` file, returns a list of
+    (key, value) pairs'''
+    return [(key, struct.unpack_from('d', data, position)[0])
+            for key, position in _iter_entries(data)]
+
+
+def _process_stats():
+    stats = {}
+    times = os.times()
+    stats['process_cpu_seconds_total'] = times[0] + times[1]
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        stats['process_resident_memory_bytes'] = \
+                pages * mmap.PAGESIZE
+        stats['process_open_fds'] = len(os.listdir('/proc/self/fd'))
+    except (IOError, OSError): # pragma: no cover, not linux
+        pass
+    return stats
+
+
+def _escape(value):
+    return value.replace('\\', r'\\').replace('\n', r'\n')\
+                .replace('"', r'\"')
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class MetricsCollector(Instrument):
+    '''
+    `Application` instrument counting requests, requests in progress and
+    request duration buckets per `env.current_location`.
+
+    :param buckets: upper bounds of duration histogram buckets, in seconds.
+    :param multiprocess_dir: directory for values files of preforked worker
+        processes.
+    :param process_stats_interval: how often (in seconds) workers update
+        their process stats in multiprocess mode.
+    '''
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, multiprocess_dir=None,
+                 process_stats_interval=10):
+        self.buckets = tuple(sorted(buckets))
+        self._bucket_labels = [_format_value(b) for b in self.buckets] + \
+                              ['+Inf']
+        self.multiprocess_dir = multiprocess_dir
+        self.process_stats_interval = process_stats_interval
+        self._lock = threading.Lock()
+        self._keys = {}
+        self._pid = None
+        self._values = None
+        self._stats_updated = None
+        self._start_time = time.time()
+
+    def _key(self, name, labels=()):
+        cache_key = (name, labels)
+        key = self._keys.get(cache_key)
+        if key is None:
+            key = self._keys[cache_key] = json.dumps([name, labels])
+        return key
+
+    def _get_values(self):
+        # must be called with lock held
+        pid = os.getpid()
+        if pid != self._pid:
+            # first call or in a forked worker
+            self._pid = pid
+            if self.multiprocess_dir is None:
+                self._values = _Values()
+            else:
+                self._values = _MmapValues(os.path.join(
+                    self.multiprocess_dir,
+                    '{}{}.db'.format(_FILE_PREFIX, pid)))
+                self._start_time = time.time()
+                # requests of the dead process are not in progress anymore
+                self._values.set(self._key('iktomi_requests_in_progress'), 0)
+                self._update_process_stats(self._values)
+        return self._values
+
+    def _update_process_stats(self, values):
+        self._stats_updated = monotonic()
+        values.set(self._key('process_start_time_seconds'), self._start_time)
+        for name, value in _process_stats().items():
+            values.set(self._key(name), value)
+
+    def pre_dispatch(self, env, info):
+        with self._lock:
+            self._get_values().inc(self._key('iktomi_requests_in_progress'), 1)
+
+    def post_dispatch(self, env, info):
+        location = info.location
+        duration = info.total_time
+        bucket = self._bucket_labels[bisect.bisect_left(self.buckets,
+                                                        duration)]
+        key = self._key
+        with self._lock:
+            values = self._get_values()
+            values.inc(key('iktomi_requests_in_progress'), -1)
+            # status of WSGI apps other than webob `Response` is unknown
+            if info.status is None:
+                labels = (location,)
+            else:
+                labels = (location, str(info.status))
+            values.inc(key('iktomi_requests_total', labels), 1)
+            values.inc(key('iktomi_request_duration_seconds_bucket',
+                           (location, bucket)), 1)
+            values.inc(key('iktomi_request_duration_seconds_sum',
+                           (location,)), duration)
+            if self.multiprocess_dir is not None and \
+                    monotonic() - self._stats_updated > \
+                        self.process_stats_interval:
+                self._update_process_stats(values)
+
+    def _samples(self):
+        '''Returns a list of (key, value, pid, is_live)'''
+        with self._lock:
+            values = self._get_values()
+            self._update_process_stats(values)
+            if self.multiprocess_dir is None:
+                return [(key, value, None, True)
+                        for key, value in values.items()]
+        samples = []
+        pattern = os.path.join(self.multiprocess_dir, _FILE_PREFIX + '*.db')
+        for filename in glob.glob(pattern):
+            pid = int(os.path.basename(filename)[len(_FILE_PREFIX):-3])
+            try:
+                with io.open(filename, 'rb') as f:
+                    data = f.read()
+            except (IOError, OSError): # pragma: no cover, removed
+                continue
+            live = pid == self._pid or is_running(pid)
+            for key, value in read_values_file(data):
+                samples.append((key, value, pid, live))
+        return samples
+
+    def collect(self):
+        '''
+        Returns a dict {metric name: {label tuple: value}}, histogram buckets
+        are not cumulative, process stats in multiprocess mode are labeled
+        by pid.'''
+        aggregation = dict((name + suffix, kind)
+                           for name, type_, help_, kind in _METRICS
+                           for suffix in ('', '_bucket', '_sum'))
+        result = {}
+        for key, value, pid, live in self._samples():
+            name, labels = json.loads(key)
+            labels = tuple(labels)
+            kind = aggregation[name]
+            if kind == 'live':
+                if not live:
+                    continue
+                if name.startswith('process_') and pid is not None:
+                    labels = (str(pid),)
+            metric = result.setdefault(name, {})
+            metric[labels] = metric.get(labels, 0.0) + value
+        return result
+
+    def exposition(self):
+        '''Returns metrics in Prometheus text format'''
+        collected = self.collect()
+        lines = []
+        for name, type_, help_, kind in _METRICS:
+            lines.append(u'# HELP {} {}'.format(name, help_))
+            lines.append(u'# TYPE {} {}'.format(name, type_))
+            if type_ == 'histogram':
+                lines.extend(self._format_histogram(name, collected))
+                continue
+            if name.startswith('process_') and \
+                    self.multiprocess_dir is not None:
+                label_names = ('pid',)
+            elif name == 'iktomi_requests_total':
+                label_names = ('location', 'status')
+            else:
+                label_names = ()
+            for labels, value in sorted(collected.get(name, {}).items()):
+                lines.append(self._format_sample(name, label_names, labels,
+                                                 value))
+        return u'\n'.join(lines) + u'\n'
+
+    def _format_sample(self, name, label_names, labels, value):
+        if label_names:
+            name += u'{' + u','.join(
+                u'{}="{}"'.format(label_name, _escape(label))
+                for label_name, label in zip(label_names, labels)) + u'}'
+        return u'{} {}'.format(name, _format_value(value))
+
+    def _format_histogram(self, name, collected):
+        buckets = collected.get(name + '_bucket', {})
+        sums = collected.get(name + '_sum', {})
+        by_location = {}
+        for (location, bucket), value in buckets.items():
+            by_location.setdefault(location, {})[bucket] = value
+        lines = []
+        for location in sorted(by_location):
+            counts = by_location[location]
+            cumulative = 0.0
+            for bucket in self._bucket_labels:
+                cumulative += counts.get(bucket, 0.0)
+                lines.append(self._format_sample(
+                    name + '_bucket', ('location', 'le'),
+                    (location, bucket), cumulative))
+            lines.append(self._format_sample(
+                name + '_sum', ('location',), (location,),
+                sums.get((location,), 0.0)))
+            lines.append(self._format_sample(
+                name + '_count', ('location',), (location,), cumulative))
+        return lines
+
+
+class metrics(WebHandler):
+    '''
+    Endpoint returning metrics of the `MetricsCollector`::
+
+        web.match('/metrics') | web.metrics(collector)
+    '''
+
+    def __init__(self, collector):
+        self.collector = collector
+
+    def metrics(self, env, data):
+        body = self.collector.exposition().encode('utf-8')
+        return Response(body=body, headerlist=[('Content-Type',
+                                                CONTENT_TYPE)])
+    __call__ = metrics
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, self.collector)
@@ -2,8 +2,9 @@
 
 __all__ = ['Reverse', 'UrlBuildingError']
 
+import six
 from .url import URL
-from .url_templates import UrlBuildingError
+from .url_templates import UrlBuildingError, build_parts
 from ..utils import cached_property
 
 
@@ -74,6 +75,159 @@ class Location(object):
         return '{}({})'.format(self.__class__.__name__, args)
 
 
+class UrlContext(object):
+    '''
+    Request-dependent parts of URLs built by `Reverse` bound to `env`:
+    scheme, domain and port of the request. They are computed on first use
+    once per request.
+    '''
+
+    _scheme_ports = {'http': '80', 'https': '443'}
+
+    def __init__(self, env):
+        self.env = env
+
+    @cached_property
+    def scheme(self):
+        return self.env.request.scheme
+
+    @cached_property
+    def scheme_port(self):
+        return self._scheme_ports.get(self.scheme, '80')
+
+    @cached_property
+    def _host_split(self):
+        return self.env.request.host.split(':')
+
+    @cached_property
+    def domain(self):
+        return self._host_split[0]
+
+    @cached_property
+    def port(self):
+        host_split = self._host_split
+        return host_split[1] if len(host_split) > 1 else self.scheme_port
+
+    @property
+    def primary_domain(self):
+        # is changed by `web.subdomain` while routing
+        return self.env._route_state.primary_domain
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, self.env)
+
+
+class CompiledEndpoint(object):
+    '''
+    Flat URL builder of an endpoint used by `Reverse.build_url`: builder
+    parts of all locations on the way to the endpoint with adjacent literal
+    parts merged, and the host made of their subdomains.
+    '''
+
+    __slots__ = ('parts', 'host', 'fragment_parts', 'url_arguments')
+
+    def __init__(self, locations):
+        parts = []
+        host = ''
+        for location in locations:
+            for builder in location.builders:
+                parts.extend(builder._builder_params)
+            subdomain = location.build_subdomians(None)
+            if subdomain:
+                host = subdomain + '.' + host if host else subdomain
+        # only the endpoint can have a fragment (see `from_scope`)
+        fragment_builder = locations[-1].fragment_builder
+        self.parts = self._merge(parts)
+        self.host = host
+        self.fragment_parts = None
+        self.url_arguments = frozenset(name for part in parts
+                                       if part.__class__ is tuple
+                                       for name in part[:1])
+        if fragment_builder is not None:
+            self.fragment_parts = self._merge(
+                    fragment_builder._builder_params)
+            self.url_arguments |= frozenset(fragment_builder._url_params)
+
+    @staticmethod
+    def _merge(parts):
+        merged = []
+        for part in parts:
+            if part.__class__ is not tuple and merged and \
+                    merged[-1].__class__ is not tuple:
+                merged[-1] += part
+            else:
+                merged.append(part)
+        return tuple(merged)
+
+    # methods which must not be redefined by locations of compiled endpoints
+    _location_methods = ('build_path', 'build_subdomians', 'build_fragment')
+
+    @classmethod
+    def _is_compilable(cls, location):
+        location_class = type(location)
+        return all(six.get_unbound_function(getattr(location_class, method))
+                   is six.get_unbound_function(getattr(Location, method))
+                   for method in cls._location_methods)
+
+    @classmethod
+    def from_scope(cls, scope, name):
+        '''
+        Returns compiled endpoint for dotted name or `None` if the name can
+        not be built by `Reverse.build_url` without checks done by
+        `Reverse` objects themselves (i.e. raising errors), if locations
+        redefine methods building URL parts, or if locations on the way to
+        the endpoint have fragments.
+        '''
+        locations = []
+        for part in name.split('.'):
+            if not part or part not in scope:
+                return None
+            location, scope = scope[part]
+            locations.append(location)
+        if scope:
+            if '' not in scope:
+                return None
+            default = scope[''][0]
+            # `build_url` does not pass arguments to the default endpoint
+            # of the namespace not accepting them itself
+            if default.need_arguments and not locations[-1].need_arguments:
+                return None
+            locations.append(default)
+        if not all(cls._is_compilable(location) for location in locations):
+            return None
+        # fragments of intermediate locations are built from their own
+        # arguments and replaced by the endpoint's one
+        if any(location.fragment_builder is not None
+               for location in locations[:-1]):
+            return None
+        return cls(locations)
+
+    @classmethod
+    def compile_scope(cls, scope):
+        '''
+        Returns a dict {dotted name: compiled endpoint} of all endpoints in
+        the scope which can be compiled.
+        '''
+        compiled = {}
+        names = [(name, subscope) for name, (_, subscope) in scope.items()
+                 if name]
+        while names:
+            name, subscope = names.pop()
+            endpoint = cls.from_scope(scope, name)
+            if endpoint is not None:
+                compiled[name] = endpoint
+            names.extend((name + '.' + subname, subsubscope)
+                         for subname, (_, subsubscope) in subscope.items()
+                         if subname)
+        return compiled
+
+    def build(self, kwargs):
+        '''Returns (path, host, fragment)'''
+        fragment = None
+        if self.fragment_parts is not None:
+            fragment = build_parts(self.fragment_parts, kwargs)
+        return build_parts(self.parts, kwargs), self.host, fragment
+
 
 class Reverse(object):
     '''
@@ -84,7 +238,8 @@ class Reverse(object):
     '''
     def __init__(self, scope, location=None, path='', host='',
                  ready=False, need_arguments=False, bound_env=None, parent=None,
-                 finalize_params=None, pending_args=None, fragment=None):
+                 finalize_params=None, pending_args=None, fragment=None,
+                 compiled=None, url_context=None):
         # location is stuff containing builders for current reverse step
         # (builds url part for particular namespace or endpoint)
         self._location = location
@@ -107,9 +262,16 @@ class Reverse(object):
         self._is_endpoint = (not self._scope) or ('' in self._scope)
         self._is_scope = bool(self._scope)
         self._bound_env = bound_env
+        if url_context is None and bound_env is not None:
+            url_context = UrlContext(bound_env)
+        self._url_context = url_context
         self._parent = parent
         self._finalize_params = finalize_params or {}
         self._pending_args = pending_args or {}
+        # {endpoint name: CompiledEndpoint} made by `from_handler`, shared by
+        # the root reverse and its bound copies, other names are built by
+        # `Reverse` objects
+        self._compiled = compiled
 
     def _attach_subdomain(self, host, location):
         subdomain = location.build_subdomians(self)
@@ -147,6 +309,7 @@ class Reverse(object):
             return self.__class__(self._scope, location, path=path, host=host,
                                   fragment=fragment,
                                   bound_env=self._bound_env,
+                                  url_context=self._url_context,
                                   ready=self._is_endpoint,
                                   parent=self._parent,
                                   finalize_params=finalize_params)
@@ -178,6 +341,7 @@ class Reverse(object):
             return self.__class__(scope, location, path, host, ready,
                                   fragment=fragment,
                                   bound_env=self._bound_env,
+                                  url_context=self._url_context,
                                   parent=self,
                                   need_arguments=location.need_arguments,
                                   pending_args=pending_args)
@@ -202,6 +366,7 @@ class Reverse(object):
         return self.__class__({}, self._location, path=path, host=host,
                               fragment=fragment,
                               bound_env=self._bound_env,
+                              url_context=self._url_context,
                               parent=self._parent,
                               ready=self._is_endpoint)
 
@@ -246,6 +411,16 @@ class Reverse(object):
         Checks that all necessary arguments are provided and all
         provided arguments are used.
         '''
+        if self._compiled is not None:
+            endpoint = self._compiled.get(_name)
+            if endpoint is not None:
+                unused = set(kwargs).difference(endpoint.url_arguments)
+                if unused:
+                    raise UrlBuildingError(
+                        'Not all arguments are used during URL building: '
+                        '{}'.format(', '.join(unused)))
+                return self._make_url(*endpoint.build(kwargs))
+
         used_args, subreverse =  self._build_url_silent(_name, **kwargs)
 
         if set(kwargs).difference(used_args):
@@ -270,10 +445,10 @@ class Reverse(object):
             raise UrlBuildingError('Not an endpoint {}'.format(repr(self)))
 
         if self._ready:
-            path, host = self._path, self._host
-        else:
-            return self().as_url
+            return self._make_url(self._path, self._host, self._fragment)
+        return self().as_url
 
+    def _make_url(self, path, host, fragment):
         # XXX there is a little mess with `domain` and `host` terms
         if ':' in host:
             domain, port = host.split(':')
@@ -281,29 +456,22 @@ class Reverse(object):
             domain = host
             port = None
 
-        if self._bound_env:
-            request = self._bound_env.request
-            scheme_port = {'http': '80',
-                           'https': '443'}.get(request.scheme, '80')
-
+        context = self._url_context
+        if context is not None:
+            request_domain, request_port = context.domain, context.port
+            port = port or request_port
             # Domain to compare with the result of build.
             # If both values are equal, domain part can be hidden from result.
             # Take it from route_state, not from env.request, because
             # route_state contains domain values with aliased replaced by their
             # primary value
-            primary_domain = self._bound_env._route_state.primary_domain
-            host_split = request.host.split(':')
-            request_domain = host_split[0]
-            request_port = host_split[1] if len(host_split) > 1 else scheme_port
-            port = port or request_port
-
             return URL(path, host=domain or request_domain,
-                       port=port if port != scheme_port else None,
-                       scheme=request.scheme, fragment=self._fragment,
-                       show_host=host and (domain != primary_domain \
+                       port=port if port != context.scheme_port else None,
+                       scheme=context.scheme, fragment=fragment,
+                       show_host=host and (domain != context.primary_domain
                                            or port != request_port))
         return URL(path, host=domain, port=port,
-                   fragment=self._fragment, show_host=True)
+                   fragment=fragment, show_host=True)
 
     def __str__(self):
         '''URLencoded representation of the URL'''
@@ -317,7 +485,8 @@ class Reverse(object):
             app = web.cases(..)
             Reverse.from_handler(app)
         '''
-        return cls(handler._locations())
+        scope = handler._locations()
+        return cls(scope, compiled=CompiledEndpoint.compile_scope(scope))
 
     def bind_to_env(self, bound_env):
         '''
@@ -327,14 +496,12 @@ class Reverse(object):
             # done in iktomi.web.app.Application
             env.root = Reverse.from_handler(app).bind_to_env(env)
         '''
-        return self.__class__(self._scope, self._location,
-                              path=self._path, host=self._host,
-                              fragment=self._fragment,
-                              ready=self._ready,
-                              need_arguments=self._need_arguments,
-                              finalize_params=self._finalize_params,
-                              parent=self._parent,
-                              bound_env=bound_env)
+        # the route map is shared, only request-dependent parts are set
+        bound = object.__new__(self.__class__)
+        bound.__dict__.update(self.__dict__)
+        bound._bound_env = bound_env
+        bound._url_context = UrlContext(bound_env)
+        return bound
 
     def __repr__(self):
         return '{}(path=\'{}\', host=\'{}\')'.format(
@@ -6,6 +6,11 @@ logger = logging.getLogger(__name__)
 
 
 class RouteState(object):
+
+    # `DispatchInfo` of the request, set by `Application` if there are
+    # instruments, so `web.match` does not look it up in `env`
+    dispatch_info = None
+
     def __init__(self, request):
         self._prefixes = ()
         # matched subdomain with aliases replaced by their main value
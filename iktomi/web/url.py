@@ -4,14 +4,42 @@ __all__ = ['URL']
 
 import six
 if six.PY2:
-    from urlparse import urlparse, parse_qs, unquote
+    from urlparse import urlparse, unquote
 else:# pragma: no cover; we check coverage only in python2 part
-    from urllib.parse import urlparse, parse_qs, unquote
+    from urllib.parse import urlparse, unquote
 from webob.multidict import MultiDict
 from .url_templates import urlquote
 from iktomi.utils.url import uri_to_iri_parts
 
 
+# {host: converted host}, hosts are few, so caches are just cleared when
+# they become too large
+_IDNA_CACHE_SIZE = 1024
+_idna_encoded = {}
+_idna_decoded = {}
+
+
+def _encode_host(host):
+    encoded = _idna_encoded.get(host)
+    if encoded is None:
+        encoded = host.encode('idna').decode('utf-8')
+        if len(_idna_encoded) >= _IDNA_CACHE_SIZE:
+            _idna_encoded.clear()
+        _idna_encoded[host] = encoded
+    return encoded
+
+
+def _decode_host(host):
+    decoded = _idna_decoded.get(host)
+    if decoded is None:
+        # force decode idna from both encoded and decoded input
+        decoded = '.'.join(safe_idna(x) for x in host.split('.'))
+        if len(_idna_decoded) >= _IDNA_CACHE_SIZE:
+            _idna_decoded.clear()
+        _idna_decoded[host] = decoded
+    return decoded
+
+
 def construct_url(path, query, host, port, scheme, fragment=None):
     query = ('?' + '&'.join('{}={}'.format(urlquote(k), urlquote(v))
                             for k, v in six.iteritems(query))
@@ -20,31 +48,52 @@ def construct_url(path, query, host, port, scheme, fragment=None):
     hash_part = ('#' + fragment) if fragment is not None else ''
 
     if host:
-        host = host.encode('idna').decode('utf-8')
+        host = _encode_host(host)
         port = ':' + port if port else ''
         return ''.join((scheme, '://', host, port, path, query, hash_part))
     else:
         return path + query + hash_part
 
 if six.PY2:
-    def _parse_qs(query):
-        return sum([[(k.decode('utf-8', errors="replace"),
-                      v.decode('utf-8', errors="replace"))
-                     for v in values]
-                    for k, values in parse_qs(query).items()], [])
+    def _decode_qs(value):
+        return value.decode('utf-8', errors="replace")
+
+    def _unquote_qs(value):
+        return unquote(value.replace('+', ' ')).decode('utf-8',
+                                                       errors="replace")
 
     def _unquote(path):
         # in PY2 unquote returns encoded value of the type it has accepted
         return unquote(path.encode('utf-8')).decode('utf-8')
 else:# pragma: no cover
-    def _parse_qs(query):
-        return sum([[(k, v) for v in values]
-                     for k, values in parse_qs(query).items()], [])
+    def _decode_qs(value):
+        return value
+
+    def _unquote_qs(value):
+        return unquote(value.replace('+', ' '))
 
     # in PY3 is accepts and returns decoded str
     _unquote = unquote
 
 
+def _parse_qs(query):
+    '''Returns a list of (key, value) pairs in the order they appear in the
+    query string. Pairs with blank values are skipped, as `parse_qs` does'''
+    # query strings with many filters are common on list pages,
+    # most of their parts need no unquoting at all
+    result = []
+    for pair in query.split('&'):
+        key, _, value = pair.partition('=')
+        if not value:
+            continue
+        key = _unquote_qs(key) if '%' in key or '+' in key \
+                else _decode_qs(key)
+        value = _unquote_qs(value) if '%' in value or '+' in value \
+                else _decode_qs(value)
+        result.append((key, value))
+    return result
+
+
 def _decode_path(path):
     if path is None:
         return None
@@ -70,6 +119,12 @@ class URL(str):
     #             string convertion values
     #     fragment - None or urlencoded string of text_type
 
+    # many URLs are built per request, so they are kept small;
+    # nonempty __slots__ are not supported for subclasses of bytes
+    if not six.PY2:
+        __slots__ = ('path', '_query', 'host', 'port', 'scheme', 'fragment',
+                     'show_host')
+
     def __new__(cls, path=None, query=None, host=None, port=None, scheme=None,
                 fragment=None, show_host=True, uri_path=None, uri_fragment=None):
         '''
@@ -93,15 +148,17 @@ class URL(str):
             Useful to avoid double quotting.
             Overrides path and fragment parameters.
         '''
-        path = uri_path or _decode_path(path)
+        path = uri_path if uri_path is not None else _decode_path(path)
 
         # Note: it is bad idea to use unicode in fragment part in browsers.
         #       We encode it according to RFC and Firefox does it as well,
         #       but Chrome allows unicode and does not encode/decode it at all
         #       and is uncompatible with RFC.
-        fragment = uri_fragment or _decode_path(fragment)
+        fragment = uri_fragment if uri_fragment is not None \
+                else _decode_path(fragment)
 
-        query = MultiDict(query) if query else MultiDict()
+        # MultiDict for empty query is created on first access
+        query = MultiDict(query) if query else None
         host = host or ''
         port = port or ''
         scheme = scheme or 'http'
@@ -109,10 +166,8 @@ class URL(str):
                               port, scheme, fragment)
         self = str.__new__(cls, _self)
         self.path = path
-        self.query = query
-
-        # force decode idna from both encoded and decoded input
-        self.host = '.'.join(safe_idna(x) for x in host.split('.'))
+        self._query = query
+        self.host = _decode_host(host)
         self.port = port
         self.scheme = scheme
         self.fragment = fragment
@@ -147,11 +202,26 @@ class URL(str):
                    query, host,
                    port, parsed.scheme, fragment, show_host)
 
+    @property
+    def query(self):
+        if self._query is None:
+            self._query = MultiDict()
+        return self._query
+
+    @query.setter
+    def query(self, value):
+        self._query = value
+
     def __reduce__(self):
-        return (self.__class__.from_url, (str(self),))
+        # all parts are kept, host is lost in str(self) if show_host=False
+        query = list(self._query.items()) if self._query else None
+        kwargs = dict(uri_path=self.path, query=query, host=self.host,
+                      port=self.port, scheme=self.scheme,
+                      uri_fragment=self.fragment, show_host=self.show_host)
+        return (_restore_url, (self.__class__, kwargs))
 
     def _copy(self, **kwargs):
-        kw = dict(query=self.query, host=self.host,
+        kw = dict(query=self._query, host=self.host,
                   port=self.port, scheme=self.scheme,
                   show_host=self.show_host)
         kw.update(kwargs)
@@ -227,3 +297,7 @@ class URL(str):
 
     def __repr__(self):
         return '<URL {!r}>'.format(str(self))
+
+
+def _restore_url(cls, kwargs):
+    return cls(**kwargs)
@@ -115,9 +115,10 @@ class Any(Converter):
     def __init__(self, *values, **kwargs):
         Converter.__init__(self, **kwargs)
         self.values = values
+        self._values = frozenset(values)
 
     def to_python(self, value, env=None):
-        if value in self.values:
+        if value in self._values:
             return value
         raise ConvertError(self, value)
 
@@ -7,7 +7,9 @@ else:# pragma: no cover
 
 import re
 import logging
-from .url_converters import default_converters, ConvertError
+from .url_converters import default_converters, ConvertError, \
+                            String, Integer, Any
+from ..utils import cached_property
 
 logger = logging.getLogger(__name__)
 
@@ -95,64 +97,144 @@ def init_converter(conv_class, args):
     return conv_class()
 
 
+def build_parts(parts, kwargs):
+    '''
+    Joins literal string parts and values of (variable name, converter)
+    parts taken from kwargs, as `UrlTemplate` builds URLs'''
+    result = []
+    for part in parts:
+        if part.__class__ is tuple:
+            var, conv_obj = part
+            try:
+                value = kwargs[var]
+            except KeyError:
+                if conv_obj.default is not conv_obj.NotSet:
+                    value = conv_obj.default
+                else:
+                    raise UrlBuildingError('Missing argument for '
+                                           'URL builder: {}'.format(var))
+            result.append(conv_obj.to_url(value))
+        else:
+            result.append(part)
+    return u''.join(result)
+
+
+# conversions of url params inlined in `UrlTemplate.match`
+_CONVERT, _STRING, _INTEGER, _ANY = range(4)
+
+
+def _conversion_kind(conv_obj):
+    '''Returns the way `UrlTemplate.match` converts values for the
+    converter, builtin converters not redefining their methods are
+    converted inline'''
+    cls = conv_obj.__class__
+    to_python = six.get_unbound_function(cls.to_python)
+    if issubclass(cls, String) and \
+            to_python is six.get_unbound_function(String.to_python) and \
+            six.get_unbound_function(cls.check_len) is \
+                six.get_unbound_function(String.check_len):
+        return _STRING
+    if issubclass(cls, Integer) and \
+            to_python is six.get_unbound_function(Integer.to_python):
+        return _INTEGER
+    if issubclass(cls, Any) and hasattr(conv_obj, '_values') and \
+            to_python is six.get_unbound_function(Any.to_python):
+        return _ANY
+    return _CONVERT
+
+
 class UrlTemplate(object):
 
     def __init__(self, template, match_whole_str=True, converters=None,
                  default_converter='string'):
         self.template = template
         self.match_whole_str = match_whole_str
+        self.default_converter = default_converter
         self._allowed_converters = self._init_converters(converters)
         self._pattern, self._url_params, self._builder_params = \
             construct_re(template,
                          match_whole_str=match_whole_str,
                          converters=self._allowed_converters,
                          default_converter=default_converter)
+        # urlencoded literal part of the template preceding the first
+        # url parameter, every matching path starts with it
+        static_parts = []
+        for part in self._builder_params:
+            if isinstance(part, tuple):
+                break
+            static_parts.append(urlquote(part))
+        self.static_prefix = ''.join(static_parts)
+        self.is_static = not self._url_params
+        # (group index, variable name, conversion kind, converter) in the
+        # order of groups
+        groupindex = self._pattern.groupindex
+        self._matchers = tuple(sorted(
+            (groupindex[name] - 1, name, _conversion_kind(conv_obj), conv_obj)
+            for name, conv_obj in self._url_params.items()))
+
+    @cached_property
+    def anonymous_pattern(self):
+        '''
+        Regexp pattern string without any groups, suitable to be joined with
+        other patterns. `None` if converter regexps define their own groups.'''
+        pattern = construct_re(self.template,
+                               match_whole_str=self.match_whole_str,
+                               converters=self._allowed_converters,
+                               default_converter=self.default_converter,
+                               anonymous=True)[0]
+        if pattern.groups:
+            return None
+        return pattern.pattern
 
     def match(self, path, **kw):
         '''
         path - str (urlencoded)
         '''
         m = self._pattern.match(path)
-        if m:
-            kwargs = m.groupdict()
-            # convert params
-            for url_arg_name, value_urlencoded in kwargs.items():
-                conv_obj = self._url_params[url_arg_name]
-                unicode_value = unquote(value_urlencoded)
-                if isinstance(unicode_value, six.binary_type):
-                    # XXX ??
-                    unicode_value = unicode_value.decode('utf-8', 'replace')
-                try:
-                    kwargs[url_arg_name] = conv_obj.to_python(unicode_value, **kw)
-                except ConvertError as err:
-                    logger.debug('ConvertError in parameter "%s" '
-                                 'by %r, value "%s"',
-                                 url_arg_name,
-                                 err.converter.__class__,
-                                 err.value)
-                    return None, {}
+        if m is None:
+            return None, {}
+        kwargs = {}
+        if not self._matchers:
             return m.group(), kwargs
-        return None, {}
+        groups = m.groups()
+        for index, url_arg_name, kind, conv_obj in self._matchers:
+            value = groups[index]
+            # plain segments are returned as is
+            if '%' in value or value.__class__ is not six.text_type:
+                value = unquote(value)
+                if isinstance(value, six.binary_type):
+                    # XXX ??
+                    value = value.decode('utf-8', 'replace')
+            try:
+                if kind == _STRING:
+                    length = len(value)
+                    if length < conv_obj.min or \
+                            conv_obj.max and length > conv_obj.max:
+                        raise ConvertError(conv_obj, value)
+                elif kind == _INTEGER:
+                    try:
+                        value = int(value)
+                    except ValueError:
+                        raise ConvertError(conv_obj, value)
+                elif kind == _ANY:
+                    if value not in conv_obj._values:
+                        raise ConvertError(conv_obj, value)
+                else:
+                    value = conv_obj.to_python(value, **kw)
+            except ConvertError as err:
+                logger.debug('ConvertError in parameter "%s" '
+                             'by %r, value "%s"',
+                             url_arg_name,
+                             err.converter.__class__,
+                             err.value)
+                return None, {}
+            kwargs[url_arg_name] = value
+        return m.group(), kwargs
 
     def __call__(self, **kwargs):
         'Url building with url params values taken from kwargs. (reverse)'
-        result = ''
-        for part in self._builder_params:
-            if isinstance(part, tuple):
-                var, conv_obj = part
-                try:
-                    value = kwargs[var]
-                except KeyError:
-                    if conv_obj.default is not conv_obj.NotSet:
-                        value = conv_obj.default
-                    else:
-                        raise UrlBuildingError('Missing argument for '
-                                               'URL builder: {}'.format(var))
-                result += conv_obj.to_url(value)
-            else:
-                result += part
         # result - unicode not quotted string
-        return result
+        return build_parts(self._builder_params, kwargs)
 
     def _init_converters(self, converters):
         convs = default_converters.copy()
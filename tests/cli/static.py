@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+import os
+import gzip
+import shutil
+import tempfile
+import unittest
+from iktomi.cli.static import StaticFiles, compress_file
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+
+class StaticFilesTests(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.root, 'css'))
+        self.css = os.path.join(self.root, 'css', 'main.css')
+        with open(self.css, 'w') as f:
+            f.write('body { color: red; }\n' * 100)
+        with open(os.path.join(self.root, 'small.js'), 'w') as f:
+            f.write('1')
+        with open(os.path.join(self.root, 'image.png'), 'wb') as f:
+            f.write(b'\0' * 1000)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_precompress(self):
+        cli = StaticFiles(self.root, processes=2)
+        with mock.patch('sys.stdout') as stdout:
+            cli.command_precompress()
+        with gzip.open(self.css + '.gz') as f:
+            self.assertEqual(f.read(), b'body { color: red; }\n' * 100)
+        self.assertEqual(os.stat(self.css + '.gz').st_mtime,
+                         os.stat(self.css).st_mtime)
+        self.assertFalse(os.path.exists(
+                            os.path.join(self.root, 'small.js.gz')))
+        self.assertFalse(os.path.exists(
+                            os.path.join(self.root, 'image.png.gz')))
+        output = ''.join(call[1][0] for call in stdout.write.mock_calls)
+        self.assertIn('css/main.css.gz: 2100 -> ', output)
+
+        # up to date files are skipped
+        self.assertEqual(compress_file((self.css, ['.gz'], False))[2], [])
+        self.assertEqual(len(compress_file((self.css, ['.gz'], True))[2]), 1)
+
+    def test_incompressible(self):
+        path = os.path.join(self.root, 'random.txt')
+        with open(path, 'wb') as f:
+            f.write(os.urandom(1000))
+        with open(path + '.gz', 'wb') as f:
+            f.write(b'stale')
+        self.assertEqual(compress_file((path, ['.gz'], False))[2], [])
+        self.assertFalse(os.path.exists(path + '.gz'))
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+from iktomi.cli.templates import Templates
+from iktomi.templates.jinja2 import TemplateEngine
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+
+class TemplatesTests(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.templates = os.path.join(self.dir, 'templates')
+        os.mkdir(self.templates)
+        with open(os.path.join(self.templates, 'page.html'), 'w') as f:
+            f.write('{{ title }}!')
+        with open(os.path.join(self.templates, 'README'), 'w') as f:
+            f.write('{{ not a template')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_compile(self):
+        target = os.path.join(self.dir, 'compiled.zip')
+        cli = Templates(TemplateEngine(self.templates), target)
+        with mock.patch('sys.stdout') as stdout:
+            cli.command_compile()
+        output = ''.join(call[1][0] for call in stdout.write.mock_calls)
+        self.assertIn('1 templates compiled', output)
+        engine = TemplateEngine(self.templates, compiled=target)
+        os.remove(os.path.join(self.templates, 'page.html'))
+        self.assertEqual(engine.render('page.html', title='Page'), 'Page!')
@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+
+import sys
+
+collect_ignore = []
+if sys.version_info < (3, 5):
+    # async syntax
+    collect_ignore.append('web/asgi.py')
@@ -5,6 +5,7 @@ import unittest
 
 from iktomi.forms import *
 from iktomi.templates import Template
+from iktomi.templates.instrumentation import TemplateInstrument
 from iktomi.templates.jinja2 import TemplateEngine
 from webob.multidict import MultiDict
 from iktomi.web.app import AppEnvironment
@@ -507,3 +508,82 @@ class FormFieldListErrorsTests(unittest.TestCase):
                                            **{'list.1': '1s', 'list.2': '2'})))
         self.assertEqual(form.python_data, {'list': [2, 1]})
         self.assertEqual(form.errors, {'list.1': convs.Int.error_notvalid})
+
+
+class FormInlineWidgetsTests(unittest.TestCase):
+
+    choices = [('1', 'one'), ('2', '<two>')]
+
+    class CustomWidget(widgets.TextInput):
+
+        def render(self):
+            return '<custom %s>' % self.field.input_name
+
+    def get_fields(self):
+        return [
+            Field('text', convs.Char(), initial='a<b', label='Text',
+                  hint='hint'),
+            Field('area', convs.Char(), widget=widgets.Textarea()),
+            Field('hidden', convs.Char(), widget=widgets.HiddenInput()),
+            Field('pwd', convs.Char(), widget=widgets.PasswordInput()),
+            Field('sel', convs.EnumChoice(choices=self.choices),
+                  widget=widgets.Select(), initial='2'),
+            Field('cbs', convs.ListOf(convs.EnumChoice(choices=self.choices)),
+                  widget=widgets.CheckBoxSelect()),
+            Field('cb', convs.Bool(), widget=widgets.CheckBox(), label='Cb'),
+            Field('span', convs.Char(), widget=widgets.CharDisplay(),
+                  initial='<b>'),
+            Field('file', convs.Char(), widget=widgets.FileInput()),
+            Field('ro', convs.Char(), permissions='r', initial='ro'),
+            Field('custom', convs.Char(), widget=self.CustomWidget()),
+            Field('tpl', convs.Char(),
+                  widget=widgets.TextInput(template='widgets/span')),
+            FieldSet('set', fields=[
+                Field('inner', convs.Char(), hint='inner hint'),
+                Field('icb', convs.Bool(), widget=widgets.CheckBox()),
+            ]),
+            FieldList('lst', field=Field('item', convs.Char())),
+        ]
+
+    def render(self, template_name, inline_widgets):
+        templates_dir = os.path.join(os.path.dirname(__file__), '..', '..',
+                                      'iktomi', 'templates', 'jinja2', 'templates')
+        engine = TemplateEngine(templates_dir)
+        rendered = []
+        class Instrument(TemplateInstrument):
+            def template_rendered(self, info):
+                rendered.append(info.name)
+        template = Template(templates_dir, engines={'html': engine},
+                            instruments=[Instrument()])
+        env = AppEnvironment.create(template=template)
+        class F(Form):
+            fields = self.get_fields()
+        F.template = template_name
+        F.inline_widgets = inline_widgets
+        form = F(env, initial={'lst': ['x']})
+        return form.render(), rendered
+
+    def test_same_markup(self):
+        for template_name in ['forms/default', 'forms/table']:
+            separate, separate_rendered = self.render(template_name, False)
+            inline, inline_rendered = self.render(template_name, True)
+            self.assertEqual(separate, inline)
+            self.assertIn('<custom custom>', inline)
+            self.assertEqual(len(separate_rendered), 17)
+            # the form itself, custom widgets and the field list
+            self.assertEqual(sorted(inline_rendered),
+                             [template_name, 'widgets/fieldlist',
+                              'widgets/span', 'widgets/textinput'])
+
+    def test_inline_macro(self):
+        self.assertEqual(widgets.Select().inline_macro, 'select')
+        self.assertEqual(widgets.CheckBoxSelect().inline_macro,
+                         'select_checkbox')
+        self.assertEqual(widgets.TextInput(template='widgets/span',
+                                           macro='span').inline_macro, 'span')
+        self.assertEqual(widgets.TextInput(template='my').inline_macro, None)
+        self.assertEqual(widgets.FieldListWidget().inline_macro, None)
+        self.assertEqual(self.CustomWidget().inline_macro, None)
+        class MyTextInput(widgets.TextInput):
+            template = 'my'
+        self.assertEqual(MyTextInput().inline_macro, None)
@@ -42,6 +42,13 @@ class LocalMemStorageTest(unittest.TestCase):
         self.assertEqual(s.delete('key'), True)
         self.assertEqual(s.get('key'), None)
 
+    def test_add(self):
+        '`LocalMemStorage` add method'
+        s = LocalMemStorage()
+        self.assertEqual(s.add('key', 'value'), True)
+        self.assertEqual(s.add('key', 'value1'), False)
+        self.assertEqual(s.get('key'), 'value')
+
 
 class MemcachedStorageTest(unittest.TestCase):
     def setUp(self):
@@ -76,3 +83,9 @@ class MemcachedStorageTest(unittest.TestCase):
         self.assertEqual(self.storage.get('key'), None)
         # mockcache does not support this
         #self.assertEqual(self.storage.delete('key'), True)
+
+    def test_add(self):
+        '`MemcachedStorage` add method'
+        self.assertEqual(self.storage.add('key', 'value'), True)
+        self.assertEqual(self.storage.add('key', 'value1'), False)
+        self.assertEqual(self.storage.get('key'), 'value')
@@ -1,13 +1,20 @@
+# -*- coding: utf-8 -*-
 import os
+import shutil
+import tempfile
 import unittest
+from glob import glob
 from iktomi import web
 from iktomi.templates import Template, TemplateError, BoundTemplate
-from iktomi.templates.jinja2 import TemplateEngine
+from iktomi.templates.jinja2 import TemplateEngine, FragmentCacheExtension
+from iktomi.templates.instrumentation import TemplateInstrument, \
+                                           TemplateTimings
+from iktomi.storage import LocalMemStorage
 
 try:
-    from unittest.mock import Mock
+    from unittest.mock import Mock, patch
 except ImportError:
-    from mock import Mock
+    from mock import Mock, patch
 
 
 class TemplateTest(unittest.TestCase):
@@ -33,6 +40,23 @@ class TemplateTest(unittest.TestCase):
         self.assertIn('readonly="readonly"', rendered)
         self.assertIn('>Sample text<', rendered)
 
+    def test_stream(self):
+        widget = Mock(id=101,
+                      classname="big",
+                      input_name="big_input")
+        kwargs = dict(widget=widget, readonly=True, value="Sample text")
+        chunks = list(self.template.stream('widgets/textarea', **kwargs))
+        self.assertEqual(u''.join(chunks),
+                         self.template.render('widgets/textarea', **kwargs))
+
+        class RenderOnlyEngine(object):
+            def render(self, template_name, **kw):
+                return u'rendered'
+        template = Template(self.template.dirs[0],
+                            engines={'html': RenderOnlyEngine()})
+        self.assertEqual(list(template.stream('widgets/textarea')),
+                         [u'rendered'])
+
     def test_resolve(self):
         filename, engine = self.template.resolve('widgets/textarea')
         self.assertEqual(filename, 'widgets/textarea.html')
@@ -41,6 +65,239 @@ class TemplateTest(unittest.TestCase):
             self.template.resolve('nonexsistent/path')
 
 
+class TemplateCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dirs = [tempfile.mkdtemp(), tempfile.mkdtemp()]
+        self.engine = TemplateEngine(self.dirs)
+        self.write(1, 'widgets/input.html')
+        self.write(1, 'page.html')
+
+    def tearDown(self):
+        for d in self.dirs:
+            shutil.rmtree(d)
+
+    def write(self, index, name):
+        path = os.path.join(self.dirs[index], name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(name)
+
+    def template(self, cache):
+        return Template(*self.dirs, engines={'html': self.engine},
+                        cache=cache)
+
+    def test_permanent(self):
+        template = self.template(True)
+        with patch('iktomi.templates.glob', wraps=glob) as mock_glob:
+            for i in range(3):
+                self.assertEqual(template.resolve('widgets/input'),
+                                 ('widgets/input.html', self.engine))
+            self.assertEqual(mock_glob.call_count, 2)
+        self.write(0, 'widgets/input.html')
+        self.assertEqual(template.render('widgets/input'),
+                         'widgets/input.html')
+        self.assertEqual(template.resolve('widgets/input'),
+                         ('widgets/input.html', self.engine))
+
+    def test_mtime(self):
+        template = self.template('mtime')
+        self.assertEqual(template.resolve('page'),
+                         ('page.html', self.engine))
+        with patch('iktomi.templates.glob', wraps=glob) as mock_glob:
+            template.resolve('page')
+            self.assertEqual(mock_glob.call_count, 0)
+        # a new template in the directory with higher priority
+        self.write(0, 'page.html')
+        with patch('iktomi.templates.glob', wraps=glob) as mock_glob:
+            template.resolve('page')
+            self.assertEqual(mock_glob.call_count, 1)
+
+    def test_preload(self):
+        self.write(0, 'page.html')
+        self.write(1, 'notes.txt')
+        template = self.template(True)
+        template.preload()
+        with patch('iktomi.templates.glob', wraps=glob) as mock_glob:
+            for name in ['page', 'page.html', 'widgets/input',
+                         'widgets/input.html']:
+                self.assertEqual(template.resolve(name),
+                                 (name.split('.')[0] + '.html', self.engine))
+            self.assertEqual(mock_glob.call_count, 0)
+        self.assertEqual(template.render('page'), 'page.html')
+        with self.assertRaises(TemplateError):
+            template.resolve('notes')
+
+    def test_disabled(self):
+        template = self.template(False)
+        template.resolve('page')
+        with patch('iktomi.templates.glob', wraps=glob) as mock_glob:
+            template.resolve('page')
+            self.assertEqual(mock_glob.call_count, 2)
+
+
+class TemplateEngineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.dir, 'templates'))
+        with open(os.path.join(self.dir, 'templates', 'page.html'), 'w') as f:
+            f.write('{{ title }}!')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def render(self, engine):
+        return engine.render('page.html', title='Page')
+
+    def test_bytecode_cache(self):
+        cache_dir = os.path.join(self.dir, 'cache')
+        engine = TemplateEngine(os.path.join(self.dir, 'templates'),
+                                cache=cache_dir)
+        self.assertEqual(self.render(engine), 'Page!')
+        self.assertEqual(len(os.listdir(cache_dir)), 1)
+        # other worker loads bytecode
+        engine = TemplateEngine(os.path.join(self.dir, 'templates'),
+                                cache=cache_dir)
+        self.assertEqual(self.render(engine), 'Page!')
+
+    def test_auto_reload(self):
+        engine = TemplateEngine(os.path.join(self.dir, 'templates'),
+                                auto_reload=False)
+        self.assertFalse(engine.env.auto_reload)
+        self.assertTrue(TemplateEngine(self.dir).env.auto_reload)
+
+    def test_compiled(self):
+        for target in ['compiled', 'compiled.zip']:
+            target = os.path.join(self.dir, target)
+            engine = TemplateEngine(os.path.join(self.dir, 'templates'))
+            self.assertEqual(engine.compile_templates(target), ['page.html'])
+            # sources are not needed anymore
+            engine = TemplateEngine(os.path.join(self.dir, 'empty'),
+                                    compiled=target)
+            self.assertEqual(self.render(engine), 'Page!')
+
+    def test_compiled_fallback(self):
+        engine = TemplateEngine(os.path.join(self.dir, 'templates'),
+                                compiled=os.path.join(self.dir, 'compiled'))
+        self.assertEqual(self.render(engine), 'Page!')
+
+
+class FragmentCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        with open(os.path.join(self.dir, 'page.html'), 'w') as f:
+            f.write('{% cache "menu", lang %}<{{ menu() }}>{% endcache %}|'
+                    '{% cache "side", ttl=10, location=True %}'
+                    '{{ env.current_location }}{% endcache %}')
+        self.engine = TemplateEngine(self.dir,
+                                     extensions=[FragmentCacheExtension])
+        self.storage = LocalMemStorage()
+        self.engine.env.install_fragment_cache(self.storage)
+        self.calls = []
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def menu(self):
+        self.calls.append(1)
+        return u'menu {}'.format(len(self.calls))
+
+    def render(self, lang='en', location='index'):
+        env = web.AppEnvironment.create()
+        env.current_location = location
+        return self.engine.render('page.html', menu=self.menu, lang=lang,
+                                  env=env)
+
+    def test_cache(self):
+        self.assertEqual(self.render(), '<menu 1>|index')
+        self.assertEqual(self.render(), '<menu 1>|index')
+        self.assertEqual(self.render(location='docs'),
+                         '<menu 1>|docs')
+        self.assertEqual(self.render(lang='ru'), '<menu 2>|index')
+        self.assertEqual(self.engine.env.fragment_cache_stats, {
+            'menu': {'hits': 2, 'misses': 2},
+            'side': {'hits': 2, 'misses': 2},
+        })
+
+    def test_invalidate(self):
+        self.render()
+        self.engine.env.invalidate_fragment('menu')
+        self.assertEqual(self.render(), '<menu 2>|index')
+        self.engine.env.install_fragment_cache(self.storage, version='2')
+        self.assertEqual(self.render(), '<menu 3>|index')
+        self.assertEqual(self.render(), '<menu 3>|index')
+
+    def test_ttl(self):
+        now = [1000.0]
+        with patch('iktomi.templates.jinja2.time.time', lambda: now[0]):
+            self.assertEqual(self.render(), '<menu 1>|index')
+            now[0] += 299
+            self.assertEqual(self.render(), '<menu 1>|index')
+            now[0] += 1
+            self.assertEqual(self.render(), '<menu 2>|index')
+        self.assertEqual(self.engine.env.fragment_cache_stats['side'],
+                         {'hits': 1, 'misses': 2})
+
+    def test_not_installed(self):
+        engine = TemplateEngine(self.dir,
+                                extensions=[FragmentCacheExtension])
+        self.engine = engine
+        self.render()
+        self.assertEqual(self.render(), '<menu 2>|index')
+
+
+class TemplateInstrumentationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        with open(os.path.join(self.dir, 'form.html'), 'w') as f:
+            f.write('{% for i in range(3) %}{{ widget(i) }}{% endfor %}')
+        with open(os.path.join(self.dir, 'widget.html'), 'w') as f:
+            f.write('[{{ i }}]')
+        self.infos = []
+        recorder = TemplateInstrument()
+        recorder.template_rendered = self.infos.append
+        self.timings = TemplateTimings()
+        self.template = Template(
+                self.dir, engines={'html': TemplateEngine(self.dir)},
+                instruments=[recorder, self.timings])
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def widget(self, i):
+        return self.template.render('widget', i=i)
+
+    def test_nested(self):
+        self.assertEqual(self.template.render('form', widget=self.widget),
+                         '[0][1][2]')
+        self.assertEqual([(info.name, info.depth) for info in self.infos],
+                         [('widget', 1)] * 3 + [('form', 0)])
+        form = self.infos[-1]
+        self.assertAlmostEqual(
+            form.nested_time,
+            sum(info.total_time for info in self.infos[:-1]))
+        self.assertTrue(0 <= form.own_time <= form.total_time)
+
+        dump = self.timings.dump()
+        self.assertEqual(dump['widget']['render']['count'], 3)
+        self.assertEqual(dump['widget']['depths'], {1: 3})
+        self.assertEqual(dump['form']['depths'], {0: 1})
+        self.assertEqual(self.timings.format().splitlines()[0].split()[0],
+                         'template')
+
+    def test_errors(self):
+        with self.assertRaises(TemplateError):
+            self.template.render('missing')
+        self.assertEqual(self.infos[0].name, 'missing')
+        # the depth is restored after errors
+        self.template.render('widget', i=0)
+        self.assertEqual(self.infos[1].depth, 0)
+
+
 class BoundTemplateTest(unittest.TestCase):
 
     def setUp(self):
@@ -94,3 +351,20 @@ class BoundTemplateTest(unittest.TestCase):
         self.assertIn('class="big"', rendered)
         self.assertIn('readonly="readonly"', rendered)
         self.assertIn('>Sample text<', rendered)
+
+    def test_stream_to_response(self):
+        widget = Mock(id=111,
+                      classname="big",)
+        response = self.bound.stream_to_response('widgets/textarea',
+                                                 {'widget':widget,
+                                                  'value':u"Текст"},
+                                                 buffer_size=2)
+        self.assertIn('text/html', response.headers['Content-Type'])
+        self.assertNotIn('Content-Length', response.headers)
+        self.assertNotIsInstance(response.app_iter, list)
+
+        chunks = list(response.app_iter)
+        self.assertGreater(len(chunks), 1)
+        rendered = b''.join(chunks).decode('utf-8')
+        self.assertEqual(rendered, self.bound.render(
+            'widgets/textarea', widget=widget, value=u"Текст"))
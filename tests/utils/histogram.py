@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+import random
+import unittest
+from iktomi.utils.histogram import Histogram
+
+
+class HistogramTests(unittest.TestCase):
+
+    def test_empty(self):
+        h = Histogram()
+        self.assertEqual(h.count, 0)
+        self.assertEqual(h.percentile(50), None)
+        self.assertEqual(h.mean, None)
+
+    def test_exact_small_values(self):
+        h = Histogram(precision_bits=7)
+        for value in range(100):
+            h.record(value)
+        self.assertEqual(h.percentile(50), 49)
+        self.assertEqual(h.percentile(100), 99)
+        self.assertEqual(h.min, 0)
+        self.assertEqual(h.max, 99)
+        self.assertEqual(h.mean, 49.5)
+
+    def test_relative_error(self):
+        rnd = random.Random(0)
+        values = sorted(int(rnd.expovariate(1e-4)) for i in range(10000))
+        h = Histogram(precision_bits=7)
+        for value in values:
+            h.record(value)
+        for percent in (50, 90, 99):
+            exact = values[int(len(values) * percent / 100.0) - 1]
+            self.assertLessEqual(abs(h.percentile(percent) - exact),
+                                 exact / 64.0 + 1)
+        # buckets are much fewer than values
+        self.assertLess(len(h.counts), 1000)
+
+    def test_merge(self):
+        h1 = Histogram()
+        h2 = Histogram()
+        h1.record(10, count=3)
+        h2.record(100000)
+        h1.merge(h2)
+        self.assertEqual(h1.count, 4)
+        self.assertEqual(h1.max, 100000)
+        self.assertEqual(h1.percentile(75), 10)
+        self.assertEqual(h1.percentile(100), 100000)
+
+    def test_summary(self):
+        h = Histogram()
+        h.record(5)
+        summary = h.summary(percents=(50, 99.9))
+        self.assertEqual(summary['p50'], 5)
+        self.assertEqual(summary['p99.9'], 5)
+        self.assertEqual(summary['count'], 1)
+
+    def test_negative(self):
+        self.assertRaises(ValueError, Histogram().record, -1)
@@ -66,6 +66,76 @@ class VersionedStorageTests(unittest.TestCase):
         vs._pop()
         self.assertEqual(vs.as_dict(), {'a': 1})
 
+    def test_lazy_frames(self):
+        'VersionedStorage allocates frames on first write'
+        vs = VersionedStorage(a=1)
+        root = vs._storage
+        self.assertEqual(vs._push(), None)
+        vs._push()
+        self.assertIs(vs._storage, root)
+        self.assertEqual(vs.a, 1)
+
+        vs.b = 2
+        frame = vs._storage
+        self.assertIsNot(frame, root)
+        self.assertIs(frame._parent_storage, root)
+        vs.c = 3
+        self.assertIs(vs._storage, frame)
+        self.assertEqual(vs.as_dict(), {'a': 1, 'b': 2, 'c': 3})
+
+        vs._pop()
+        self.assertIs(vs._storage, root)
+        self.assertEqual(vs.as_dict(), {'a': 1})
+        vs.d = 4
+        self.assertIsNot(vs._storage, root)
+        vs._pop()
+        self.assertIs(vs._storage, root)
+        self.assertEqual(vs.as_dict(), {'a': 1})
+
+    def test_delattr(self):
+        'VersionedStorage delattr on the current level only'
+        vs = VersionedStorage(a=1)
+        vs._push()
+        self.assertRaises(AttributeError, delattr, vs, 'a')
+        vs.a = 2
+        del vs.a
+        self.assertEqual(vs.a, 1)
+        vs._pop()
+        self.assertEqual(vs.a, 1)
+
+    def test_shadowing(self):
+        'VersionedStorage values of pushed levels shadow lower ones'
+        class Env(StorageFrame):
+            attr = 'class'
+        vs = VersionedStorage(Env, a=1)
+        vs._push(a=2)
+        vs._push()
+        vs.a = 3
+        vs.attr = 'level'
+        vs._push()
+        vs.b = 1
+        del vs.b
+        self.assertEqual((vs.a, vs.attr), (3, 'level'))
+        self.assert_(not hasattr(vs, 'b'))
+        vs.a = 4
+        del vs.a
+        self.assertEqual(vs.a, 3)
+        vs._pop()
+        self.assertEqual((vs.a, vs.attr), (3, 'level'))
+        vs._pop()
+        self.assertEqual((vs.a, vs.attr), (2, 'class'))
+        vs._pop()
+        self.assertEqual((vs.a, vs.attr), (1, 'class'))
+        self.assertEqual(vs._index, {})
+
+    def test_slots(self):
+        frame = StorageFrame(a=1)
+        self.assertEqual(frame.__dict__, {'a': 1})
+        vs = VersionedStorage()
+        self.assertRaises(AttributeError,
+                          object.__getattribute__, vs, '__dict__')
+        self.assertEqual(StorageFrame(a=1).as_dict(), {'a': 1})
+
     def test_storage_properties(self):
         class Env(StorageFrame):
 
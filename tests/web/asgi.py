@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+
+__all__ = ['AsyncApplicationTests']
+
+import time
+import zlib
+import asyncio
+import threading
+import unittest
+from webob import Response
+from webob.exc import HTTPForbidden
+from iktomi import web
+from iktomi.web.asgi import AsyncApplication, async_call
+from iktomi.auth import CookieAuth, auth_required
+from iktomi.storage import LocalMemStorage
+
+
+def request(app, path, method='GET', body=b'', headers=()):
+    scope = {
+        'type': 'http',
+        'method': method,
+        'path': path.split('?')[0],
+        'query_string': path.partition('?')[2].encode('latin-1'),
+        'headers': list(headers) or [(b'host', b'example.com')],
+        'server': ('example.com', 80),
+    }
+    messages = [{'type': 'http.request', 'body': body[:1],
+                 'more_body': True},
+                {'type': 'http.request', 'body': body[1:]}]
+    sent = []
+    async def receive():
+        return messages.pop(0)
+    async def send(message):
+        sent.append(message)
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(app(scope, receive, send))
+    finally:
+        loop.close()
+    start = sent[0]
+    assert not sent[-1].get('more_body')
+    body = b''.join(message['body'] for message in sent[1:])
+    return start['status'], dict(start['headers']), body
+
+
+class AsyncApplicationTests(unittest.TestCase):
+
+    def app(self):
+        async def index(env, data):
+            await asyncio.sleep(0)
+            return Response(body=b'index')
+
+        async def item(env, data):
+            await asyncio.sleep(0)
+            # storage is not rolled back before the coroutine is finished
+            url = env.root.docs.item(id=data.id + 1)
+            return Response(body='{} {} {}'.format(
+                env.current_location, data.id, url).encode('utf-8'))
+
+        async def post(env, data):
+            return Response(body=env.request.POST['value'].encode('utf-8'))
+
+        def set_flag(env, data):
+            env.flag = True
+
+        async def check_flag(env, data):
+            await asyncio.sleep(0)
+            return Response(body=str(hasattr(env, 'flag')).encode('ascii'))
+
+        @web.request_filter
+        async def add_header(env, data, next_handler):
+            response = await next_handler(env, data)
+            response.headers['X-Filter'] = 'yes'
+            return response
+
+        @web.request_filter
+        def forbid(env, data, next_handler):
+            if 'forbid' in env.request.GET:
+                raise HTTPForbidden()
+            return next_handler(env, data)
+
+        async def error(env, data):
+            await asyncio.sleep(0)
+            return 1 + ''
+
+        return web.cases(
+            web.subdomain('api.example.com') | web.match('/', 'api') | \
+                    (lambda env, data: Response(body=b'api')),
+            web.match('/', 'index') | index,
+            web.prefix('/docs') | web.namespace('docs') | web.cases(
+                web.match('/<int:id>', 'item') | forbid | item,
+                web.match('/filtered', 'filtered') | add_header | index,
+            ),
+            web.match('/post', 'post') | web.method('POST', strict=True) | \
+                    post,
+            web.match('/flag', 'flag') | web.cases(set_flag, check_flag),
+            web.match('/sync', 'sync') | \
+                    (lambda env, data: Response(body=b'sync')),
+            web.match('/500', 'error') | error,
+        )
+
+    def test_async_handlers(self):
+        app = AsyncApplication(self.app())
+        self.assertEqual(request(app, '/'), (200, {
+            b'content-type': b'text/html; charset=UTF-8',
+            b'content-length': b'5'}, b'index'))
+        self.assertEqual(request(app, '/docs/1')[2],
+                         b'docs.item 1 /docs/2')
+        self.assertEqual(request(app, '/docs/1?forbid')[0], 403)
+        status, headers, body = request(app, '/docs/filtered')
+        self.assertEqual(headers[b'x-filter'], b'yes')
+        self.assertEqual(request(app, '/sync')[2], b'sync')
+        self.assertEqual(request(app, '/', headers=[
+                            (b'host', b'api.example.com')])[2], b'api')
+        self.assertEqual(request(app, '/flag')[2], b'False')
+        self.assertEqual(request(
+            app, '/post', method='POST', body=b'value=posted',
+            headers=[(b'content-type',
+                      b'application/x-www-form-urlencoded')])[2],
+            b'posted')
+        self.assertEqual(request(app, '/post')[0], 405)
+        self.assertEqual(request(app, '/missing')[0], 404)
+        self.assertEqual(request(app, '/500')[0], 500)
+
+    def test_sync_filters(self):
+        state = []
+
+        @web.request_filter
+        def add_header(env, data, next_handler):
+            response = next_handler(env, data)
+            response.headers['X-Filter'] = 'sync'
+            return response
+
+        @web.request_filter
+        def resource(env, data, next_handler):
+            state.append('open')
+            try:
+                return next_handler(env, data)
+            finally:
+                state.append('closed')
+
+        def page(env, data):
+            return Response(body=('res=' + state[-1]).encode('ascii'))
+
+        app = AsyncApplication(web.cases(
+            web.match('/header', 'header') | add_header | \
+                    (lambda env, data: Response(body=b'header')),
+            web.match('/res', 'res') | resource | page,
+        ))
+        status, headers, body = request(app, '/header')
+        self.assertEqual(status, 200)
+        self.assertEqual(headers[b'x-filter'], b'sync')
+        self.assertEqual(request(app, '/res')[2], b'res=open')
+        self.assertEqual(state, ['open', 'closed'])
+
+    def test_sync_filter_above_cases(self):
+        @web.request_filter
+        def setup(env, data, next_handler):
+            env.lang = 'en'
+            return next_handler(env, data)
+
+        async def not_found(env, data):
+            await asyncio.sleep(0)
+            return None
+
+        async def item(env, data):
+            await asyncio.sleep(0)
+            return Response(body='{} {}'.format(env.lang, data.id)
+                                 .encode('ascii'))
+
+        app = AsyncApplication(setup | web.cases(
+            web.match('/a/<int:id>', 'a') | not_found,
+            web.match('/a/<int:id>', 'a2') | item,
+        ))
+        self.assertEqual(request(app, '/a/1'), (200, {
+            b'content-type': b'text/html; charset=UTF-8',
+            b'content-length': b'4'}, b'en 1'))
+        app = AsyncApplication(setup | web.cases(
+            web.match('/b/<int:id>', 'b') | item,
+        ))
+        self.assertEqual(request(app, '/b/2')[2], b'en 2')
+        self.assertEqual(request(app, '/c')[0], 404)
+
+    def test_streaming(self):
+        closed = []
+        class AppIter(object):
+            def __iter__(self):
+                yield b'one'
+                yield b''
+                yield b'two'
+            def close(self):
+                closed.append(True)
+        app = AsyncApplication(web.cases(
+            lambda env, data: Response(app_iter=AppIter())))
+        scope = {'type': 'http', 'method': 'GET', 'path': '/',
+                 'headers': [(b'host', b'example.com')],
+                 'server': ('example.com', 80)}
+        sent = []
+        async def receive():
+            return {'type': 'http.request', 'body': b''}
+        async def send(message):
+            sent.append(message)
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(app(scope, receive, send))
+        loop.close()
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertEqual([(m['body'], m.get('more_body', False))
+                          for m in sent[1:]],
+                         [(b'one', True), (b'two', True), (b'', False)])
+        self.assertEqual(closed, [True])
+
+    def test_compiled_and_frozen(self):
+        app = AsyncApplication(self.app(), compile_routes=True, freeze=True)
+        self.assertEqual(request(app, '/docs/1')[2],
+                         b'docs.item 1 /docs/2')
+        self.assertEqual(request(app, '/flag')[2], b'False')
+        self.assertEqual(request(app, '/missing')[0], 404)
+
+    def test_instruments(self):
+        timings = web.RouteTimings()
+        app = AsyncApplication(self.app(), instruments=[timings])
+        request(app, '/docs/1')
+        request(app, '/500')
+        dump = timings.dump()
+        self.assertEqual(dump['docs.item']['statuses'], {200: 1})
+        self.assertEqual(dump['error']['statuses'], {500: 1})
+
+    def test_invalid_host(self):
+        app = AsyncApplication(self.app())
+        self.assertEqual(request(app, '/', headers=[(b'host', b'a..b')])[0],
+                         404)
+
+    def test_cookie_auth(self):
+        async def identify_user(env, user_identity):
+            await asyncio.sleep(0)
+            return 'user ' + user_identity
+        auth = CookieAuth(lambda env, login: login, identify_user)
+        async def whoami(env, data):
+            return Response(body=env.user.encode('utf-8'))
+        app = AsyncApplication(auth | web.cases(
+            web.match('/login', 'login') | (lambda env, data:
+                auth.login_identity('john')),
+            web.match('/', 'index') | auth_required | whoami,
+        ))
+        status, headers, body = request(app, '/login')
+        cookie = headers[b'set-cookie'].split(b';')[0]
+        self.assertEqual(request(app, '/', headers=[(b'cookie', cookie)])[2],
+                         b'user john')
+        self.assertEqual(request(app, '/')[0], 303)
+
+    def test_custom_handler(self):
+        class Upper(web.WebHandler):
+            async def __call__(self, env, data):
+                response = await async_call(self.next_handler, env, data)
+                response.body = response.body.upper()
+                return response
+        app = AsyncApplication(Upper() | self.app())
+        self.assertEqual(request(app, '/')[2], b'INDEX')
+
+    def test_compress(self):
+        async def page(env, data):
+            await asyncio.sleep(0)
+            return Response(body=b'x' * 2000)
+        app = AsyncApplication(web.compress() | page)
+        status, headers, body = request(app, '/', headers=[
+            (b'host', b'example.com'), (b'accept-encoding', b'gzip')])
+        self.assertEqual(headers[b'content-encoding'], b'gzip')
+        self.assertEqual(zlib.decompress(body, 31), b'x' * 2000)
+
+    def test_cache_response(self):
+        calls = []
+        async def page(env, data):
+            await asyncio.sleep(0)
+            calls.append(1)
+            return Response(body=b'page')
+        app = AsyncApplication(web.cache_response(LocalMemStorage(), ttl=60)
+                               | page)
+        self.assertEqual(request(app, '/')[2], b'page')
+        self.assertEqual(request(app, '/')[2], b'page')
+        self.assertEqual(len(calls), 1)
+
+    def test_cache_response_not_cacheable(self):
+        calls = []
+        async def page(env, data):
+            await asyncio.sleep(0.2)
+            calls.append(1)
+            response = Response(body=b'page')
+            response.set_cookie('a', 'b')
+            return response
+        handler = web.cache_response(LocalMemStorage(), ttl=60,
+                                     lock_timeout=3)
+        handler.poll_interval = 0.01
+        app = AsyncApplication(handler | page)
+        results = []
+        threads = [threading.Thread(
+                        target=lambda: results.append(request(app, '/')[2]))
+                   for i in range(3)]
+        started = time.time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertLess(time.time() - started, 2)
+        self.assertEqual(results, [b'page'] * 3)
+        self.assertEqual(len(calls), 3)
+
+    def test_conditional_get(self):
+        async def page(env, data):
+            env.response_version.check(1)
+            return Response(body=b'page')
+        app = AsyncApplication(web.conditional_get() | page)
+        status, headers, body = request(app, '/')
+        etag = dict(headers)[b'etag']
+        status, headers, body = request(app, '/', headers=[
+            (b'host', b'example.com'), (b'if-none-match', etag)])
+        self.assertEqual(status, 304)
+        self.assertEqual(body, b'')
+
+    def test_lifespan(self):
+        app = AsyncApplication(self.app())
+        messages = [{'type': 'lifespan.startup'},
+                    {'type': 'lifespan.shutdown'}]
+        sent = []
+        async def receive():
+            return messages.pop(0)
+        async def send(message):
+            sent.append(message['type'])
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(app({'type': 'lifespan'}, receive, send))
+        loop.close()
+        self.assertEqual(sent, ['lifespan.startup.complete',
+                                'lifespan.shutdown.complete'])
@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+
+__all__ = ['CacheResponseTests', 'ConditionalGetTests']
+
+import time
+import threading
+import unittest
+from webob import Request, Response
+from iktomi import web
+from iktomi.web.app import Application
+from iktomi.storage import LocalMemStorage
+from iktomi.utils.storage import VersionedStorage
+# import as TA because py.test generates warning about TestApp name
+from webtest import TestApp as TA
+
+
+class CacheResponseTests(unittest.TestCase):
+
+    def setUp(self):
+        self.storage = LocalMemStorage()
+        self.calls = []
+
+    def page(self, env, data):
+        self.calls.append(env.request.path_qs)
+        response = Response(body='page {}'.format(len(self.calls))
+                                 .encode('utf-8'))
+        if 'cookie' in env.request.GET:
+            response.set_cookie('a', 'b')
+        if 'private' in env.request.GET:
+            response.cache_control.private = True
+        return response
+
+    def app(self, **kwargs):
+        kwargs.setdefault('ttl', 60)
+        return TA(Application(
+            web.cache_response(self.storage, **kwargs) | web.cases(
+                web.match('/', 'index') | self.page,
+                web.match('/404', 'missing') | (lambda e, d: None),
+            )))
+
+    def test_hit(self):
+        app = self.app(vary=['Accept-Language'])
+        self.assertEqual(app.get('/').body, b'page 1')
+        response = app.get('/')
+        self.assertEqual(response.body, b'page 1')
+        self.assertEqual(response.content_type, 'text/html')
+        self.assertEqual(app.head('/').body, b'')
+        self.assertEqual(app.get('/?a=1').body, b'page 2')
+        self.assertEqual(app.get('/', headers={'Accept-Language': 'ru'}).body,
+                         b'page 3')
+        self.assertEqual(app.post('/').body, b'page 4')
+        self.assertEqual(self.calls, ['/', '/?a=1', '/', '/'])
+        # lock is released
+        self.assertEqual([key for key in self.storage.storage
+                          if key.endswith(':lock')], [])
+
+    def test_not_cacheable(self):
+        app = self.app()
+        app.get('/?cookie')
+        app.get('/?cookie')
+        app.get('/?private')
+        app.get('/?private')
+        app.get('/404', status=404)
+        app.get('/404', status=404)
+        self.assertEqual(len(self.calls), 4)
+
+    def test_response_vary(self):
+        def page(env, data):
+            self.calls.append(env.request.path_qs)
+            return Response(body=b'x' * 2000)
+        def get(app, accept_encoding=None):
+            request = Request.blank('/')
+            if accept_encoding:
+                request.headers['Accept-Encoding'] = accept_encoding
+            return request.get_response(app)
+        for vary, calls in [((), 4), (['Accept-Encoding'], 2)]:
+            self.storage = LocalMemStorage()
+            self.calls = []
+            app = Application(
+                web.cache_response(self.storage, ttl=60, vary=vary) |
+                web.compress() | page)
+            self.assertEqual(get(app, 'gzip').content_encoding, 'gzip')
+            self.assertEqual(get(app, 'gzip').content_encoding, 'gzip')
+            response = get(app)
+            self.assertEqual(response.content_encoding, None)
+            self.assertEqual(response.body, b'x' * 2000)
+            get(app)
+            self.assertEqual(len(self.calls), calls)
+
+    def test_bypass(self):
+        @web.request_filter
+        def auth(env, data, next_handler):
+            env.user = 'john' if 'user' in env.request.GET else None
+            return next_handler(env, data)
+        app = TA(Application(
+            auth | web.cache_response(self.storage, ttl=60) | self.page))
+        app.get('/?user')
+        app.get('/?user')
+        self.assertEqual(len(self.calls), 2)
+        app.get('/')
+        app.get('/')
+        self.assertEqual(len(self.calls), 3)
+
+        app = self.app(key=lambda env: None)
+        app.get('/')
+        app.get('/')
+        self.assertEqual(len(self.calls), 5)
+
+    def test_stale_while_revalidate(self):
+        app = self.app(ttl=0, stale_ttl=60)
+        self.assertEqual(app.get('/').body, b'page 1')
+        # stale entry is refreshed by a request holding the lock
+        self.assertEqual(app.get('/').body, b'page 2')
+        # others get stale response meanwhile
+        handler = web.cache_response(self.storage, ttl=0, stale_ttl=60)
+        key = [key for key in self.storage.storage][0]
+        self.assertTrue(handler.lock(key))
+        self.assertEqual(app.get('/').body, b'page 2')
+        handler.unlock(key)
+        self.assertEqual(app.get('/').body, b'page 3')
+
+    def test_expired(self):
+        app = self.app(ttl=0)
+        app.get('/')
+        app.get('/')
+        self.assertEqual(len(self.calls), 2)
+
+    def test_stampede(self):
+        rendering = threading.Event()
+        def slow_page(env, data):
+            rendering.set()
+            time.sleep(0.2)
+            return self.page(env, data)
+        handler = web.cache_response(self.storage, ttl=60)
+        handler.poll_interval = 0.01
+        app = TA(Application(handler | slow_page))
+        results = []
+        thread = threading.Thread(
+            target=lambda: results.append(app.get('/').body))
+        thread.start()
+        rendering.wait()
+        results.append(app.get('/').body)
+        thread.join()
+        self.assertEqual(results, [b'page 1', b'page 1'])
+        self.assertEqual(len(self.calls), 1)
+
+    def test_stampede_not_cacheable(self):
+        def slow_page(env, data):
+            time.sleep(0.2)
+            return self.page(env, data)
+        handler = web.cache_response(self.storage, ttl=60, lock_timeout=3)
+        handler.poll_interval = 0.01
+        app = TA(Application(handler | slow_page))
+        results = []
+        threads = [threading.Thread(
+                        target=lambda: results.append(app.get('/?cookie').body))
+                   for i in range(3)]
+        started = time.time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # waiters render the page as soon as the lock is released
+        self.assertLess(time.time() - started, 2)
+        self.assertEqual(sorted(results), [b'page 1', b'page 2', b'page 3'])
+        self.assertEqual([key for key in self.storage.storage
+                          if key.endswith(':lock')], [])
+
+    def test_lock_timeout(self):
+        handler = web.cache_response(self.storage, ttl=60, lock_timeout=0.05)
+        handler.poll_interval = 0.01
+        app = TA(Application(handler | self.page))
+        env = VersionedStorage(request=Request.blank('/'))
+        self.assertTrue(handler.lock(handler.cache_key(env)))
+        # gives up waiting and renders the page itself without storing
+        self.assertEqual(app.get('/').body, b'page 1')
+        self.assertEqual(app.get('/').body, b'page 2')
+
+
+class ConditionalGetTests(unittest.TestCase):
+
+    def setUp(self):
+        self.rendered = []
+
+    def page(self, env, data):
+        self.rendered.append(1)
+        return Response(body=b'page', cache_control='max-age=60')
+
+    def versioned(self, env, data):
+        env.response_version.check('doc', data.version)
+        return self.page(env, data)
+
+    def stream(self, env, data):
+        return Response(app_iter=iter([b'a', b'b']))
+
+    def app(self, **kwargs):
+        return Application(web.conditional_get(**kwargs) | web.cases(
+            web.match('/', 'index') | self.page,
+            web.match('/doc/<int:version>', 'doc') | self.versioned,
+            web.match('/stream', 'stream') | self.stream,
+            web.match('/post', 'post') | web.method('POST') | self.page,
+        ))
+
+    def get(self, app, path, etag=None, method='GET'):
+        headers = {}
+        if etag is not None:
+            headers['If-None-Match'] = etag
+        return Request.blank(path, headers=headers, method=method)\
+                      .get_response(app)
+
+    def test_body_etag(self):
+        app = self.app()
+        response = self.get(app, '/')
+        etag = response.headers['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+        self.assertEqual(response.body, b'page')
+        self.assertEqual(self.get(app, '/').headers['ETag'], etag)
+
+        response = self.get(app, '/', etag=etag)
+        self.assertEqual(response.status_int, 304)
+        self.assertEqual(response.body, b'')
+        self.assertEqual(response.headers['ETag'], etag)
+        self.assertEqual(response.headers['Cache-Control'], 'max-age=60')
+
+        self.assertEqual(self.get(app, '/', etag='W/"other"').status_int,
+                         200)
+        self.assertEqual(self.get(app, '/', etag='*').status_int, 304)
+
+    def test_version(self):
+        app = self.app()
+        response = self.get(app, '/doc/1')
+        self.assertEqual(len(self.rendered), 1)
+        etag = response.headers['ETag']
+        response = self.get(app, '/doc/1', etag=etag)
+        self.assertEqual(response.status_int, 304)
+        self.assertEqual(response.headers['ETag'], etag)
+        # not rendered on revalidation
+        self.assertEqual(len(self.rendered), 1)
+
+        response = self.get(app, '/doc/2', etag=etag)
+        self.assertEqual(response.status_int, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        self.assertEqual(len(self.rendered), 2)
+
+    def test_salt(self):
+        etag = self.get(self.app(), '/doc/1').headers['ETag']
+        salted = self.get(self.app(salt='v2'), '/doc/1').headers['ETag']
+        self.assertNotEqual(etag, salted)
+
+    def test_skipped(self):
+        app = self.app()
+        response = self.get(app, '/stream')
+        self.assertNotIn('ETag', response.headers)
+        self.assertEqual(response.body, b'ab')
+
+        response = self.get(app, '/post', method='POST', etag='*')
+        self.assertEqual(response.status_int, 200)
+        self.assertNotIn('ETag', response.headers)
+
+        self.assertEqual(self.get(app, '/missing').status_int, 404)
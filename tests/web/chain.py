@@ -6,6 +6,7 @@ import unittest
 from iktomi import web
 from iktomi.web.core import _FunctionWrapper3
 from iktomi.utils.storage import VersionedStorage
+from webob import Response
 from webob.exc import HTTPNotFound
 
 VS = VersionedStorage
@@ -289,4 +290,51 @@ class Chain(unittest.TestCase):
         response = chain(VS(), VS())
         self.assert_(response is nf)
 
+    def test_freeze(self):
+        @F
+        def h(env, data, nx):
+            count = nx(env, data) or 0
+            return count + 1
+
+        def e(env, data):
+            return 10
 
+        chain = h | web.cases(h | e, h) | h
+        frozen = chain.freeze()
+        self.assertEqual(frozen(VS(), VS()), 12)
+        self.assertIs(frozen.freeze(), frozen)
+        self.assertIs(frozen.__dict__['next_handler'], frozen._next_handler)
+        nested = frozen.next_handler
+        self.assertIsInstance(nested.handlers, tuple)
+        self.assertIsNot(nested.handlers[0], chain.next_handler.handlers[0])
+        last = nested.handlers[1].next_handler.next_handler
+        self.assertEqual(last(VS(), VS()), None)
+        self.assertRaises(TypeError, lambda: frozen | h)
+        self.assertRaises(TypeError, lambda: nested | h)
+        # original chain is not frozen
+        self.assertEqual((h | chain)(VS(), VS()), 13)
+
+    def test_copy(self):
+        handler = web.match('/', 'index')
+        copy = handler.copy()
+        self.assertIs(type(copy), web.match)
+        self.assertIsNot(copy, handler)
+        self.assertEqual(copy.__dict__, handler.__dict__)
+        chained = handler | (lambda e, d: 1)
+        self.assertFalse(hasattr(handler, '_next_handler'))
+        self.assertEqual(chained.url_name, 'index')
+
+    def test_freeze_application(self):
+        app = web.cases(
+            web.match('/', 'index') | (lambda e, d: Response('index')),
+            web.prefix('/docs', name='docs') | web.cases(
+                web.match('/<int:id>', 'item') | \
+                        (lambda e, d: Response(str(d.id))),
+            ),
+        )
+        wsgi_app = web.Application(app, compile_routes=True, freeze=True)
+        self.assert_(wsgi_app.handler._frozen)
+        self.assertEqual(web.ask(wsgi_app, '/docs/5').body, b'5')
+        self.assertEqual(web.ask(wsgi_app, '/docs/a'), None)
+        self.assertEqual(wsgi_app.root.docs.item(id=1).as_url, '/docs/1')
+        self.assertRaises(TypeError, wsgi_app.handler._compile)
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+__all__ = ['CompiledRoutesTests']
+
+import unittest
+from webob import Response
+from iktomi import web
+from iktomi.web.core import _RouteIndex, _compiled_cases
+
+
+def respond(text):
+    return lambda env, data: Response(text)
+
+
+class CompiledRoutesTests(unittest.TestCase):
+
+    def assertSameResponses(self, app, urls):
+        compiled = web.Application(app, compile_routes=True)
+        for url in urls:
+            plain_response = web.ask(app, url)
+            compiled_response = web.ask(compiled, url)
+            if plain_response is None:
+                self.assertEqual(compiled_response, None, url)
+            else:
+                self.assertEqual(compiled_response.body,
+                                 plain_response.body, url)
+
+    def test_route_index(self):
+        index = _RouteIndex(['/news/', '', '/news/item-', '/docs', '/',
+                             '/news'])
+        self.assertEqual(index.candidates('/news/item-5'), [0, 1, 2, 4, 5])
+        self.assertEqual(index.candidates('/news/5'), [0, 1, 4, 5])
+        self.assertEqual(index.candidates('/newsletter'), [1, 4, 5])
+        self.assertEqual(index.candidates('/docs/a'), [1, 3, 4])
+        self.assertEqual(index.candidates('/'), [1, 4])
+        self.assertEqual(index.candidates(''), [1])
+
+    def test_static_prefix(self):
+        self.assertEqual(web.match('/news/<int:id>')._static_prefix(),
+                         '/news/')
+        self.assertEqual(web.match(u'/новости')._static_prefix(),
+                         '/%D0%BD%D0%BE%D0%B2%D0%BE%D1%81%D1%82%D0%B8')
+        chain = web.prefix('/news', name='news') | web.cases(
+                    web.match('/<int:id>', 'item'),
+                    web.match('/all', 'all'))
+        self.assertEqual(chain._static_prefix(), '/news/')
+        chain = web.prefix('/<int:id>') | web.match('/all')
+        self.assertEqual(chain._static_prefix(), '/')
+        chain = web.method('GET') | web.match('/all')
+        self.assertEqual(chain._static_prefix(), '/all')
+        chain = web.method('GET', strict=True) | web.match('/all')
+        self.assertEqual(chain._static_prefix(), '')
+        chain = web.request_filter(lambda e, d, n: n(e, d)) | \
+                web.match('/all')
+        self.assertEqual(chain._static_prefix(), '')
+
+    def test_compile(self):
+        app = web.cases(
+            web.match('/', 'index') | respond('index'),
+            web.prefix('/news', name='news') | web.cases(
+                web.match('', 'index') | respond('news'),
+                web.match('/<int:id>', 'item') | respond('news item'),
+            ),
+        ) | web.request_filter(lambda e, d, n: n(e, d))
+        compiled = app._compile()
+        self.assertIsInstance(compiled, _compiled_cases)
+        nested = compiled.handlers[1].next_handler.next_handler
+        self.assertIsInstance(nested, _compiled_cases)
+        # original tree is not changed
+        self.assertNotIsInstance(app, _compiled_cases)
+        self.assertEqual(compiled._locations().keys(), app._locations().keys())
+
+    def test_first_match(self):
+        def filter_(text):
+            return web.request_filter(
+                    lambda e, d, n: n(e, d) or Response(text))
+        app = web.cases(
+            web.match('/a', 'a1') | (lambda e, d: None),
+            web.prefix('/a') | filter_('filtered a'),
+            web.match('/a', 'a2') | respond('a2'),
+            filter_('catch all') | web.match('/b', 'b'),
+            web.subdomain('sub') | web.match('/c', 'c') | respond('c'),
+            web.method('POST', strict=True) | web.match('/d', 'd'),
+            web.prefix('/e') | web.cases(
+                web.match('/1', 'e1') | respond('e1'),
+                web.match('/<int:x>', 'ex') | respond('ex'),
+            ),
+            web.match('/e/<int:x>', 'ex2') | respond('ex2'),
+        )
+        self.assertSameResponses(
+                app, ['/a', '/a/b', '/b', '/c', 'http://sub.example.com/c',
+                      '/d', '/e/1', '/e/2', '/e/a', '/f'])
+
+    def test_joined_patterns(self):
+        app = web.cases(
+            web.match('/', 'index') | respond('index'),
+            web.match('/<any(a,b):x>', 'ab') | (lambda e, d: None),
+            web.match('/<int:x>', 'int') | respond('int'),
+            web.match('/<any(b,c):x>', 'bc') | respond('bc'),
+            web.prefix('/p') | respond('p'),
+            web.request_filter(lambda e, d, n: n(e, d)) | \
+                web.match('/f', 'f') | respond('f'),
+            web.match('/<string(min=2):x>', 'str') | respond('str'),
+            web.match('/<date:x>', 'date') | respond('date'),
+        )
+        compiled = app._compile()
+        groups = [(end, regex is not None) for regex, end in compiled._joined]
+        self.assertEqual(groups, [(5, True)] * 5 + [(6, False)] + \
+                                 [(8, True)] * 2)
+        self.assertSameResponses(
+                app, ['/', '/a', '/b', '/c', '/1', '/p', '/pp', '/f', '/ff',
+                      '/2010-01-01', '/2010-13-01', '/x'])
+
+    def test_joined_patterns_limit(self):
+        routes = [web.match('/{}'.format(i), str(i)) | respond(str(i))
+                  for i in range(10)]
+        app = web.cases(*routes)
+        self.assertEqual(set(app._compile()._joined), set([
+                                (app._compile()._joined[0][0], 10)]))
+        class limited_cases(_compiled_cases):
+            max_joined = 3
+        compiled = limited_cases(*routes)
+        self.assertEqual([end for _, end in compiled._joined],
+                         [3, 3, 3, 6, 6, 6, 9, 9, 9, 10])
+        self.assertEqual(compiled._joined[9][0], None)
+        for i in range(10):
+            self.assertEqual(web.ask(compiled, '/{}'.format(i)).body,
+                             str(i).encode('ascii'))
+
+    def test_chain_after_compiled(self):
+        app = web.cases(
+            web.match('/a', 'a'),
+            web.match('/b', 'b'),
+        )
+        chained = app._compile() | respond('ok')
+        self.assertIsInstance(chained, _compiled_cases)
+        self.assertEqual(web.ask(chained, '/b').body, b'ok')
+        self.assertEqual(web.ask(chained, '/c'), None)
+
+    def test_application(self):
+        app = web.cases(
+            web.match('/', 'index') | respond('index'),
+            web.match('/about', 'about') | respond('about'),
+        )
+        wsgi_app = web.Application(app, compile_routes=True)
+        self.assertIsInstance(wsgi_app.handler, _compiled_cases)
+        self.assertEqual(wsgi_app.root.about.as_url, '/about')
@@ -4,11 +4,13 @@ __all__ = ['Prefix', 'Match', 'Subdomain']
 
 import unittest
 import tempfile, shutil
+import zlib
 import os
 from iktomi import web
 from iktomi.web.app import Application
 from webtest import TestApp as TA
-from webob import Response
+from webob import Request, Response
+from webob.exc import HTTPNotFound
 
 
 class WebHandler(unittest.TestCase):
@@ -449,3 +451,212 @@ class Static(unittest.TestCase):
         app.get('/media/x', status=404)
         app.get('/media/x/', status=404)
 
+    def test_production(self):
+        static = web.static_files(self.root, self.url, production=True,
+                                  max_age=3600, stat_interval=0)
+        app = TA(Application(static))
+        file_path = os.path.join(self.root, 'x.js')
+        with open(file_path, 'w') as f:
+            f.write('0123456789')
+        os.utime(file_path, (1000000000, 1000000000))
+
+        response = app.get('/media/x.js')
+        self.assertEqual(response.body, b'0123456789')
+        self.assertIn(response.content_type, ('application/javascript',
+                                              'text/javascript'))
+        self.assertEqual(response.headers['Last-Modified'],
+                         'Sun, 09 Sep 2001 01:46:40 GMT')
+        self.assertEqual(response.headers['Cache-Control'],
+                         'public, max-age=3600')
+        etag = response.headers['ETag']
+        self.assertEqual(etag, '"3b9aca00-a"')
+
+        app.get('/media/x.js', headers={'If-None-Match': etag}, status=304)
+        app.get('/media/x.js', status=304, headers={
+                    'If-Modified-Since': 'Sun, 09 Sep 2001 01:46:40 GMT'})
+        response = app.get('/media/x.js', headers={'Range': 'bytes=2-4'},
+                           status=206)
+        self.assertEqual(response.body, b'234')
+        self.assertEqual(response.headers['Content-Range'], 'bytes 2-4/10')
+        app.get('/media/x.js', headers={'Range': 'bytes=20-'}, status=416)
+        self.assertEqual(app.head('/media/x.js').body, b'')
+        app.post('/media/x.js', status=405)
+
+        # changes are seen on revalidation
+        with open(file_path, 'w') as f:
+            f.write('changed')
+        response = app.get('/media/x.js', headers={'If-None-Match': etag})
+        self.assertEqual(response.body, b'changed')
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+        os.remove(file_path)
+        app.get('/media/x.js', status=404)
+        app.get('/media/', status=404)
+        os.mkdir(os.path.join(self.root, 'dir'))
+        app.get('/media/dir', status=404)
+
+    def test_production_stat_cache(self):
+        static = web.static_files(self.root, self.url, production=True,
+                                  stat_interval=1000)
+        app = TA(Application(static))
+        file_path = os.path.join(self.root, 'x.txt')
+        with open(file_path, 'w') as f:
+            f.write('x')
+        app.get('/media/x.txt')
+        os.remove(file_path)
+        # cached stat is trusted until stat_interval has passed
+        self.assertIsNotNone(static.stat_file(file_path))
+        static.stat_interval = 0
+        self.assertIsNone(static.stat_file(file_path))
+
+    def test_production_file_wrapper(self):
+        class FileWrapper(object):
+            def __init__(self, f, block_size):
+                self.f = f
+            def __iter__(self):
+                return iter([self.f.read()])
+            def close(self):
+                self.f.close()
+        static = web.static_files(self.root, self.url, production=True)
+        with open(os.path.join(self.root, 'x.txt'), 'w') as f:
+            f.write('x')
+        environ = {'wsgi.file_wrapper': FileWrapper}
+        app = TA(Application(static), extra_environ=environ)
+        wsgi = Application(static)
+        request = Request.blank('/media/x.txt', environ=environ)
+        started = []
+        result = wsgi(request.environ, lambda *args: started.append(args))
+        self.assertIsInstance(result, FileWrapper)
+        self.assertEqual(list(result), [b'x'])
+        result.close()
+        self.assertEqual(app.get('/media/x.txt').body, b'x')
+
+    def test_precompressed(self):
+        static = web.static_files(self.root, self.url, production=True,
+                                  precompressed=True, stat_interval=0)
+        wsgi_app = Application(static)
+        # webtest decodes gzipped bodies, so webob is used
+        def get(path, accept_encoding=None):
+            request = Request.blank(path)
+            if accept_encoding is not None:
+                request.headers['Accept-Encoding'] = accept_encoding
+            return request.get_response(wsgi_app)
+
+        file_path = os.path.join(self.root, 'x.css')
+        for extension, content in [('', 'plain'), ('.gz', 'gz'),
+                                   ('.br', 'br')]:
+            with open(file_path + extension, 'w') as f:
+                f.write(content)
+
+        response = get('/media/x.css')
+        self.assertEqual(response.body, b'plain')
+        self.assertEqual(response.headers['Vary'], 'Accept-Encoding')
+        self.assertNotIn('Content-Encoding', response.headers)
+
+        response = get('/media/x.css', 'gzip, deflate')
+        self.assertEqual(response.body, b'gz')
+        self.assertEqual(response.content_type, 'text/css')
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.headers['Vary'], 'Accept-Encoding')
+        gzip_etag = response.headers['ETag']
+
+        response = get('/media/x.css', 'gzip, br')
+        self.assertEqual(response.body, b'br')
+        self.assertEqual(response.headers['Content-Encoding'], 'br')
+        self.assertNotEqual(response.headers['ETag'], gzip_etag)
+
+        self.assertEqual(get('/media/x.css', 'gzip, br;q=0.5').body, b'gz')
+        self.assertEqual(get('/media/x.css', 'gzip;q=0, *').body, b'br')
+        self.assertEqual(get('/media/x.css', 'identity').body, b'plain')
+        self.assertEqual(get('/media/x.css',
+                             'gzip;q=0.5, identity;q=1').body, b'plain')
+        self.assertEqual(get('/media/x.css',
+                             'gzip;q=0.5, identity;q=0.5').body, b'plain')
+        self.assertEqual(get('/media/x.css',
+                             'gzip;q=0.5, identity;q=0.1').body, b'gz')
+
+        # siblings are checked on revalidation
+        os.remove(file_path + '.br')
+        os.remove(file_path + '.gz')
+        response = get('/media/x.css', 'gzip, br')
+        self.assertEqual(response.body, b'plain')
+        self.assertNotIn('Vary', response.headers)
+        # compressed files are served themselves as usual
+        with open(file_path + '.gz', 'w') as f:
+            f.write('gz')
+        response = get('/media/x.css.gz')
+        self.assertEqual(response.body, b'gz')
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+
+
+class Compress(unittest.TestCase):
+
+    def get(self, handler, accept_encoding='gzip, deflate', method='GET'):
+        request = Request.blank('/', method=method)
+        if accept_encoding is not None:
+            request.headers['Accept-Encoding'] = accept_encoding
+        return request.get_response(Application(handler))
+
+    def test_compress(self):
+        body = b'0123456789' * 200
+        app = web.compress() | (lambda env, data: Response(
+                                    body=body, etag='tag'))
+        response = self.get(app)
+        self.assertEqual(response.content_encoding, 'gzip')
+        self.assertEqual(response.headers['Vary'], 'Accept-Encoding')
+        self.assertEqual(response.headers['ETag'], 'W/"tag"')
+        self.assertEqual(zlib.decompress(response.body, 31), body)
+        self.assertLess(len(response.body), len(body))
+
+        response = self.get(app, 'deflate')
+        self.assertEqual(response.content_encoding, 'deflate')
+        self.assertEqual(zlib.decompress(response.body), body)
+
+        for accept_encoding in [None, 'identity', 'br', 'gzip;q=0']:
+            response = self.get(app, accept_encoding)
+            self.assertEqual(response.content_encoding, None)
+            self.assertEqual(response.body, body)
+            self.assertEqual(response.headers['Vary'], 'Accept-Encoding')
+
+    def test_skip(self):
+        def app(**kwargs):
+            return web.compress(min_size=100) | \
+                    (lambda env, data: Response(**kwargs))
+        body = b'x' * 1000
+        for kwargs in [dict(body=b'small'),
+                       dict(body=body, content_type='image/png'),
+                       dict(body=body, content_encoding='gzip'),
+                       dict(body=body, status=206),
+                       dict(status=304)]:
+            response = self.get(app(**kwargs))
+            self.assertEqual(response.content_encoding,
+                             kwargs.get('content_encoding'))
+        self.assertEqual(self.get(web.compress()).status_int, 404)
+        self.assertEqual(self.get(web.compress() | (lambda env, data:
+                         HTTPNotFound())).status_int, 404)
+
+    def test_streaming(self):
+        chunks = [b'<p>' + str(i).encode('ascii') * 500 + b'</p>'
+                  for i in range(5)]
+        produced = []
+        def generate():
+            for chunk in chunks:
+                produced.append(chunk)
+                yield chunk
+        app = web.Application(web.compress(content_types=['text/html']) |
+                              (lambda env, data: Response(app_iter=generate())))
+        request = Request.blank('/', headers={'Accept-Encoding': 'gzip'})
+        started = []
+        result = app(request.environ, lambda *args: started.append(args))
+        headers = dict(started[0][1])
+        self.assertNotIn('Content-Length', headers)
+        decompressor = zlib.decompressobj(31)
+        for i, compressed in enumerate(result):
+            if i < len(chunks):
+                # the chunk is sent before the next one is produced
+                self.assertEqual(len(produced), i + 1)
+                self.assertEqual(decompressor.decompress(compressed),
+                                 chunks[i])
+            else:
+                self.assertEqual(decompressor.decompress(compressed), b'')
+        self.assertTrue(decompressor.eof)
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+__all__ = ['InstrumentationTests']
+
+import unittest
+from webob import Response
+from iktomi import web
+from iktomi.web.app import Application
+# import as TA because py.test generates warning about TestApp name
+from webtest import TestApp as TA
+
+
+class Recorder(web.Instrument):
+
+    def __init__(self):
+        self.calls = []
+
+    def pre_dispatch(self, env, info):
+        self.calls.append(('pre', info.started))
+
+    def post_dispatch(self, env, info):
+        self.calls.append(('post', info.location, info.status))
+
+
+class InstrumentationTests(unittest.TestCase):
+
+    def app(self):
+        return web.cases(
+            web.match('/', 'index') | (lambda e, d: Response(body=b'index')),
+            web.prefix('/docs') | web.namespace('docs') | web.cases(
+                web.match('/<int:id>', 'item') | \
+                        (lambda e, d: Response(body=b'item')),
+            ),
+            web.match('/500', 'err500') | (lambda e, d: 1 + ''),
+        )
+
+    def test_callbacks(self):
+        recorder = Recorder()
+        app = TA(Application(self.app(), instruments=[recorder]))
+        app.get('/')
+        app.get('/docs/1')
+        app.get('/missing', status=404)
+        app.get('/docs/x', status=404)
+        self.assertEqual(recorder.calls, [
+            ('pre', None), ('post', 'index', 200),
+            ('pre', None), ('post', 'docs.item', 200),
+            ('pre', None), ('post', '', 404),
+            ('pre', None), ('post', '', 404),
+        ])
+
+    def test_route_timings(self):
+        timings = web.RouteTimings()
+        app = TA(Application(self.app(), instruments=[timings]))
+        for i in range(3):
+            app.get('/docs/1')
+        app.get('/')
+        app.get('/500', status=500)
+        app.get('/missing', status=404)
+        dump = timings.dump()
+        self.assertEqual(set(dump), set(['index', 'docs.item', 'err500', '']))
+        self.assertEqual(dump['docs.item']['total']['count'], 3)
+        self.assertEqual(dump['docs.item']['statuses'], {200: 3})
+        self.assertEqual(dump['err500']['statuses'], {500: 1})
+        self.assertEqual(dump['']['statuses'], {404: 1})
+        self.assertEqual(dump['']['handler']['max'], 0)
+        total = dump['index']['total']
+        self.assertLessEqual(dump['index']['routing']['max'], total['max'])
+        self.assertIn('docs.item', timings.format())
+        timings.reset()
+        self.assertEqual(timings.dump(), {})
+
+    def test_info_times(self):
+        infos = []
+        class Keep(web.Instrument):
+            def post_dispatch(self, env, info):
+                infos.append(info)
+        app = TA(Application(self.app(), instruments=[Keep()]))
+        app.get('/docs/1')
+        info, = infos
+        self.assertTrue(info.started <= info.routed <= info.finished)
+        self.assertAlmostEqual(info.total_time,
+                         info.routing_time + info.handler_time)
+
+    def test_no_instruments(self):
+        app = Application(self.app())
+        self.assertEqual(app.instruments, [])
+        TA(app).get('/')
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+
+__all__ = ['MetricsTests', 'MultiprocessMetricsTests']
+
+import os
+import shutil
+import tempfile
+import unittest
+from webob import Response
+from iktomi import web
+from iktomi.web.app import Application
+from iktomi.web.prometheus import _MmapValues, read_values_file, \
+                                  clear_multiprocess_dir
+# import as TA because py.test generates warning about TestApp name
+from webtest import TestApp as TA
+
+skipUnless = getattr(unittest, 'skipUnless', lambda c, r: lambda x: x)
+
+
+def make_app(collector):
+    return TA(Application(web.cases(
+        web.match('/metrics') | web.metrics(collector),
+        web.match('/', 'index') | (lambda e, d: Response(body=b'index')),
+        web.match('/500', 'err500') | (lambda e, d: 1 + ''),
+    ), instruments=[collector]))
+
+
+class MetricsTests(unittest.TestCase):
+
+    def test_exposition(self):
+        collector = web.MetricsCollector(buckets=[10, 0.1])
+        app = make_app(collector)
+        app.get('/')
+        app.get('/')
+        app.get('/500', status=500)
+        app.get('/missing', status=404)
+        response = app.get('/metrics')
+        self.assertEqual(response.content_type, 'text/plain')
+        lines = response.text.splitlines()
+        self.assertIn('# TYPE iktomi_requests_total counter', lines)
+        self.assertIn('iktomi_requests_total{location="index",status="200"} '
+                      '2.0', lines)
+        self.assertIn('iktomi_requests_total{location="err500",status="500"} '
+                      '1.0', lines)
+        self.assertIn('iktomi_requests_total{location="",status="404"} 1.0',
+                      lines)
+        # the scrape itself
+        self.assertIn('iktomi_requests_in_progress 1.0', lines)
+        self.assertIn('iktomi_request_duration_seconds_bucket'
+                      '{location="index",le="0.1"} 2.0', lines)
+        self.assertIn('iktomi_request_duration_seconds_bucket'
+                      '{location="index",le="10.0"} 2.0', lines)
+        self.assertIn('iktomi_request_duration_seconds_bucket'
+                      '{location="index",le="+Inf"} 2.0', lines)
+        self.assertIn('iktomi_request_duration_seconds_count'
+                      '{location="index"} 2.0', lines)
+        self.assertTrue([l for l in lines
+                         if l.startswith('process_cpu_seconds_total ')])
+
+    def test_escape_labels(self):
+        collector = web.MetricsCollector()
+        info = web.DispatchInfo()
+        info.location = 'a"b\\c'
+        info.status = 200
+        info.started, info.finished = 0, 1
+        collector.pre_dispatch(None, info)
+        collector.post_dispatch(None, info)
+        self.assertIn('iktomi_requests_total{location="a\\"b\\\\c",'
+                      'status="200"} 1.0', collector.exposition())
+
+    def test_unknown_status(self):
+        collector = web.MetricsCollector()
+        info = web.DispatchInfo()
+        info.location = 'static'
+        info.started, info.finished = 0, 1
+        collector.pre_dispatch(None, info)
+        collector.post_dispatch(None, info)
+        self.assertIn('iktomi_requests_total{location="static"} 1.0',
+                      collector.exposition().splitlines())
+
+
+class MultiprocessMetricsTests(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_values_file(self):
+        values = _MmapValues(os.path.join(self.dir, 'test.db'))
+        values.inc('a', 1)
+        values.inc('a', 2)
+        # growing
+        values.set(u'key' * 30000, 5)
+        self.assertEqual(values.items(), [('a', 3.0), (u'key' * 30000, 5.0)])
+        with open(values.filename, 'rb') as f:
+            self.assertEqual(read_values_file(f.read()), values.items())
+        values.close()
+
+    def test_values_file_reused(self):
+        filename = os.path.join(self.dir, 'test.db')
+        values = _MmapValues(filename)
+        values.inc('a', 1)
+        values.set(u'key' * 30000, 5)
+        values.close()
+        # a new process with the same pid keeps values of the dead one
+        values = _MmapValues(filename)
+        values.inc('a', 2)
+        values.inc('b', 1)
+        self.assertEqual(values.items(), [('a', 3.0), (u'key' * 30000, 5.0),
+                                          ('b', 1.0)])
+        values.close()
+
+    @skipUnless(hasattr(os, 'fork'), 'fork is required')
+    def test_workers(self):
+        collector = web.MetricsCollector(multiprocess_dir=self.dir)
+        app = make_app(collector)
+        pid = os.fork()
+        if not pid: # pragma: no cover, child
+            try:
+                app.get('/')
+                app.get('/')
+                # in progress count is left by a finished worker
+                collector.pre_dispatch(None, None)
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+        app.get('/')
+        collected = collector.collect()
+        self.assertEqual(collected['iktomi_requests_total'],
+                         {('index', '200'): 3.0})
+        self.assertEqual(collected['iktomi_requests_in_progress'], {(): 0.0})
+        self.assertEqual(list(collected['process_start_time_seconds']),
+                         [(str(os.getpid()),)])
+        self.assertIn('process_cpu_seconds_total{pid="%d"}' % os.getpid(),
+                      app.get('/metrics').text)
+        self.assertEqual(len(os.listdir(self.dir)), 2)
+        clear_multiprocess_dir(self.dir)
+        self.assertEqual(os.listdir(self.dir), [])
@@ -3,7 +3,7 @@
 __all__ = ['ReverseTests', 'LocationsTests']
 
 import unittest
-from webob import Response
+from webob import Request, Response
 from iktomi import web
 from iktomi.web.url_templates import UrlTemplate
 from iktomi.web.reverse import Location, UrlBuildingError
@@ -425,6 +425,134 @@ class ReverseTests(unittest.TestCase):
         assert web.ask(app, 'https://example.com:80/url3')
         assert called_urls == [1,2,3]
 
+    def test_compiled_endpoints(self):
+        app = web.subdomain('example.com') | web.cases(
+            web.match('/', 'index'),
+            web.prefix('/news/<lang>', name='news') | web.cases(
+                web.match('', ''),
+                web.match('/<int:id>', 'item'),
+                web.match('/<int:id>', 'comments', fragment='c<int:cid>'),
+                web.prefix('/<int:year>', name='archive') |
+                    web.match('/<int:month>', 'month'),
+            ),
+            web.subdomain('docs') | web.namespace('docs') | web.cases(
+                web.match('/', ''),
+                web.match('/<path>', 'page'),
+            ),
+        )
+        r = web.Reverse.from_handler(app)
+        uncompiled = web.Reverse(app._locations())
+        cases = [('index', {}),
+                 ('news', dict(lang='en')),
+                 ('news.item', dict(lang='en', id=1)),
+                 ('news.comments', dict(lang='en', id=1, cid=2)),
+                 ('news.archive.month', dict(lang='en', year=2020, month=1)),
+                 ('docs', {}),
+                 ('docs.page', dict(path='intro'))]
+        for name, kwargs in cases:
+            self.assertEqual(r.build_url(name, **kwargs),
+                             uncompiled.build_url(name, **kwargs))
+        self.assertEqual(r.build_url('news.comments', lang='en', id=1, cid=2),
+                         'http://example.com/news/en/1#c2')
+        self.assertEqual(r.build_url('docs.page', path='intro'),
+                         'http://docs.example.com/intro')
+        # compiled on construction
+        self.assertEqual(set(r._compiled), set(name for name, _ in cases))
+        # relative URLs of bound reverse
+        request = Request.blank('https://docs.example.com/')
+        env = web.AppEnvironment.create(request=request, root=r)
+        uncompiled_env = web.AppEnvironment.create(request=request,
+                                                   root=uncompiled)
+        for name, kwargs in cases:
+            self.assertEqual(env.root.build_url(name, **kwargs),
+                             uncompiled_env.root.build_url(name, **kwargs))
+
+        for name, kwargs in [('news.item', dict(lang='en')),
+                             ('news.item', dict(lang='en', id=1, page=2)),
+                             ('news.missing', {}),
+                             ('news.archive', dict(lang='en', year=2020))]:
+            self.assertRaises(UrlBuildingError, r.build_url, name, **kwargs)
+        # built by Reverse objects raising the error
+        self.assertNotIn('news.missing', r._compiled)
+        self.assertNotIn('news.archive', r._compiled)
+
+    def test_compiled_custom_location(self):
+        from iktomi.web.reverse import Location
+
+        class UpperLocation(Location):
+            def build_path(self, reverse, **kwargs):
+                return Location.build_path(self, reverse, **kwargs).upper()
+
+        class upper_match(web.match):
+            def _locations(self):
+                location = UpperLocation(self.builder)
+                return {self.url_name: (location, {})}
+
+        app = web.cases(
+            web.match('/', 'index'),
+            web.prefix('/docs', name='docs') | upper_match('/<path>', 'page'),
+        )
+        r = web.Reverse.from_handler(app)
+        self.assertEqual(set(r._compiled), set(['index']))
+        self.assertEqual(r.build_url('docs.page', path='intro'),
+                         '/docs/INTRO')
+
+    def test_compiled_intermediate_fragment(self):
+        class fragment_prefix(web.prefix):
+            def _locations(self):
+                locations = web.prefix._locations(self)
+                for location, scope in locations.values():
+                    location.fragment_builder = UrlTemplate('top<int:top>')
+                return locations
+
+        app = web.cases(
+            web.match('/', 'index', fragment='main'),
+            fragment_prefix('/docs') | web.namespace('docs') | web.cases(
+                web.match('/', ''),
+                web.match('/<path>', 'page'),
+                web.match('/<path>/', 'section', fragment='s<int:id>'),
+            ),
+        )
+        r = web.Reverse.from_handler(app)
+        uncompiled = web.Reverse(app._locations())
+        self.assertEqual(set(r._compiled), set(['index']))
+        for name, kwargs in [('index', {}),
+                             ('docs', dict(top=1)),
+                             ('docs.page', dict(top=1, path='intro')),
+                             ('docs.section', dict(top=1, path='a', id=2))]:
+            self.assertEqual(r.build_url(name, **kwargs),
+                             uncompiled.build_url(name, **kwargs))
+        self.assertEqual(r.build_url('docs.page', top=1, path='intro'),
+                         '/docs/intro#top1')
+        self.assertRaises(UrlBuildingError, r.build_url, 'docs.page',
+                          path='intro')
+
+    def test_bind_to_env(self):
+        app = web.subdomain('example.com') | web.cases(
+            web.match('/', 'index'),
+            web.prefix('/news', name='news') | web.match('/<int:id>', 'item'),
+        )
+        r = web.Reverse.from_handler(app)
+        request = Request.blank('https://example.com:8443/')
+        env = web.AppEnvironment.create(request=request, root=r)
+        bound = env.root
+        self.assertIs(bound._scope, r._scope)
+        self.assertIs(bound._compiled, r._compiled)
+        self.assertIsNone(r._url_context)
+
+        context = bound._url_context
+        self.assertEqual((context.scheme, context.domain, context.port,
+                          context.scheme_port),
+                         ('https', 'example.com', '8443', '443'))
+        self.assertIs(bound.news.item(id=1)._url_context, context)
+        self.assertEqual(bound.news.item(id=1).as_url,
+                         'https://example.com:8443/news/1')
+        # primary domain is set while routing
+        env._route_state = env._route_state.add_subdomain('example.com',
+                                                          'example.com')
+        self.assertEqual(bound.build_url('news.item', id=1), '/news/1')
+        self.assertEqual(bound.index.as_url, '/')
+
     def test_url_building_errors(self):
         'UrlBuildingError'
         app = web.namespace('news') | web.cases(
@@ -11,6 +11,7 @@ from iktomi.web.reverse import URL
 from iktomi.web.url_templates import UrlTemplate
 from iktomi.web.url_converters import Converter, ConvertError
 import copy
+import pickle
 
 
 class URLTests(unittest.TestCase):
@@ -132,6 +133,17 @@ class URLTests(unittest.TestCase):
         self.assertEqual(set(url.query.items()), {('a' ,'1'), ('b', '2'), ('b', '3')})
         self.assertEqual(url.show_host, False)
 
+    def test_from_url_query_order(self):
+        url = URL.from_url('/url?b=1&a=2&b=3&c=&d&a=4')
+        self.assertEqual(list(url.query.items()),
+                         [('b', '1'), ('a', '2'), ('b', '3'), ('a', '4')])
+        self.assertEqual(url.query.getall('b'), ['1', '3'])
+
+    def test_from_url_query_unquote(self):
+        url = URL.from_url('/url?q=a+b%2Bc&%D0%BA=%D0%B7&x=1;y=2')
+        self.assertEqual(list(url.query.items()),
+                         [('q', 'a b+c'), (u'к', u'з'), ('x', '1;y=2')])
+
     def test_from_url_unicode(self):
         url = URL.from_url(u'http://сайт.рф/', show_host=False)
         self.assertEqual(url.scheme, 'http')
@@ -203,6 +215,40 @@ class URLTests(unittest.TestCase):
         url_deepcopy = copy.deepcopy(url_orig)
         self.assertEqual(str(url_orig), str(url_deepcopy))
 
+    def test_pickle(self):
+        url = URL(u'/тест', query={'q': u'поиск'}, host=u'сайт.рф',
+                  fragment='anchor', show_host=False)
+        loaded = pickle.loads(pickle.dumps(url))
+        self.assertEqual(str(loaded), str(url))
+        self.assertEqual(loaded.query, url.query)
+        self.assertEqual(loaded.get_readable(), url.get_readable())
+        for url in [URL('/'), URL('/', fragment=''), URL.from_url('/a%20b#c%20d')]:
+            self.assertEqual(pickle.loads(pickle.dumps(url)), url)
+
+    def test_pickle_empty_path(self):
+        for url in [URL.from_url('http://example.com'),
+                    URL.from_url('?page=2'), URL('')]:
+            self.assertEqual(url.path, '')
+            for loaded in [pickle.loads(pickle.dumps(url)), copy.copy(url),
+                           copy.deepcopy(url)]:
+                self.assertEqual(loaded, url)
+                self.assertEqual(loaded.path, '')
+                self.assertEqual(loaded.host, url.host)
+        self.assertEqual(URL.from_url('?page=2').qs_set(page=3), '?page=3')
+
+    def test_lean(self):
+        url = URL('/path', host=u'сайт.рф')
+        if not six.PY2:
+            self.assertFalse(hasattr(url, '__dict__'))
+        # empty query is not allocated until accessed
+        self.assertIsNone(url._query)
+        self.assertEqual(url.qs_get('q'), None)
+        self.assertEqual(url.query, {})
+        self.assertEqual(url.qs_set(q='1'), 'http://xn--80aswg.xn--p1ai/path?q=1')
+        self.assertEqual(url.with_host().host, u'сайт.рф')
+        self.assertEqual(URL('/', host='xn--80aswg.xn--p1ai').host,
+                         u'сайт.рф')
+
 class UrlTemplateTest(unittest.TestCase):
     def test_match(self):
         'Simple match'
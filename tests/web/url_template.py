@@ -43,6 +43,39 @@ class UrlTemplateTests(unittest.TestCase):
         self.assertEqual(ut.match('/simple/d'), (None, {}))
         self.assertEqual(ut.match('/simple/d/sdfsdf'), (None, {}))
 
+    def test_match_converters(self):
+        ut = UrlTemplate('/<string(min=2, max=3):slug>/<any(a,b):kind>/'
+                         '<int:id>/<date:dt>')
+        matched, kwargs = ut.match('/ab/a/12/2012-01-31')
+        self.assertEqual(matched, '/ab/a/12/2012-01-31')
+        self.assertEqual(kwargs['slug'], 'ab')
+        self.assertEqual(kwargs['kind'], 'a')
+        self.assertEqual(kwargs['id'], 12)
+        self.assertEqual(kwargs['dt'].day, 31)
+        self.assertEqual(ut.match('/a/a/12/2012-01-31'), (None, {}))
+        self.assertEqual(ut.match('/abcd/a/12/2012-01-31'), (None, {}))
+        self.assertEqual(ut.match('/ab/c/12/2012-01-31'), (None, {}))
+        self.assertEqual(ut.match('/ab/a/12/2012-01-32'), (None, {}))
+
+    def test_match_unquote(self):
+        ut = UrlTemplate('/<name>/<any(u"\\u044f",b):kind>')
+        self.assertEqual(ut.match('/%D1%82%D0%B5%D1%81%D1%82/%D1%8F'),
+                         ('/%D1%82%D0%B5%D1%81%D1%82/%D1%8F',
+                          {'name': u'\u0442\u0435\u0441\u0442',
+                           'kind': u'\u044f'}))
+        self.assertEqual(ut.match('/a%20b/b'),
+                         ('/a%20b/b', {'name': u'a b', 'kind': 'b'}))
+
+    def test_match_redefined_string(self):
+        from iktomi.web.url_converters import String
+
+        class Lower(String):
+            def to_python(self, value, env=None):
+                return value.lower()
+
+        ut = UrlTemplate('/<lower:name>', converters={'lower': Lower})
+        self.assertEqual(ut.match('/ABC'), ('/ABC', {'name': 'abc'}))
+
     def test_builder_without_params(self):
         'UrlTemplate builder method (without params)'
         ut = UrlTemplate('/simple')